@@ -106,6 +106,12 @@ DATABASES = {
     }
 }
 
+# Cache
+# Reports and their invalidation counters live here, use a shared backend (e.g. redis://) with several workers.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 # Set the custom user model for auth
 AUTH_USER_MODEL = 'users.User'
 
@@ -150,3 +156,14 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')  # Only for development.
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Background report jobs
+# 'thread' runs them on a pool inside the Django process, 'worker' leaves them to `manage.py process_report_jobs`.
+REPORT_JOBS_MODE = env.str('REPORT_JOBS_MODE', default='thread')
+
+# Threads of the process-wide pool shared by the report jobs and the image derivatives.
+# REPORT_JOBS_MAX_WORKERS is still read, it was the name of this setting when only the reports used the pool.
+BACKGROUND_MAX_WORKERS = env.int('BACKGROUND_MAX_WORKERS', default=env.int('REPORT_JOBS_MAX_WORKERS', default=2))
+
+# Seconds the restaurants owned by a user are cached between requests, 0 disables it.
+RESTAURANT_OWNERSHIP_CACHE_TIMEOUT = env.int('RESTAURANT_OWNERSHIP_CACHE_TIMEOUT', default=60)
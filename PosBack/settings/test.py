@@ -1 +1,7 @@
-from .base import *
\ No newline at end of file
+from .base import *
+
+# Run the background report jobs inline, the test database is not shared with other threads.
+REPORT_JOBS_MODE = 'eager'
+
+# Build the image derivatives inline when the upload commits.
+IMAGE_DERIVATIVES_MODE = 'eager'
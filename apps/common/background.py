@@ -0,0 +1,45 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Threads of the process-wide pool shared by the report jobs and the image derivatives.
+BACKGROUND_MAX_WORKERS = getattr(settings, 'BACKGROUND_MAX_WORKERS', 2)
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers=None):
+    """
+    Return the process-wide pool; its size caps how many tasks run at the same time.
+    `max_workers` only sizes the pool when it is created, BACKGROUND_MAX_WORKERS by default.
+    """
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None:
+            _executor_workers = max_workers or BACKGROUND_MAX_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=_executor_workers, thread_name_prefix='background')
+        elif max_workers and max_workers != _executor_workers:
+            logger.warning("The background pool already runs with %s threads, %s were asked for.",
+                           _executor_workers, max_workers)
+    return _executor
+
+
+def run_in_background(function, *args):
+    """Run a function on the pool, with its own database connection."""
+
+    def task():
+        try:
+            function(*args)
+        except Exception:
+            logger.exception("Background task %s failed.", function.__name__)
+        finally:
+            close_old_connections()
+
+    return get_executor().submit(task)
@@ -0,0 +1,180 @@
+import logging
+import os
+from functools import partial
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from .background import run_in_background
+
+logger = logging.getLogger(__name__)
+
+# Smaller copies served instead of the uploaded images, by the longest side in pixels. They are never enlarged.
+IMAGE_DERIVATIVE_SIZES = getattr(settings, 'IMAGE_DERIVATIVE_SIZES', {'thumbnail': 160, 'medium': 640})
+IMAGE_DERIVATIVE_FORMAT = getattr(settings, 'IMAGE_DERIVATIVE_FORMAT', 'WEBP')
+IMAGE_DERIVATIVE_QUALITY = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+# How derivatives are built after an upload:
+#   'thread': on the background pool, once the upload commits (default).
+#   'eager':  inline when the upload commits (used by the tests).
+IMAGE_DERIVATIVES_MODE = getattr(settings, 'IMAGE_DERIVATIVES_MODE', 'thread')
+
+# The image fields with derivatives. Their names are stored in the `<field>_derivatives` field of the model,
+# with the name of the image they were built from as `source`. Each app schedules the derivatives of its models
+# from its own signals, with `schedule_image_derivatives` and `schedule_derivative_files_deletion`.
+IMAGE_FIELDS = {
+    'pos_systems.Product': 'image',
+    'restaurants.Employee': 'profile_picture',
+    'users.User': 'profile_image',
+}
+
+# Sent when the derivatives of an image are stored, the sender is the model. Arguments:
+#   instance_id: the primary key of the instance.
+image_derivatives_built = Signal()
+
+
+def derivatives_field(field_name):
+    return f"{field_name}_derivatives"
+
+
+def current_derivatives(instance, field_name):
+    """Return the derivative names of the current image of an instance by size, empty until they are built."""
+    image = getattr(instance, field_name)
+    derivatives = getattr(instance, derivatives_field(field_name)) or {}
+    if not image or derivatives.get('source') != image.name:
+        return {}
+    return {size: name for size, name in derivatives.items() if size != 'source'}
+
+
+def derivative_urls(instance, field_name):
+    """Return the URLs of the derivatives of the current image of an instance, None until they are built."""
+    derivatives = current_derivatives(instance, field_name)
+    if not derivatives:
+        return None
+    storage = getattr(instance, field_name).storage
+    return {size: storage.url(name) for size, name in derivatives.items()}
+
+
+def schedule_image_derivatives(instance):
+    """Build the derivatives of a saved instance once it commits, when its image changed since they were built."""
+    field_name = IMAGE_FIELDS[instance._meta.label]
+    image = getattr(instance, field_name)
+    derivatives = getattr(instance, derivatives_field(field_name)) or {}
+    if (image.name or None) == derivatives.get('source'):
+        return
+
+    if IMAGE_DERIVATIVES_MODE == 'thread':
+        transaction.on_commit(partial(run_in_background, build_image_derivatives, instance._meta.label, instance.pk))
+    elif IMAGE_DERIVATIVES_MODE == 'eager':
+        transaction.on_commit(partial(build_image_derivatives, instance._meta.label, instance.pk))
+
+
+def schedule_derivative_files_deletion(instance):
+    """Delete the derivative files of a deleted instance once the deletion commits."""
+    field_name = IMAGE_FIELDS[instance._meta.label]
+    derivatives = getattr(instance, derivatives_field(field_name)) or {}
+    if derivatives:
+        storage = instance._meta.get_field(field_name).storage
+        transaction.on_commit(partial(delete_derivative_files, storage, derivatives))
+
+
+def build_image_derivatives(model_label, pk, force=False):
+    """
+    Build the derivatives of the current image of an instance, or drop them when the image was removed.
+    They are stored with a conditional update on the image name, so an image replaced meanwhile never gets
+    the derivatives of the previous one. The files no longer referenced are deleted.
+    """
+    model = apps.get_model(model_label)
+    field_name = IMAGE_FIELDS[model_label]
+    row = model.objects.filter(pk=pk).values(field_name, derivatives_field(field_name)).first()
+    if row is None:
+        return
+
+    name = row[field_name] or None
+    previous = row[derivatives_field(field_name)] or {}
+    if previous.get('source') == name and not force:
+        return
+
+    storage = model._meta.get_field(field_name).storage
+    derivatives = {}
+    if name:
+        try:
+            with storage.open(name) as file:
+                derivatives = {'source': name, **render_derivatives(file, name, storage)}
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.exception("The derivatives of %s could not be built.", name)
+            return
+
+    updated = model.objects.filter(pk=pk, **{field_name: row[field_name]}).update(
+        **{derivatives_field(field_name): derivatives, 'modified': timezone.now()}
+    )
+    delete_derivative_files(storage, previous if updated else derivatives)
+    if updated:
+        image_derivatives_built.send(sender=model, instance_id=pk)
+
+
+def backfill_image_derivatives(force=False):
+    """
+    Build the missing derivatives of every image field, or all of them again with `force`.
+    Returns the number of images processed by model.
+    """
+    counts = {}
+    for model_label, field_name in IMAGE_FIELDS.items():
+        model = apps.get_model(model_label)
+        rows = model.objects.exclude(**{field_name: ''}).exclude(**{f"{field_name}__isnull": True})
+        counts[model_label] = 0
+        for pk, name, derivatives in rows.values_list('pk', field_name, derivatives_field(field_name)).iterator():
+            if force or (derivatives or {}).get('source') != name:
+                build_image_derivatives(model_label, pk, force=force)
+                counts[model_label] += 1
+    return counts
+
+
+def render_derivatives(file, name, storage):
+    """Save a resized copy of an image for each size, returns their names by size."""
+    extension = IMAGE_DERIVATIVE_FORMAT.lower()
+    root = os.path.splitext(name)[0]
+    names = {}
+    with Image.open(file) as image:
+        # JPEG photos are decoded at a reduced scale, close to the largest size, instead of at full size.
+        image.draft('RGB', (max(IMAGE_DERIVATIVE_SIZES.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            transparent = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if transparent else 'RGB')
+
+        for size_name, size in IMAGE_DERIVATIVE_SIZES.items():
+            derivative = image.copy()
+            derivative.thumbnail((size, size), Image.Resampling.LANCZOS)
+            content = BytesIO()
+            derivative.save(content, IMAGE_DERIVATIVE_FORMAT, quality=IMAGE_DERIVATIVE_QUALITY)
+            names[size_name] = storage.save(f"{root}.{size_name}.{extension}", ContentFile(content.getvalue()))
+    return names
+
+
+def delete_derivative_files(storage, derivatives):
+    for size, name in derivatives.items():
+        if size != 'source':
+            storage.delete(name)
+
+
+class ImageDerivativesField(serializers.Field):
+    """The URLs of the derivatives of an image field by size, null until they are built."""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        urls = derivative_urls(instance, self.image_field)
+        request = self.context.get('request')
+        if urls and request:
+            return {size: request.build_absolute_uri(url) for size, url in urls.items()}
+        return urls
@@ -0,0 +1,31 @@
+from django.db import transaction
+
+
+class CommitCallback:
+    """A function and its arguments, waiting for the transaction that scheduled them to commit."""
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        self.called = False
+
+    def __call__(self):
+        self.called = True
+        self.function(*self.args)
+
+    def is_pending(self, function, args):
+        return not self.called and self.function is function and self.args == args
+
+
+def on_commit_once(function, *args, using=None):
+    """
+    Run a function once the current transaction commits, at most once per set of arguments.
+    Meant for callbacks that rebuild from the committed data, so many writes of a transaction share one run.
+    Outside of a transaction the function runs right away.
+    """
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block and any(
+            isinstance(callback, CommitCallback) and callback.is_pending(function, args)
+            for _, callback, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(CommitCallback(function, args), using=using)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_alter_customer_email_and_more'),
+        ('restaurants', '0005_tombstone_and_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['restaurant', 'modified'], name='customer_restaurant_modified'),
+        ),
+    ]
@@ -20,6 +20,9 @@ class Customer(TimeStampedModel):
         constraints = [
             models.UniqueConstraint(fields=['restaurant', 'email'], name="unique_customer_email_per_restaurant")
         ]
+        indexes = [
+            models.Index(fields=['restaurant', 'modified'], name="customer_restaurant_modified"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.restaurant.name})"
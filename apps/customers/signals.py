@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apps.restaurants.sync import record_tombstones
+from .models import Customer
+
+
+@receiver(post_delete, sender=Customer)
+def record_deleted_customer(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone of deleted customers for the terminals that sync them."""
+    record_tombstones(instance, [instance.restaurant_id], origin)
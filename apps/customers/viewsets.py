@@ -1,26 +1,28 @@
 from django.db import IntegrityError
 from rest_framework import viewsets, serializers, status
-from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from ..restaurants.models import Restaurant
 from .models import Customer
 from .serializers import CustomerSerializer
+from ..restaurants.ownership import RestaurantScopedMixin, check_restaurant_owner
+from ..restaurants.pagination import KeysetPaginationMixin
+from ..restaurants.sync import DeltaSyncMixin
 from ..restaurants.permissions import IsRestaurantOwner
 
 
-class CustomerPagination(PageNumberPagination):
+class CustomerPagination(KeysetPaginationMixin, PageNumberPagination):
     """
-    Pagination for Customers.
+    Pagination for Customers, by page number or by cursor.
     """
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 50
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(DeltaSyncMixin, RestaurantScopedMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing customers.
     """
@@ -33,19 +35,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
         """
         Filter customers based on the restaurant.
         """
-        if self.request.user.is_superuser:
-            return Customer.objects.all()
-
-        restaurant_id = self.request.query_params.get("restaurant")
-
-        # Verify the user is the owner of the restaurant
-        if restaurant_id:
-            if not Restaurant.objects.filter(id=restaurant_id, user=self.request.user).exists():
-                raise PermissionDenied("You are not the owner of this restaurant.")
-            return Customer.objects.filter(restaurant_id=restaurant_id)
-
-        # If a restaurant is not specified, return customers from the user's restaurant
-        return Customer.objects.filter(restaurant__user=self.request.user)
+        return self.scope_to_restaurants(Customer.objects.all())
 
     def perform_create(self, serializer):
         """
@@ -58,13 +48,12 @@ class CustomerViewSet(viewsets.ModelViewSet):
             raise ValidationError("A restaurant ID is required")
 
         # Ensure the user owns the specified restaurant
-        if not Restaurant.objects.filter(id=restaurant_id, user=self.request.user).exists():
-            raise ValidationError("You do not have permission to add customers to this restaurant.")
-
-        restaurant = Restaurant.objects.get(id=restaurant_id)
+        restaurant_id = check_restaurant_owner(self.request, restaurant_id,
+                                               "You do not have permission to add customers to this restaurant.",
+                                               ValidationError)
 
         try:
-            serializer.save(restaurant=restaurant)
+            serializer.save(restaurant_id=restaurant_id)
         except IntegrityError:
             return Response({"error": "A customer with this email already exists in this restaurant."},
                             status=status.HTTP_400_BAD_REQUEST)
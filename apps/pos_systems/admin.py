@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .forms import OrderProductForm
-from .models import Order, Category, Product, OrderProduct
+from .models import Order, Category, Product, OrderProduct, DailyProductSales, ReportJob, ZReport
 
 
 @admin.register(Order)
@@ -47,10 +47,10 @@ class OrderProductAdmin(admin.ModelAdmin):
     Filters products based on the selected order.
     """
     form = OrderProductForm
-    list_display = ('order', 'product', 'quantity', 'get_restaurant')
+    list_display = ('order', 'product', 'quantity', 'unit_price', 'line_total', 'get_restaurant')
     search_fields = ('order__id', 'product__name')
     list_filter = ('order__restaurant', 'product__categories')
-    readonly_fields = ('order',)
+    readonly_fields = ('order', 'unit_price', 'line_total')
 
     def get_restaurant(self, obj):
         """Show the restaurant of the order in the list display."""
@@ -60,3 +60,42 @@ class OrderProductAdmin(admin.ModelAdmin):
     def has_add_permission(self, request, obj=None):
         """Disable the 'Add' button to prevent users from creating OrderProduct manually."""
         return False
+
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    """
+    Admin panel configuration for the daily product sales rollup.
+    """
+    list_display = ('date', 'restaurant', 'product', 'quantity_sold', 'total_revenue')
+    list_filter = ('restaurant', 'date')
+    search_fields = ('product__name', 'restaurant__name')
+    ordering = ('-date',)
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """
+    Admin panel configuration for background report jobs.
+    """
+    list_display = ('id', 'user', 'report', 'status', 'created', 'finished')
+    list_filter = ('status', 'report')
+    search_fields = ('user__username', 'user__email')
+    readonly_fields = ('parameters', 'result', 'error', 'started', 'finished')
+    ordering = ('-created',)
+
+
+@admin.register(ZReport)
+class ZReportAdmin(admin.ModelAdmin):
+    """
+    Admin panel configuration for the closed business days. Snapshots are read only.
+    """
+    list_display = ('business_date', 'restaurant', 'closed_by', 'closed')
+    list_filter = ('restaurant',)
+    ordering = ('-business_date',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
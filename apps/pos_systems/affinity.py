@@ -0,0 +1,144 @@
+import io
+from datetime import datetime, time
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from .archive import order_line_models
+from .models import AffinityCheckpoint, Product, ProductAffinity
+from .reports import CANCELLED_STATUS
+
+AFFINITY_CHUNK_SIZE = 10000
+
+
+def load_order_lines(restaurant_id, since, until):
+    """
+    Return the (order id, product id) pairs of the non cancelled orders placed in a period, as arrays.
+    Archived orders keep their ids, so their lines are read too when the period reaches the archive.
+    """
+    pairs = []
+    for line_model in order_line_models(timezone.localdate(since) if since else None):
+        lines = (
+            line_model.objects
+            .filter(order__restaurant_id=restaurant_id, order__created__lt=until)
+            .exclude(order__status=CANCELLED_STATUS)
+            .values_list('order_id', 'product_id')
+        )
+        if since:
+            lines = lines.filter(order__created__gte=since)
+        pairs.append(np.fromiter(lines.iterator(chunk_size=AFFINITY_CHUNK_SIZE), dtype=np.dtype((np.int64, 2))))
+
+    pairs = np.concatenate(pairs)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def count_cooccurrences(order_ids, product_indexes, product_count):
+    """
+    Return the number of orders containing each pair of products, as a sparse matrix.
+    The diagonal holds the number of orders containing each product.
+    """
+    _, order_indexes = np.unique(order_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(order_indexes), dtype=np.int64), (order_indexes, product_indexes)),
+        shape=(order_indexes.max(initial=-1) + 1, product_count),
+    )
+    baskets.data[:] = 1  # A product counts once per order.
+    return (baskets.T @ baskets).tocsr()
+
+
+def index_products(product_ids, known_product_ids):
+    """
+    Map product ids to matrix indexes. Known products keep their index and new ones are appended,
+    so a stored matrix only needs to be padded.
+    """
+    new_product_ids = np.setdiff1d(np.unique(product_ids), known_product_ids)
+    all_product_ids = np.concatenate([np.asarray(known_product_ids, dtype=np.int64), new_product_ids])
+
+    order = np.argsort(all_product_ids)
+    indexes = order[np.searchsorted(all_product_ids, product_ids, sorter=order)]
+    return all_product_ids, indexes
+
+
+def rank_affinities(matrix, order_count, top, min_count):
+    """
+    Compute support, confidence and lift of the pairs of products bought together at least `min_count`
+    times, keeping the `top` partners of each product by lift.
+    Returns the arrays (product, partner, rank, pair count, support, confidence, lift).
+    """
+    pairs = sparse.triu(matrix, k=1).tocoo()
+    frequent = pairs.data >= min_count
+    item_counts = matrix.diagonal()
+
+    # The matrix is symmetric, consider each pair in both directions.
+    products = np.concatenate([pairs.row[frequent], pairs.col[frequent]])
+    partners = np.concatenate([pairs.col[frequent], pairs.row[frequent]])
+    counts = np.concatenate([pairs.data[frequent], pairs.data[frequent]])
+
+    support = counts / order_count
+    confidence = counts / item_counts[products]
+    lift = confidence / (item_counts[partners] / order_count)
+
+    ordering = np.lexsort((-confidence, -lift, products))
+    ranks = np.arange(len(ordering)) - np.searchsorted(products[ordering], products[ordering], side='left')
+    kept = ordering[ranks < top]
+
+    return (products[kept], partners[kept], ranks[ranks < top] + 1, counts[kept],
+            support[kept], confidence[kept], lift[kept])
+
+
+def dump_matrix(matrix):
+    buffer = io.BytesIO()
+    sparse.save_npz(buffer, matrix)
+    return buffer.getvalue()
+
+
+def load_matrix(data, size):
+    matrix = sparse.load_npz(io.BytesIO(bytes(data))).tocsr()
+    matrix.resize((size, size))
+    return matrix
+
+
+def build_product_affinity(restaurant_id, top=10, min_count=2, full=False):
+    """
+    Refresh the product affinities of a restaurant from its order history.
+    Only closed days are counted; unless `full` is set, the counts stored in the checkpoint are reused
+    and only the orders placed after it are read. Returns the number of affinities stored.
+    """
+    until = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    checkpoint = None if full else AffinityCheckpoint.objects.filter(restaurant_id=restaurant_id).first()
+    known_product_ids = checkpoint.product_ids if checkpoint else []
+
+    order_ids, product_ids = load_order_lines(restaurant_id, checkpoint and checkpoint.processed_until, until)
+    all_product_ids, product_indexes = index_products(product_ids, known_product_ids)
+
+    matrix = count_cooccurrences(order_ids, product_indexes, len(all_product_ids))
+    order_count = len(np.unique(order_ids))
+    if checkpoint:
+        matrix = matrix + load_matrix(checkpoint.matrix, len(all_product_ids))
+        order_count += checkpoint.order_count
+
+    affinities = []
+    if order_count:
+        columns = rank_affinities(matrix, order_count, top, min_count)
+        # Products deleted since they were counted are skipped.
+        existing = set(Product.objects.filter(restaurants=restaurant_id).values_list('id', flat=True))
+        affinities = [
+            ProductAffinity(restaurant_id=restaurant_id, product_id=int(all_product_ids[product]),
+                            partner_id=int(all_product_ids[partner]), rank=int(rank), pair_count=int(count),
+                            support=float(support), confidence=float(confidence), lift=float(lift))
+            for product, partner, rank, count, support, confidence, lift in zip(*columns)
+            if all_product_ids[product] in existing and all_product_ids[partner] in existing
+        ]
+
+    with transaction.atomic():
+        ProductAffinity.objects.filter(restaurant_id=restaurant_id).delete()
+        ProductAffinity.objects.bulk_create(affinities, batch_size=1000)
+        AffinityCheckpoint.objects.update_or_create(restaurant_id=restaurant_id, defaults={
+            'processed_until': until,
+            'order_count': order_count,
+            'product_ids': all_product_ids.tolist(),
+            'matrix': dump_matrix(matrix),
+        })
+    return len(affinities)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PosSystemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.pos_systems'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.restaurants.models import Tombstone
+from .models import ArchivedOrder, ArchivedOrderProduct, Order, OrderProduct
+
+# Days closed orders stay in the live tables. Older ones are moved to the archive by `archive_orders`,
+# and reports and exports only read the archive for ranges starting before this window,
+# so it can be lowered at any time but raising it leaves the archived days it adds out of those reads.
+ORDER_ARCHIVE_AFTER_DAYS = getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365)
+# How many orders are moved in each transaction.
+ORDER_ARCHIVE_CHUNK_SIZE = getattr(settings, 'ORDER_ARCHIVE_CHUNK_SIZE', 1000)
+
+# Completed and cancelled orders, the statuses an order never leaves.
+ARCHIVED_STATUSES = [status for status, targets in Order.STATUS_TRANSITIONS.items() if not targets]
+
+
+def archive_horizon():
+    """Return the first day whose orders stay live, the orders of the days before it may be archived."""
+    return timezone.localdate() - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS)
+
+
+def reaches_archive(start_date):
+    """Whether a range starting on a day (None for the whole history) may contain archived orders."""
+    return start_date is None or start_date < archive_horizon()
+
+
+def order_models(start_date):
+    """Return the models holding the orders of a range starting on a day: live orders, and the archive if needed."""
+    return [Order, ArchivedOrder] if reaches_archive(start_date) else [Order]
+
+
+def order_line_models(start_date):
+    """Return the models holding the order lines of a range starting on a day."""
+    return [OrderProduct, ArchivedOrderProduct] if reaches_archive(start_date) else [OrderProduct]
+
+
+def field_names(model):
+    """The columns copied to the archive, the archive models have a field for each of them."""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def delete_rows(model, field_name, values):
+    """
+    Delete the rows of a model whose field is in `values` with one DELETE, without loading them or sending
+    the delete signals: archived orders were not deleted, their sales, totals and tables must not change.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.get_field(field_name).column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(values))})", values)
+        return cursor.rowcount
+
+
+def archive_chunk(cutoff, chunk_size):
+    """Move one chunk of closed orders created before `cutoff`, with their lines and tables, to the archive."""
+    with transaction.atomic():
+        order_ids = list(
+            Order.objects.filter(status__in=ARCHIVED_STATUSES, created__lt=cutoff)
+            .order_by('id').select_for_update().values_list('id', flat=True)[:chunk_size]
+        )
+        if not order_ids:
+            return 0
+
+        orders = Order.objects.filter(id__in=order_ids)
+        lines = OrderProduct.objects.filter(order_id__in=order_ids)
+        table_links = Order.tables.through.objects.filter(order_id__in=order_ids)
+
+        archived_orders = ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(**row) for row in orders.values(*field_names(Order))
+        ])
+        ArchivedOrder.tables.through.objects.bulk_create([
+            ArchivedOrder.tables.through(archivedorder_id=order_id, table_id=table_id)
+            for order_id, table_id in table_links.values_list('order_id', 'table_id')
+        ])
+        ArchivedOrderProduct.objects.bulk_create([
+            ArchivedOrderProduct(**row) for row in lines.values(*field_names(OrderProduct))
+        ])
+
+        # The synced orders only hold live orders, the terminals drop the archived ones like deleted ones.
+        Tombstone.objects.bulk_create([
+            Tombstone(restaurant_id=order.restaurant_id, model=Order._meta.label_lower, object_id=order.id)
+            for order in archived_orders
+        ])
+
+        delete_rows(Order.tables.through, 'order', order_ids)
+        delete_rows(OrderProduct, 'order', order_ids)
+        delete_rows(Order, 'id', order_ids)
+    return len(order_ids)
+
+
+def archive_orders(chunk_size=ORDER_ARCHIVE_CHUNK_SIZE):
+    """
+    Move the closed orders older than the retention window to the archive, one chunk per transaction,
+    so the live tables only grow with the orders of the window. Returns the number of orders moved.
+    """
+    cutoff = timezone.make_aware(datetime.combine(archive_horizon(), time.min))
+    archived = 0
+    while moved := archive_chunk(cutoff, chunk_size):
+        archived += moved
+    return archived
@@ -0,0 +1,147 @@
+import asyncio
+import itertools
+import json
+import threading
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+# How many events a screen may fall behind before it is asked to resync.
+ORDER_EVENTS_QUEUE_SIZE = getattr(settings, 'ORDER_EVENTS_QUEUE_SIZE', 100)
+# How many recent events of each restaurant are kept to replay to screens that reconnect.
+ORDER_EVENTS_HISTORY_SIZE = getattr(settings, 'ORDER_EVENTS_HISTORY_SIZE', 100)
+
+ORDER_CREATED = 'order_created'
+ORDER_LINE_ADDED = 'order_line_added'
+ORDER_STATUS_CHANGED = 'order_status_changed'
+TABLE_STATUS_CHANGED = 'table_status_changed'
+
+
+class Event:
+    """An event of a restaurant, in the Server-Sent Events format."""
+
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def encode(self):
+        data = json.dumps(self.data, cls=DjangoJSONEncoder)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {data}\n\n"
+
+
+class Subscription:
+    """
+    The queue of events of one connected screen, living on the event loop of its connection.
+    When the screen falls too far behind, the queue is replaced by a single None, asking it to resync.
+    """
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+    def deliver(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class EventBroker:
+    """
+    In-process pub/sub of the events of each restaurant.
+    Events are published from any thread and handed to the event loop of each subscriber,
+    so the writes of the REST API reach the screens connected to the same process.
+    """
+
+    def __init__(self, queue_size=ORDER_EVENTS_QUEUE_SIZE, history_size=ORDER_EVENTS_HISTORY_SIZE):
+        self.queue_size = queue_size
+        self.history_size = history_size
+        # Event ids start with a token of the process, ids from before a restart are never trusted.
+        self.boot = uuid.uuid4().hex[:8]
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._history = defaultdict(partial(deque, maxlen=history_size))
+        self._evicted = {}
+
+    def publish(self, restaurant_id, event_type, data):
+        with self._lock:
+            event = Event(f"{self.boot}-{next(self._counter)}", event_type, data)
+            history = self._history[restaurant_id]
+            if len(history) == history.maxlen:
+                self._evicted[restaurant_id] = history[0].id
+            history.append(event)
+            subscriptions = list(self._subscriptions[restaurant_id])
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                pass  # The loop of the connection is already closed.
+        return event
+
+    def recent_events(self, restaurant_id):
+        with self._lock:
+            return list(self._history[restaurant_id])
+
+    def sequence(self, event_id):
+        """Return the position of an event id of this process, or None for unknown ids."""
+        boot, _, number = str(event_id).partition('-')
+        return int(number) if boot == self.boot and number.isdigit() else None
+
+    @contextmanager
+    def subscribe(self, restaurant_id, last_event_id=None):
+        """
+        Subscribe the running event loop to the events of a restaurant.
+        With the id of the last event a screen received, the events it missed are replayed first;
+        if they are no longer kept, it gets a None and has to resync.
+        """
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if last_event_id:
+                last = self.sequence(last_event_id)
+                evicted = self.sequence(self._evicted.get(restaurant_id, f"{self.boot}-0"))
+                if last is None or last < evicted:
+                    subscription.deliver(None)
+                else:
+                    for event in self._history[restaurant_id]:
+                        if self.sequence(event.id) > last:
+                            subscription.deliver(event)
+            self._subscriptions[restaurant_id].add(subscription)
+
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions[restaurant_id].discard(subscription)
+                if not self._subscriptions[restaurant_id]:
+                    del self._subscriptions[restaurant_id]
+
+    def subscriber_count(self, restaurant_id=None):
+        with self._lock:
+            if restaurant_id is not None:
+                return len(self._subscriptions.get(restaurant_id, ()))
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+broker = EventBroker()
+
+
+def publish_event(restaurant_id, event_type, data):
+    """Publish an event of a restaurant once the current transaction commits, so screens never see rollbacks."""
+    transaction.on_commit(partial(broker.publish, restaurant_id, event_type, data))
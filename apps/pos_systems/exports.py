@@ -0,0 +1,101 @@
+import csv
+import itertools
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+EXPORT_CHUNK_SIZE = 500
+
+ORDER_COLUMNS = [
+    'order_id', 'created', 'restaurant_id', 'status', 'payment_method', 'employee_id', 'customer_id',
+    'customer_name', 'tables', 'subtotal', 'discount', 'tax', 'tips', 'total',
+]
+LINE_COLUMNS = ['product_id', 'product_name', 'quantity', 'unit_price', 'line_total']
+
+
+class Echo:
+    """File-like object that returns what is written, so the csv writer can feed a streaming response."""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def iter_export_orders(querysets):
+    """
+    Iterate the orders of querysets, like the archived and the live orders, with their lines and tables.
+    Rows are fetched with a server-side cursor in chunks, so memory stays flat regardless of the range size.
+    """
+    return itertools.chain.from_iterable(
+        queryset
+        .order_by('id')
+        .prefetch_related('tables', Prefetch('order_products',
+                                             queryset=line_model(queryset).objects.select_related('product')))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for queryset in querysets
+    )
+
+
+def line_model(queryset):
+    """The model of the lines of the orders of a queryset."""
+    return queryset.model._meta.get_field('order_products').related_model
+
+
+def order_to_dict(order):
+    """Flatten an order into the export columns."""
+    return {
+        'order_id': order.id,
+        'created': order.created,
+        'restaurant_id': order.restaurant_id,
+        'status': order.get_status_display(),
+        'payment_method': order.get_payment_method_display() if order.payment_method is not None else None,
+        'employee_id': order.employee_id,
+        'customer_id': order.customer_id,
+        'customer_name': order.customer_name,
+        'tables': [table.table_number for table in order.tables.all()],
+        'subtotal': order.subtotal,
+        'discount': order.discount,
+        'tax': order.tax,
+        'tips': order.tips,
+        'total': order.total,
+    }
+
+
+def line_to_dict(line):
+    """Flatten an order line into the export columns."""
+    return {
+        'product_id': line.product_id,
+        'product_name': line.product.name,
+        'quantity': line.quantity,
+        'unit_price': line.unit_price,
+        'line_total': line.line_total,
+    }
+
+
+def stream_orders_csv(querysets):
+    """Yield the orders as CSV, one row per order line. Orders without lines get a single row."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_COLUMNS + LINE_COLUMNS)
+
+    for order in iter_export_orders(querysets):
+        row = order_to_dict(order)
+        row['tables'] = ' '.join(str(number) for number in row['tables'])
+        lines = [line_to_dict(line) for line in order.order_products.all()] or [{}]
+        for line in lines:
+            yield writer.writerow([row[column] for column in ORDER_COLUMNS] +
+                                  [line.get(column) for column in LINE_COLUMNS])
+
+
+def stream_orders_ndjson(querysets):
+    """Yield the orders as newline-delimited JSON, one object per order with its lines nested."""
+    for order in iter_export_orders(querysets):
+        row = order_to_dict(order)
+        row['lines'] = [line_to_dict(line) for line in order.order_products.all()]
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_orders_csv, 'text/csv'),
+    'ndjson': (stream_orders_ndjson, 'application/x-ndjson'),
+}
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.customers.models import Customer
+from apps.restaurants.models import Employee, Table
+from .events import ORDER_CREATED, publish_event
+from .occupancy import refresh_table_status
+from .models import ArchivedOrder, Order, OrderProduct, Product
+from .report_cache import schedule_report_version_bump
+from .reports import schedule_daily_product_sales_refresh
+from .serializers import IngestedOrderSerializer
+
+# How many orders a terminal can send in one batch.
+MAX_INGEST_BATCH_SIZE = getattr(settings, 'ORDER_INGEST_MAX_BATCH_SIZE', 500)
+
+
+def ingest_result(index, data, status, **extra):
+    key = data.get('idempotency_key') if isinstance(data, dict) else None
+    return {"index": index, "idempotency_key": key, "status": status, **extra}
+
+
+def ingest_orders(restaurant_id, orders):
+    """
+    Insert a batch of orders replayed by a terminal, with their tables and lines.
+    Returns one result per order, in the same order: "created", "duplicate" when its idempotency key
+    was already ingested, or "invalid" with the errors. Invalid orders do not stop the others.
+    """
+    results, valid_orders = {}, {}
+    for index, data in enumerate(orders):
+        serializer = IngestedOrderSerializer(data=data)
+        if serializer.is_valid():
+            valid_orders[index] = serializer.validated_data
+        else:
+            results[index] = ingest_result(index, data, "invalid", errors=serializer.errors)
+
+    try:
+        results.update(insert_orders(restaurant_id, valid_orders))
+    except IntegrityError:
+        # A concurrent replay of the same batch inserted some keys first, or an order broke a constraint.
+        # Insert the orders one by one, so only the ones that conflict are reported.
+        for index, data in valid_orders.items():
+            results.update(insert_order(restaurant_id, index, data))
+
+    return [results[index] for index in range(len(orders))]
+
+
+def insert_order(restaurant_id, index, data):
+    """
+    Insert a single order of a batch that failed, as "duplicate" when its key was inserted meanwhile,
+    or "invalid" when it still breaks a constraint.
+    """
+    try:
+        return insert_orders(restaurant_id, {index: data})
+    except IntegrityError:
+        order_id = ingested_order_ids(restaurant_id, [data['idempotency_key']]).get(data['idempotency_key'])
+        if order_id:
+            return {index: ingest_result(index, data, "duplicate", id=order_id)}
+        return {index: ingest_result(index, data, "invalid",
+                                     errors={"non_field_errors": ["The order conflicts with the stored data."]})}
+
+
+def ingested_order_ids(restaurant_id, keys):
+    """
+    Return the ids of the orders already ingested with some idempotency keys, by key.
+    Archived orders count too, a terminal replaying a very old batch must not insert them again.
+    """
+    order_ids = {}
+    for model in (Order, ArchivedOrder):
+        orders = model.objects.filter(restaurant_id=restaurant_id, idempotency_key__in=keys)
+        order_ids.update(orders.values_list('idempotency_key', 'id'))
+    return order_ids
+
+
+def reference_errors(data, employee_ids, customer_ids, table_ids, products):
+    """Return the errors of the references of an order, given the ids that belong to its restaurant."""
+    errors = {}
+    if data['employee'] not in employee_ids:
+        errors['employee'] = ["The assigned employee does not belong to this restaurant."]
+    if data.get('customer') and data['customer'] not in customer_ids:
+        errors['customer'] = ["The assigned customer does not belong to this restaurant."]
+
+    invalid_table_ids = set(data.get('tables', [])) - table_ids
+    if invalid_table_ids:
+        errors['tables'] = [f"Table {min(invalid_table_ids)} does not exist or does not belong to this restaurant."]
+
+    for item in data['order_products']:
+        product = products.get(item['product'])
+        if product is None:
+            errors['order_products'] = ["One or more products do not belong to the restaurant of this order."]
+            break
+        if product.status != 0:
+            errors['order_products'] = [f"The product '{product.name}' is not available for ordering."]
+            break
+
+    return errors
+
+
+def insert_orders(restaurant_id, orders):
+    """
+    Check the references of validated orders with one query per model and insert the new ones in bulk.
+    Returns the results by index.
+    """
+    keys = {data['idempotency_key'] for data in orders.values()}
+    existing = ingested_order_ids(restaurant_id, keys)
+
+    employee_ids = set(Employee.objects.filter(
+        restaurant_id=restaurant_id, id__in={data['employee'] for data in orders.values()}
+    ).values_list('id', flat=True))
+    customer_ids = set(Customer.objects.filter(
+        restaurant_id=restaurant_id, id__in={data['customer'] for data in orders.values() if data.get('customer')}
+    ).values_list('id', flat=True))
+    table_ids = set(Table.objects.filter(
+        restaurant_id=restaurant_id, id__in={table for data in orders.values() for table in data.get('tables', [])}
+    ).values_list('id', flat=True))
+    products = Product.objects.filter(
+        restaurants=restaurant_id,
+        id__in={item['product'] for data in orders.values() for item in data['order_products']},
+    ).only('name', 'price', 'status')
+    products = {product.id: product for product in products}
+
+    results, new_orders, repeated = {}, {}, {}
+    for index, data in orders.items():
+        key = data['idempotency_key']
+        if key in existing:
+            results[index] = ingest_result(index, data, "duplicate", id=existing[key])
+        elif key in new_orders:
+            repeated[index] = data
+        elif errors := reference_errors(data, employee_ids, customer_ids, table_ids, products):
+            results[index] = ingest_result(index, data, "invalid", errors=errors)
+        else:
+            new_orders[key] = (index, data)
+
+    now = timezone.now()
+    with transaction.atomic():
+        created = Order.objects.bulk_create([
+            Order(restaurant_id=restaurant_id, idempotency_key=key, created=data.get('created', now), modified=now,
+                  employee_id=data['employee'], customer_id=data.get('customer'),
+                  customer_name=data.get('customer_name', ''), status=data['status'],
+                  discount=data.get('discount'), tax=data.get('tax'), tips=data.get('tips'),
+                  payment_method=data.get('payment_method'), guest_count=data.get('guest_count'))
+            for key, (index, data) in new_orders.items()
+        ])
+        Order.tables.through.objects.bulk_create([
+            Order.tables.through(order_id=order.id, table_id=table_id)
+            for order, (index, data) in zip(created, new_orders.values())
+            for table_id in set(data.get('tables', []))
+        ])
+        # bulk_create skips the signals that keep the status of the tables.
+        refresh_table_status({table_id for _, data in new_orders.values() for table_id in data.get('tables', [])})
+        OrderProduct.objects.bulk_create([
+            OrderProduct.for_product(order, products[item['product']], item['quantity'])
+            for order, (index, data) in zip(created, new_orders.values())
+            for item in data['order_products']
+        ])
+        Order.recalculate_totals([order.id for order in created])
+
+        # bulk_create skips the signals that keep the reports in sync.
+        for day in {timezone.localdate(order.created) for order in created}:
+            schedule_daily_product_sales_refresh(restaurant_id, day)
+        if created:
+            schedule_report_version_bump(restaurant_id)
+        for order in created:
+            publish_event(restaurant_id, ORDER_CREATED, {'order': order.id, 'status': order.status})
+
+    for order, (index, data) in zip(created, new_orders.values()):
+        results[index] = ingest_result(index, data, "created", id=order.id)
+    for index, data in repeated.items():
+        first_index, _ = new_orders[data['idempotency_key']]
+        results[index] = ingest_result(index, data, "duplicate", id=results[first_index]["id"])
+    return results
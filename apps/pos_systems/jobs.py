@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+from datetime import date, timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.common.background import run_in_background
+
+from .models import ReportJob
+from .reports import employee_sales_report, products_report, sales_heatmap_report
+
+logger = logging.getLogger(__name__)
+
+REPORTS = {
+    'products': products_report,
+    'sales-heatmap': sales_heatmap_report,
+    'employees': employee_sales_report,
+}
+
+# How report jobs are run:
+#   'thread': on the background pool inside the Django process (default).
+#   'worker': only queued, a `process_report_jobs` worker process runs them.
+#   'eager':  inline when the request commits (used by the tests).
+REPORT_JOBS_MODE = getattr(settings, 'REPORT_JOBS_MODE', 'thread')
+# Seconds after which a job still pending or running is taken as lost, for example in a pool of a process that
+# restarted: it is no longer reused, and a running one can be claimed again.
+REPORT_JOB_TIMEOUT = getattr(settings, 'REPORT_JOB_TIMEOUT', 60 * 30)
+
+
+def hash_parameters(report, parameters):
+    payload = json.dumps([report, parameters], cls=DjangoJSONEncoder, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def runnable_report_jobs():
+    """The jobs a worker may claim: the pending ones and the running ones that timed out."""
+    stale = timezone.now() - timedelta(seconds=REPORT_JOB_TIMEOUT)
+    return ReportJob.objects.filter(Q(status=0) | Q(status=1, started__lt=stale))
+
+
+def submit_report_job(user, report, parameters):
+    """
+    Return a job computing a report, reusing an equivalent one when possible.
+    Pending and running jobs are reused until they time out, and completed ones when their range
+    was already closed when they ran, so repeat downloads do not recompute anything.
+    """
+    parameters_hash = hash_parameters(report, parameters)
+    stale = timezone.now() - timedelta(seconds=REPORT_JOB_TIMEOUT)
+    job = (
+        ReportJob.objects
+        .filter(user=user, parameters_hash=parameters_hash)
+        .filter(Q(status=0, created__gte=stale) | Q(status=1, started__gte=stale) |
+                Q(status=2, created__date__gt=parameters['end_date']))
+        .order_by('-created')
+        .first()
+    )
+    if job:
+        return job
+
+    job = ReportJob.objects.create(user=user, report=report, parameters=parameters,
+                                   parameters_hash=parameters_hash)
+    if REPORT_JOBS_MODE == 'thread':
+        transaction.on_commit(partial(run_in_background, run_report_job, job.id))
+    elif REPORT_JOBS_MODE == 'eager':
+        transaction.on_commit(partial(run_report_job, job.id))
+    return job
+
+
+def run_report_job(job_id):
+    """
+    Compute a pending job, or a running one that timed out, and store its result.
+    The job is claimed with a conditional update, so a job is never run twice by concurrent workers.
+    """
+    now = timezone.now()
+    if not runnable_report_jobs().filter(id=job_id).update(status=1, started=now, modified=now):
+        return
+
+    job = ReportJob.objects.get(id=job_id)
+    parameters = dict(job.parameters)
+    restaurant_ids = parameters.pop('restaurant_ids')
+    parameters['start_date'] = date.fromisoformat(parameters['start_date'])
+    parameters['end_date'] = date.fromisoformat(parameters['end_date'])
+
+    try:
+        job.result = REPORTS[job.report](restaurant_ids, **parameters)
+        job.status = 2
+    except Exception as error:
+        logger.exception("Report job %s failed.", job.id)
+        job.error = str(error)
+        job.status = 3
+    job.finished = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished', 'modified'])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.pos_systems.archive import ORDER_ARCHIVE_AFTER_DAYS, ORDER_ARCHIVE_CHUNK_SIZE, archive_horizon, archive_orders
+
+
+class Command(BaseCommand):
+    """
+    Move the completed and cancelled orders older than the retention window to the archive tables.
+    Meant to run daily, so the live order tables only hold the orders of the window.
+    """
+    help = f"Archive the closed orders older than {ORDER_ARCHIVE_AFTER_DAYS} days (ORDER_ARCHIVE_AFTER_DAYS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=ORDER_ARCHIVE_CHUNK_SIZE,
+                            help="Orders moved in each transaction.")
+
+    def handle(self, *args, **options):
+        count = archive_orders(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {count} orders created before {archive_horizon()}."))
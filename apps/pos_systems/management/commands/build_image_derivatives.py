@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.common.images import IMAGE_DERIVATIVE_SIZES, backfill_image_derivatives
+
+
+class Command(BaseCommand):
+    """
+    Build the resized copies of the product, employee and user images uploaded before they existed,
+    or of every image after changing IMAGE_DERIVATIVE_SIZES or IMAGE_DERIVATIVE_FORMAT.
+    """
+    help = f"Build the missing image derivatives ({', '.join(IMAGE_DERIVATIVE_SIZES)})."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Build the derivatives of every image again.")
+
+    def handle(self, *args, **options):
+        counts = backfill_image_derivatives(force=options['force'])
+        for model_label, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f"{model_label}: {count} images processed."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.pos_systems.affinity import build_product_affinity
+from apps.restaurants.models import Restaurant
+
+
+class Command(BaseCommand):
+    """
+    Refresh the frequently-bought-together products of each restaurant.
+    """
+    help = "Build the product affinities from the order history, incrementally from the last checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, action='append', dest='restaurants',
+                            help="Only refresh this restaurant. Can be repeated.")
+        parser.add_argument('--top', type=int, default=10, help="Partners kept per product.")
+        parser.add_argument('--min-count', type=int, default=2,
+                            help="Minimum number of orders containing both products.")
+        parser.add_argument('--full', action='store_true', help="Ignore the checkpoint and recount every order.")
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.order_by('id')
+        if options['restaurants']:
+            restaurants = restaurants.filter(id__in=options['restaurants'])
+
+        for restaurant_id in restaurants.values_list('id', flat=True):
+            count = build_product_affinity(restaurant_id, top=options['top'], min_count=options['min_count'],
+                                           full=options['full'])
+            self.stdout.write(f"Restaurant {restaurant_id}: {count} affinities.")
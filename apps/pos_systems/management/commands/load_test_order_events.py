@@ -0,0 +1,105 @@
+import asyncio
+import json
+import resource
+import statistics
+import time
+
+from asgiref.testing import ApplicationCommunicator
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.pos_systems.events import broker
+from apps.restaurants.models import Restaurant
+
+
+class Command(BaseCommand):
+    """
+    Measure how many screens following the order events one worker can serve.
+    The screens are connected to the ASGI application of this process, like one uvicorn or daphne worker,
+    then events are published and the delay until every screen receives them is reported.
+    """
+    help = "Load test the order events stream with many connected screens."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurant', type=int, required=True, help="The restaurant the screens follow.")
+        parser.add_argument('--screens', type=int, default=500, help="Number of connected screens.")
+        parser.add_argument('--events', type=int, default=50, help="Number of events to publish.")
+        parser.add_argument('--interval', type=float, default=0.05, help="Seconds between the events.")
+        parser.add_argument('--host', default='localhost', help="Host header, it must be in ALLOWED_HOSTS.")
+
+    def handle(self, *args, **options):
+        restaurant = Restaurant.objects.filter(id=options['restaurant']).select_related('user').first()
+        if not restaurant:
+            raise CommandError(f"Restaurant {options['restaurant']} does not exist.")
+
+        token = str(AccessToken.for_user(restaurant.user))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': reverse('order-events'), 'query_string': f'restaurant={restaurant.id}'.encode(), 'root_path': '',
+            'headers': [(b'host', options['host'].encode()), (b'authorization', f'Bearer {token}'.encode())],
+            'client': ('127.0.0.1', 0), 'server': (options['host'], 80),
+        }
+        asyncio.run(self.run(scope, restaurant.id, options))
+
+    async def run(self, scope, restaurant_id, options):
+        application = ASGIHandler()
+        screens = options['screens']
+        events = options['events']
+
+        started = time.perf_counter()
+        connections = await asyncio.gather(*[self.connect(application, scope) for _ in range(screens)])
+        connect_time = time.perf_counter() - started
+        self.stdout.write(f"{screens} screens connected in {connect_time:.2f}s "
+                          f"({broker.subscriber_count(restaurant_id)} subscribed).")
+
+        latencies = []
+        readers = [asyncio.create_task(self.read(connection, events, latencies)) for connection in connections]
+        for sequence in range(events):
+            broker.publish(restaurant_id, 'load_test', {'sequence': sequence, 'sent': time.perf_counter()})
+            await asyncio.sleep(options['interval'])
+
+        done, pending = await asyncio.wait(readers, timeout=10)
+        for reader in pending:
+            reader.cancel()
+        for connection in connections:
+            await connection.send_input({'type': 'http.disconnect'})
+            await connection.wait(timeout=1)
+
+        expected = screens * events
+        self.stdout.write(f"Delivered {len(latencies)} of {expected} events, "
+                          f"{len(pending)} screens fell behind.")
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                f"Delivery latency: p50 {statistics.median(latencies) * 1000:.1f}ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms, max {latencies[-1] * 1000:.1f}ms."
+            )
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"Peak memory of the worker: {peak_memory:.0f}MB.")
+
+    @staticmethod
+    async def connect(application, scope):
+        connection = ApplicationCommunicator(application, scope)
+        await connection.send_input({'type': 'http.request', 'body': b'', 'more_body': False})
+        start = await connection.output_queue.get()
+        if start.get('status') != 200:
+            body = await connection.output_queue.get()
+            raise CommandError(f"The stream answered {start.get('status')}: {body.get('body', b'').decode()}")
+        await connection.output_queue.get()  # The retry delay, sent once subscribed.
+        return connection
+
+    @staticmethod
+    async def read(connection, events, latencies):
+        """Read the events of one screen, recording how long each one took to arrive."""
+        received = 0
+        while received < events:
+            message = await connection.output_queue.get()
+            for chunk in message.get('body', b'').decode().split('\n\n'):
+                data = next((line[6:] for line in chunk.split('\n') if line.startswith('data: ')), None)
+                if data and 'sent' in data:
+                    latencies.append(time.perf_counter() - json.loads(data)['sent'])
+                    received += 1
+                elif 'event: resync' in chunk:
+                    return
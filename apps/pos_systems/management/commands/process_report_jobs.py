@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.common.background import BACKGROUND_MAX_WORKERS, get_executor, run_in_background
+from apps.pos_systems.jobs import run_report_job, runnable_report_jobs
+
+
+class Command(BaseCommand):
+    """
+    Local worker process for the background report jobs, used with REPORT_JOBS_MODE = 'worker'.
+    It also picks up the running jobs that timed out, left behind by a process that stopped.
+    """
+    help = "Run the pending and timed out report jobs, polling for new ones unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the pending jobs and exit.")
+        parser.add_argument('--workers', type=int, default=BACKGROUND_MAX_WORKERS,
+                            help="Maximum number of jobs running at the same time.")
+        parser.add_argument('--interval', type=float, default=2, help="Seconds between two polls.")
+
+    def handle(self, *args, **options):
+        executor = get_executor(options['workers'])
+        # The jobs queued or running on the pool, so the next polls do not queue them again.
+        submitted = {}
+
+        while True:
+            submitted = {job_id: future for job_id, future in submitted.items() if not future.done()}
+            job_ids = runnable_report_jobs().order_by('created').values_list('id', flat=True)
+            queued = [job_id for job_id in job_ids if job_id not in submitted]
+            for job_id in queued:
+                submitted[job_id] = run_in_background(run_report_job, job_id)
+            if queued:
+                self.stdout.write(f"Queued {len(queued)} report jobs.")
+
+            if options['once']:
+                executor.shutdown(wait=True)
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.pos_systems.search import rebuild_product_search
+
+
+class Command(BaseCommand):
+    """
+    Index every product again in the product search table.
+    The signals keep it in sync, this is only needed after writes that skip them, like a queryset update.
+    """
+    help = "Rebuild the product search index."
+
+    def handle(self, *args, **options):
+        count = rebuild_product_search()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
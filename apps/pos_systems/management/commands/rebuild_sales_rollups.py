@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.pos_systems.reports import rebuild_daily_product_sales
+
+
+class Command(BaseCommand):
+    """
+    Rebuild or backfill the daily product sales rollup for a date range.
+    """
+    help = "Rebuild the daily product sales rollup from the order lines of a date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help="First day to rebuild (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument('--end-date', help="Last day to rebuild (YYYY-MM-DD). Defaults to the start date.")
+        parser.add_argument('--restaurant', type=int, action='append', dest='restaurants',
+                            help="Only rebuild this restaurant. Can be repeated.")
+
+    def handle(self, *args, **options):
+        try:
+            start_date = self.parse_date(options['start_date']) or timezone.localdate()
+            end_date = self.parse_date(options['end_date']) or start_date
+        except ValueError:
+            raise CommandError("Dates must use the YYYY-MM-DD format.")
+
+        if end_date < start_date:
+            raise CommandError("The end date must be after the start date.")
+
+        count = rebuild_daily_product_sales(start_date, end_date, options['restaurants'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup rows from {start_date} to {end_date}."))
+
+    @staticmethod
+    def parse_date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
@@ -0,0 +1,120 @@
+import gzip
+import json
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+
+from apps.common.images import derivative_urls
+
+from .models import Category, Product
+from .report_cache import bump_version, etag_matches, get_or_compute, get_versions
+
+# How long a built menu stays cached, None keeps it until a product, a category or one of their links changes.
+MENU_CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', None)
+
+
+def menu_version_key(restaurant_id):
+    return f"pos_systems:menu-version:{restaurant_id}"
+
+
+def menu_key(restaurant_id, version):
+    return f"pos_systems:menu:{restaurant_id}:{version}"
+
+
+def get_menu_version(restaurant_id):
+    """Return the current menu version of a restaurant, a number that grows with each change of its catalogue."""
+    return get_versions([menu_version_key(restaurant_id)])[0]
+
+
+def bump_menu_versions(restaurant_ids):
+    """Invalidate the built menus of restaurants, the next request builds them again."""
+    for restaurant_id in set(restaurant_ids):
+        bump_version(menu_version_key(restaurant_id))
+
+
+def schedule_menu_version_bump(restaurant_ids):
+    """Invalidate the built menus of restaurants once the current transaction commits."""
+    restaurant_ids = set(restaurant_ids)
+    if restaurant_ids:
+        transaction.on_commit(partial(bump_menu_versions, restaurant_ids))
+
+
+def category_restaurant_ids(category_ids):
+    """Return the ids of the restaurants with a product in any of the categories."""
+    return set(
+        Product.restaurants.through.objects.filter(product__categories__in=category_ids)
+        .values_list('restaurant_id', flat=True)
+    )
+
+
+def product_restaurant_ids(product_ids):
+    """Return the ids of the restaurants selling any of the products."""
+    return set(
+        Product.restaurants.through.objects.filter(product_id__in=product_ids).values_list('restaurant_id', flat=True)
+    )
+
+
+def build_menu(restaurant_id, version):
+    """
+    Build the menu document of a restaurant: its products with their price, status, images and active categories,
+    and those categories. Returned as gzip compressed JSON, ready to be sent as is.
+    """
+    products = (
+        Product.objects.filter(restaurants=restaurant_id).order_by('name', 'id')
+        .prefetch_related(Prefetch('categories', queryset=Category.objects.filter(status=True).order_by('name')))
+    )
+
+    categories = {}
+    items = []
+    for product in products:
+        product_categories = product.categories.all()
+        categories.update((category.id, category) for category in product_categories)
+        items.append({
+            'id': product.id,
+            'name': product.name,
+            'price': product.price,
+            'status': product.status,
+            'image': product.image.url if product.image else None,
+            'images': derivative_urls(product, 'image'),
+            'categories': [category.id for category in product_categories],
+        })
+
+    document = {
+        'restaurant': restaurant_id,
+        'version': version,
+        'generated': timezone.now(),
+        'categories': [{'id': category.id, 'name': category.name}
+                       for category in sorted(categories.values(), key=lambda category: category.name)],
+        'products': items,
+    }
+    return gzip.compress(json.dumps(document, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+
+
+def menu_response(request, restaurant_id):
+    """
+    Return the menu of a restaurant with its ETag, built once per version and served from the cache.
+    Clients accepting gzip get the stored bytes, unchanged menus get a 304 without reading them.
+    """
+    version = get_menu_version(restaurant_id)
+    etag = f'W/"menu-{restaurant_id}-{version}"'
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        content = get_or_compute(menu_key(restaurant_id, version), partial(build_menu, restaurant_id, version),
+                                 timeout=MENU_CACHE_TIMEOUT)
+        if 'gzip' in request.headers.get("Accept-Encoding", ""):
+            response = HttpResponse(content, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(gzip.decompress(content), content_type="application/json")
+
+    response["ETag"] = etag
+    patch_vary_headers(response, ["Accept-Encoding"])
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 15:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0005_alter_product_image'),
+        ('restaurants', '0004_employee_name_alter_employee_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('quantity_sold', models.PositiveIntegerField(default=0, verbose_name='Quantity Sold')),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total Revenue')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='pos_systems.product', verbose_name='Product')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_product_sales', to='restaurants.restaurant', verbose_name='Restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'date', 'product'), name='unique_daily_product_sales')],
+            },
+        ),
+    ]
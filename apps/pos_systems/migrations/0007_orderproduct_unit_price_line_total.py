@@ -0,0 +1,45 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:05
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_line_prices(apps, schema_editor):
+    """Snapshot the current product price on the existing order lines."""
+    OrderProduct = apps.get_model('pos_systems', 'OrderProduct')
+    Product = apps.get_model('pos_systems', 'Product')
+
+    price = Subquery(Product.objects.filter(id=OuterRef('product_id')).values('price')[:1])
+    OrderProduct.objects.update(unit_price=price)
+    OrderProduct.objects.update(line_total=F('unit_price') * F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0006_dailyproductsales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderproduct',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Unit Price'),
+        ),
+        migrations.AddField(
+            model_name='orderproduct',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, max_digits=12, null=True, verbose_name='Line Total'),
+        ),
+        migrations.RunPython(backfill_line_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderproduct',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Price'),
+        ),
+        migrations.AlterField(
+            model_name='orderproduct',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Line Total'),
+        ),
+    ]
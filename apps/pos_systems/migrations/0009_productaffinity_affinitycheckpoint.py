@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:00
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0008_reportjob'),
+        ('restaurants', '0004_employee_name_alter_employee_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AffinityCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('processed_until', models.DateTimeField(verbose_name='Processed Until')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Order Count')),
+                ('product_ids', models.JSONField(default=list, verbose_name='Product Ids')),
+                ('matrix', models.BinaryField(verbose_name='Co-occurrence Matrix')),
+                ('restaurant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='affinity_checkpoint', to='restaurants.restaurant', verbose_name='Restaurant')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rank')),
+                ('pair_count', models.PositiveIntegerField(verbose_name='Orders With Both')),
+                ('support', models.FloatField(verbose_name='Support')),
+                ('confidence', models.FloatField(verbose_name='Confidence')),
+                ('lift', models.FloatField(verbose_name='Lift')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pos_systems.product', verbose_name='Partner')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affinities', to='pos_systems.product', verbose_name='Product')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_affinities', to='restaurants.restaurant', verbose_name='Restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'product', 'rank'), name='unique_product_affinity_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:02
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0009_productaffinity_affinitycheckpoint'),
+        ('restaurants', '0004_employee_name_alter_employee_email'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_date', models.DateField(verbose_name='Business Date')),
+                ('closed', models.DateTimeField(auto_now_add=True, verbose_name='Closed')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Data')),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Closed By')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='z_reports', to='restaurants.restaurant', verbose_name='Restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'business_date'), name='unique_z_report_per_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0003_alter_customer_email_and_more'),
+        ('pos_systems', '0011_order_default_totals'),
+        ('restaurants', '0004_employee_name_alter_employee_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Idempotency Key'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'idempotency_key'), name='unique_order_idempotency_key'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_customer_restaurant_modified'),
+        ('pos_systems', '0012_order_idempotency_key'),
+        ('restaurants', '0005_tombstone_and_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['modified'], name='category_modified'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'modified'], name='order_restaurant_modified'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['modified'], name='product_modified'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0013_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='guest_count',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Guest Count'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_customer_restaurant_modified'),
+        ('pos_systems', '0014_order_guest_count'),
+        ('restaurants', '0005_tombstone_and_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('customer_name', models.CharField(blank=True, max_length=255, verbose_name='Customer Name (if anonymous)')),
+                ('status', models.SmallIntegerField(choices=[(0, 'Pending'), (1, 'Processing'), (2, 'Completed'), (3, 'Cancelled')])),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('discount', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('tax', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('tips', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('payment_method', models.SmallIntegerField(blank=True, choices=[(0, 'Cash'), (1, 'Credit Card'), (2, 'Debit Card'), (3, 'Mobile Payment'), (4, 'Bank Transfer'), (5, 'Voucher')], null=True)),
+                ('guest_count', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Guest Count')),
+                ('idempotency_key', models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Idempotency Key')),
+                ('created', models.DateTimeField(verbose_name='Created')),
+                ('modified', models.DateTimeField(verbose_name='Modified')),
+                ('archived', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Archived')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='customers.customer', verbose_name='Customer')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='restaurants.employee', verbose_name='Employee')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='restaurants.restaurant', verbose_name='Restaurant')),
+                ('tables', models.ManyToManyField(related_name='archived_orders', to='restaurants.table', verbose_name='Tables')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderProduct',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Quantity')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Price')),
+                ('line_total', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Line Total')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_products', to='pos_systems.archivedorder', verbose_name='Order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_order_products', to='pos_systems.product', verbose_name='Product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['restaurant', 'created'], name='archived_order_created'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_customer_restaurant_modified'),
+        ('pos_systems', '0015_archived_orders'),
+        ('restaurants', '0006_unique_table_number_and_employee_email'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'created'], name='order_restaurant_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'status'], name='order_restaurant_status'),
+        ),
+    ]
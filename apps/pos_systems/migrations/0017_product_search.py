@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:02
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def create_product_search(apps, schema_editor):
+    """Create the trigram index of the product names and category names, and index the existing products."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE pos_systems_product_search USING fts5(name, categories, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        "INSERT INTO pos_systems_product_search (rowid, name, categories) "
+        "SELECT product.id, product.name, COALESCE(("
+        "  SELECT group_concat(category.name, ' ') FROM pos_systems_category category "
+        "  JOIN pos_systems_product_categories link ON link.category_id = category.id "
+        "  WHERE link.product_id = product.id AND category.status"
+        "), '') FROM pos_systems_product product"
+    )
+
+
+def drop_product_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS pos_systems_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0016_order_restaurant_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='product_name_lower'),
+        ),
+        migrations.RunPython(create_product_search, drop_product_search),
+    ]
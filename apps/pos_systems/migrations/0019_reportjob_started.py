@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_started(apps, schema_editor):
+    """The running jobs were claimed when they were last modified."""
+    ReportJob = apps.get_model('pos_systems', 'ReportJob')
+    ReportJob.objects.filter(status=1).update(started=F('modified'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0018_product_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Started'),
+        ),
+        migrations.RunPython(backfill_started, migrations.RunPython.noop),
+    ]
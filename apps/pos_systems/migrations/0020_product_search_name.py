@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+def backfill_search_names(apps, schema_editor):
+    """Lowercase the names of the existing products in Python, as Product.save does."""
+    Product = apps.get_model('pos_systems', 'Product')
+    products = []
+    for product in Product.objects.only('id', 'name').iterator(chunk_size=2000):
+        product.search_name = product.name.lower()
+        products.append(product)
+    Product.objects.bulk_update(products, ['search_name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0019_reportjob_started'),
+        ('restaurants', '0007_employee_profile_picture_derivatives'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_name_lower',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Search Name'),
+        ),
+        migrations.RunPython(backfill_search_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['search_name'], name='product_search_name'),
+        ),
+    ]
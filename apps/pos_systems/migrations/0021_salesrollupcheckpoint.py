@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:23
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_checkpoints(apps, schema_editor):
+    """The rollup was rebuilt on every write until now, so every restaurant is rolled up until yesterday."""
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    SalesRollupCheckpoint = apps.get_model('pos_systems', 'SalesRollupCheckpoint')
+    yesterday = timezone.localdate() - timedelta(days=1)
+    SalesRollupCheckpoint.objects.bulk_create([
+        SalesRollupCheckpoint(restaurant_id=restaurant_id, rolled_up_until=yesterday)
+        for restaurant_id in Restaurant.objects.values_list('id', flat=True)
+    ])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos_systems', '0020_product_search_name'),
+        ('restaurants', '0007_employee_profile_picture_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rolled_up_until', models.DateField(verbose_name='Rolled Up Until')),
+                ('restaurant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollup_checkpoint', to='restaurants.restaurant', verbose_name='Restaurant')),
+            ],
+        ),
+        migrations.RunPython(backfill_checkpoints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_customer_restaurant_modified'),
+        ('pos_systems', '0021_salesrollupcheckpoint'),
+        ('restaurants', '0007_employee_profile_picture_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['restaurant', 'idempotency_key'], name='archived_order_idempotency_key'),
+        ),
+    ]
@@ -1,5 +1,14 @@
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from model_utils import FieldTracker
 from model_utils.models import TimeStampedModel
 
 from apps.customers.models import Customer
@@ -17,6 +26,16 @@ class Order(TimeStampedModel):
         (3, 'Cancelled'),
     ]
 
+    # The statuses an order can move to from each status. Completed and cancelled orders are final.
+    STATUS_TRANSITIONS = {
+        0: {1, 2, 3},
+        1: {2, 3},
+        2: set(),
+        3: set(),
+    }
+    # Orders that still hold their tables.
+    OPEN_STATUSES = (0, 1)
+
     PAYMENT_METHOD_CHOICES = [
         (0, 'Cash'),
         (1, 'Credit Card'),
@@ -35,16 +54,72 @@ class Order(TimeStampedModel):
                                  verbose_name="Employee")
     customer_name = models.CharField(max_length=255, blank=True, verbose_name="Customer Name (if anonymous)")
     status = models.SmallIntegerField(choices=STATUS_CHOICES, default=0)
-    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     discount = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     tax = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     tips = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
-    total = models.DecimalField(max_digits=10, decimal_places=2)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     payment_method = models.SmallIntegerField(choices=PAYMENT_METHOD_CHOICES, null=True, blank=True)
+    guest_count = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Guest Count")
+    # Key chosen by the terminal that took the order, so replaying it after being offline never duplicates it.
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False,
+                                       verbose_name="Idempotency Key")
+
+    tracker = FieldTracker(fields=['status'])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'idempotency_key'], name="unique_order_idempotency_key")
+        ]
+        indexes = [
+            models.Index(fields=['restaurant', 'created'], name="order_restaurant_created"),
+            models.Index(fields=['restaurant', 'status'], name="order_restaurant_status"),
+            models.Index(fields=['restaurant', 'modified'], name="order_restaurant_modified"),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - Tables {[table.table_number for table in self.tables.all()]} - {self.get_status_display()}"
 
+    @classmethod
+    def can_transition(cls, status, new_status):
+        return new_status in cls.STATUS_TRANSITIONS.get(status, set())
+
+    @classmethod
+    def statuses_allowed_to(cls, new_status):
+        """The statuses an order can be in to move to `new_status`."""
+        return [status for status, targets in cls.STATUS_TRANSITIONS.items() if new_status in targets]
+
+    @staticmethod
+    def total_expression(subtotal):
+        """The total of an order: subtotal + tax - discount + tips."""
+        zero = Value(Decimal(0))
+        return subtotal + Coalesce(F('tax'), zero) - Coalesce(F('discount'), zero) + Coalesce(F('tips'), zero)
+
+    @classmethod
+    def recalculate_totals(cls, order_ids):
+        """
+        Recompute the subtotal and total of orders from their lines.
+        A single UPDATE aggregates the lines, so the result is consistent even with concurrent line edits.
+        """
+        lines_total = Coalesce(
+            Subquery(
+                OrderProduct.objects
+                .filter(order=OuterRef('pk'))
+                .values('order')
+                .annotate(lines_total=Sum('line_total'))
+                .values('lines_total')
+            ),
+            Value(Decimal(0)),
+        )
+        cls.objects.filter(pk__in=order_ids).update(subtotal=lines_total, total=cls.total_expression(lines_total),
+                                                    modified=timezone.now())
+
+    @classmethod
+    def apply_subtotal_delta(cls, order_id, delta):
+        """Add the change of one line to the subtotal and total of an order, atomically in the database."""
+        cls.objects.filter(pk=order_id).update(subtotal=F('subtotal') + delta, total=F('total') + delta,
+                                               modified=timezone.now())
+
 
 class Category(TimeStampedModel):
     """
@@ -53,6 +128,11 @@ class Category(TimeStampedModel):
     name = models.CharField(max_length=255, unique=True, verbose_name="Category Name")
     status = models.BooleanField(default=True, verbose_name="Status")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified'], name="category_modified"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -64,11 +144,31 @@ class Product(TimeStampedModel):
     restaurants = models.ManyToManyField('restaurants.Restaurant', related_name="products",
                                          verbose_name="Restaurants")
     name = models.CharField(max_length=255, verbose_name="Product Name")
+    # The name lowercased by Python, SQLite lower() only folds ASCII letters ("Éclair" would stay capitalized).
+    search_name = models.CharField(max_length=255, editable=False, default="", verbose_name="Search Name")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Price")
     image = models.ImageField(blank=True, null=True, verbose_name="Product Image")
+    # Names of the resized copies of the image, built in the background (see apps/common/images.py).
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Image Derivatives")
     status = models.SmallIntegerField(choices=[(0, 'Available'), (1, 'Out of Stock')], default=0)
     categories = models.ManyToManyField(Category, related_name="products", verbose_name="Categories")
 
+    class Meta:
+        # Products belong to restaurants through a many-to-many, the sync filters them by modified first.
+        indexes = [
+            models.Index(fields=['modified'], name="product_modified"),
+            # Autocomplete reads the names starting with what the cashier typed in order.
+            models.Index(fields=['search_name'], name="product_search_name"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Keep the lowercase name used by the search in sync with the name."""
+        self.search_name = self.name.lower()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} - {self.get_status_display()}"
 
@@ -76,12 +176,18 @@ class Product(TimeStampedModel):
 class OrderProduct(models.Model):
     """
     Represents the products in an order, tracking quantity.
+    The product price is captured when the line is written, so later price changes
+    do not rewrite the revenue of past orders.
     """
     order = models.ForeignKey('pos_systems.Order', on_delete=models.CASCADE, related_name="order_products",
                               verbose_name="Order")
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="order_products",
                                 verbose_name="Product")
     quantity = models.PositiveIntegerField(default=1, verbose_name="Quantity")
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Unit Price")
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Line Total")
+
+    tracker = FieldTracker(fields=['order', 'product'])
 
     class Meta:
         unique_together = ('order', 'product')
@@ -90,5 +196,233 @@ class OrderProduct(models.Model):
         if self.quantity <= 0:
             raise ValidationError({"quantity": "Quantity must be greater than 0."})
 
+    @classmethod
+    def for_product(cls, order, product, quantity):
+        """Build a line with its price snapshot, for inserts that skip save() like bulk_create."""
+        return cls(order=order, product=product, quantity=quantity, unit_price=product.price,
+                   line_total=product.price * quantity)
+
+    def save(self, *args, **kwargs):
+        """Snapshot the unit price of new or re-assigned lines and keep the line total in sync."""
+        if self.unit_price is None or self.tracker.has_changed('product'):
+            self.unit_price = self.product.price
+        self.line_total = self.unit_price * self.quantity
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'unit_price', 'line_total'}
+
+        with transaction.atomic():
+            if not self._state.adding and self.tracker.has_changed('order'):
+                # A line moved to another order changes the totals of both, they are computed again from their lines.
+                previous_order_id = self.tracker.previous('order')
+                super().save(*args, **kwargs)
+                Order.recalculate_totals([previous_order_id, self.order_id])
+                return
+
+            previous_total = 0 if self._state.adding else self.lock_previous_total()
+            super().save(*args, **kwargs)
+            if self.line_total != previous_total:
+                Order.apply_subtotal_delta(self.order_id, self.line_total - previous_total)
+
+    def lock_previous_total(self):
+        """
+        Lock the order and return the stored total of this line.
+        Edits to the lines of the same order are serialized, so their deltas are never computed from stale values.
+        Deleted lines of open orders are subtracted by the delete signals, so queryset deletes keep the totals too;
+        queryset updates of the lines must call `Order.recalculate_totals`.
+        """
+        list(Order.objects.select_for_update().filter(pk=self.order_id).values_list('pk'))
+        return OrderProduct.objects.filter(pk=self.pk).values_list('line_total', flat=True).first() or 0
+
     def __str__(self):
         return f"Order {self.order.id} - {self.product.name} x{self.quantity}"
+
+
+class ArchivedOrder(models.Model):
+    """
+    A completed or cancelled order moved out of the live orders once it is older than the retention window.
+    It keeps the id and every field it had as an order, only reports and exports read it.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE,
+                                   related_name="archived_orders", verbose_name="Restaurant")
+    customer = models.ForeignKey(Customer, null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name="archived_orders", verbose_name="Customer")
+    tables = models.ManyToManyField(Table, related_name="archived_orders", verbose_name="Tables")
+    employee = models.ForeignKey('restaurants.Employee', on_delete=models.CASCADE, related_name="archived_orders",
+                                 verbose_name="Employee")
+    customer_name = models.CharField(max_length=255, blank=True, verbose_name="Customer Name (if anonymous)")
+    status = models.SmallIntegerField(choices=Order.STATUS_CHOICES)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    tax = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    tips = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    payment_method = models.SmallIntegerField(choices=Order.PAYMENT_METHOD_CHOICES, null=True, blank=True)
+    guest_count = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Guest Count")
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False,
+                                       verbose_name="Idempotency Key")
+    created = models.DateTimeField(verbose_name="Created")
+    modified = models.DateTimeField(verbose_name="Modified")
+    archived = models.DateTimeField(default=timezone.now, verbose_name="Archived")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'created'], name="archived_order_created"),
+            models.Index(fields=['restaurant', 'idempotency_key'], name="archived_order_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id} - {self.get_status_display()}"
+
+
+class ArchivedOrderProduct(models.Model):
+    """
+    A line of an archived order, with the id, price and total it had as an order line.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name="order_products",
+                              verbose_name="Order")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="archived_order_products",
+                                verbose_name="Product")
+    quantity = models.PositiveIntegerField(default=1, verbose_name="Quantity")
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Unit Price")
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Line Total")
+
+    def __str__(self):
+        return f"Archived order {self.order_id} - {self.product.name} x{self.quantity}"
+
+
+class DailyProductSales(models.Model):
+    """
+    Pre-aggregated sales of a product in a restaurant for a single day.
+    A day is rolled up once it closes, and rebuilt from its order lines whenever one of its orders is written later.
+    """
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE,
+                                   related_name="daily_product_sales", verbose_name="Restaurant")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales",
+                                verbose_name="Product")
+    date = models.DateField(verbose_name="Date")
+    quantity_sold = models.PositiveIntegerField(default=0, verbose_name="Quantity Sold")
+    total_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total Revenue")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'date', 'product'], name="unique_daily_product_sales")
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.product.name} x{self.quantity_sold}"
+
+
+class SalesRollupCheckpoint(models.Model):
+    """
+    The last day of a restaurant whose sales are in the daily rollup.
+    The days after it are rolled up when the first report after they close is read.
+    """
+    restaurant = models.OneToOneField('restaurants.Restaurant', on_delete=models.CASCADE,
+                                      related_name="sales_rollup_checkpoint", verbose_name="Restaurant")
+    rolled_up_until = models.DateField(verbose_name="Rolled Up Until")
+
+    def __str__(self):
+        return f"{self.restaurant.name} - {self.rolled_up_until}"
+
+
+class ReportJob(TimeStampedModel):
+    """
+    Represents a report computed in the background, for date ranges too long to run inside a request.
+    The result is stored once finished, so it can be downloaded again without recomputing it.
+    """
+    STATUS_CHOICES = [
+        (0, 'Pending'),
+        (1, 'Running'),
+        (2, 'Completed'),
+        (3, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="report_jobs",
+                             verbose_name="User")
+    report = models.CharField(max_length=50, verbose_name="Report")
+    parameters = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Parameters")
+    parameters_hash = models.CharField(max_length=64, db_index=True, verbose_name="Parameters Hash")
+    status = models.SmallIntegerField(choices=STATUS_CHOICES, default=0)
+    result = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True, verbose_name="Result")
+    error = models.TextField(blank=True, verbose_name="Error")
+    started = models.DateTimeField(null=True, blank=True, verbose_name="Started")
+    finished = models.DateTimeField(null=True, blank=True, verbose_name="Finished")
+
+    def __str__(self):
+        return f"Report {self.report} ({self.id}) - {self.get_status_display()}"
+
+
+class ProductAffinity(models.Model):
+    """
+    A product frequently bought together with another one in a restaurant, used for upsell suggestions.
+    Only the top partners of each product are kept, ranked by lift.
+    """
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE,
+                                   related_name="product_affinities", verbose_name="Restaurant")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="affinities",
+                                verbose_name="Product")
+    partner = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+", verbose_name="Partner")
+    rank = models.PositiveSmallIntegerField(verbose_name="Rank")
+    pair_count = models.PositiveIntegerField(verbose_name="Orders With Both")
+    support = models.FloatField(verbose_name="Support")
+    confidence = models.FloatField(verbose_name="Confidence")
+    lift = models.FloatField(verbose_name="Lift")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'product', 'rank'], name="unique_product_affinity_rank")
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} -> {self.partner.name} (lift {self.lift:.2f})"
+
+
+class AffinityCheckpoint(TimeStampedModel):
+    """
+    The co-occurrence counts of a restaurant up to a point in time, so the affinities
+    can be refreshed incrementally from the orders placed after it.
+    """
+    restaurant = models.OneToOneField('restaurants.Restaurant', on_delete=models.CASCADE,
+                                      related_name="affinity_checkpoint", verbose_name="Restaurant")
+    processed_until = models.DateTimeField(verbose_name="Processed Until")
+    order_count = models.PositiveIntegerField(default=0, verbose_name="Order Count")
+    product_ids = models.JSONField(default=list, verbose_name="Product Ids")
+    matrix = models.BinaryField(verbose_name="Co-occurrence Matrix")
+
+    def __str__(self):
+        return f"{self.restaurant.name} - {self.processed_until}"
+
+
+class ZReport(models.Model):
+    """
+    End-of-day totals of a restaurant, stored once when its business day is closed.
+    Snapshots are immutable, so the numbers of a closed day never drift.
+    """
+    restaurant = models.ForeignKey('restaurants.Restaurant', on_delete=models.CASCADE, related_name="z_reports",
+                                   verbose_name="Restaurant")
+    business_date = models.DateField(verbose_name="Business Date")
+    closed_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+                                  related_name="+", verbose_name="Closed By")
+    closed = models.DateTimeField(auto_now_add=True, verbose_name="Closed")
+    data = models.JSONField(encoder=DjangoJSONEncoder, verbose_name="Data")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'business_date'], name="unique_z_report_per_day")
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("A closed business day cannot be modified.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("A closed business day cannot be deleted.")
+
+    def __str__(self):
+        return f"Z-Report {self.business_date} ({self.restaurant.name})"
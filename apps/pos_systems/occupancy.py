@@ -0,0 +1,62 @@
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
+
+from apps.restaurants.models import Table
+from .events import TABLE_STATUS_CHANGED, publish_event
+from .models import Order
+
+AVAILABLE = 0
+BUSY = 1
+
+
+def refresh_table_status(table_ids):
+    """
+    Set tables Busy while they have an open order and Available otherwise.
+    Only the tables whose status changes are written, with one UPDATE per status, and pushed to the screens.
+    """
+    if not table_ids:
+        return
+    tables = Table.objects.filter(id__in=table_ids).annotate(
+        occupied=Exists(Order.objects.filter(tables=OuterRef('pk'), status__in=Order.OPEN_STATUSES))
+    ).values('id', 'restaurant_id', 'table_number', 'status', 'occupied')
+
+    changed = {AVAILABLE: [], BUSY: []}
+    for table in tables:
+        status = BUSY if table['occupied'] else AVAILABLE
+        if table['status'] != status:
+            changed[status].append(table)
+
+    now = timezone.now()
+    for status, changed_tables in changed.items():
+        if not changed_tables:
+            continue
+        Table.objects.filter(id__in=[table['id'] for table in changed_tables]).update(status=status, modified=now)
+        for table in changed_tables:
+            publish_event(table['restaurant_id'], TABLE_STATUS_CHANGED, {
+                'table': table['id'], 'table_number': table['table_number'], 'status': status,
+            })
+
+
+def order_table_ids(order_ids):
+    return set(Order.tables.through.objects.filter(order_id__in=order_ids).values_list('table_id', flat=True))
+
+
+def floor_plan(restaurant_id):
+    """
+    Return every table of a restaurant with its open order: guests, how long it has been open and its total.
+    Everything comes from one query, the open order of each table is read with correlated subqueries.
+    """
+    open_orders = Order.objects.filter(tables=OuterRef('pk'), status__in=Order.OPEN_STATUSES).order_by('created')
+    tables = Table.objects.filter(restaurant_id=restaurant_id).annotate(
+        order=Subquery(open_orders.values('id')[:1]),
+        guest_count=Subquery(open_orders.values('guest_count')[:1]),
+        opened=Subquery(open_orders.values('created')[:1]),
+        total=Subquery(open_orders.values('total')[:1]),
+    ).order_by('table_number').values('id', 'table_number', 'capacity', 'status', 'order', 'guest_count',
+                                      'opened', 'total')
+
+    now = timezone.now()
+    return [
+        {**table, 'elapsed_seconds': int((now - table['opened']).total_seconds()) if table['opened'] else None}
+        for table in tables
+    ]
@@ -0,0 +1,114 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.common.transactions import on_commit_once
+
+# How long a computed report stays cached. Writes invalidate it sooner through the version counters.
+REPORT_CACHE_TIMEOUT = getattr(settings, 'REPORT_CACHE_TIMEOUT', 60 * 10)
+# How long a request may hold the recompute lock, and how long the others wait for its result.
+REPORT_CACHE_LOCK_TIMEOUT = getattr(settings, 'REPORT_CACHE_LOCK_TIMEOUT', 30)
+REPORT_CACHE_WAIT_INTERVAL = 0.05
+
+
+def report_version_key(restaurant_id):
+    return f"pos_systems:report-version:{restaurant_id}"
+
+
+def get_versions(keys):
+    """
+    Return the current value of version counters.
+    Missing counters are seeded with a timestamp, so an evicted counter never reuses an old version.
+    """
+    versions = cache.get_many(keys)
+
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+
+    return [versions[key] for key in keys]
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_report_versions(restaurant_ids):
+    """Return the current report version of each restaurant."""
+    return get_versions([report_version_key(restaurant_id) for restaurant_id in restaurant_ids])
+
+
+def bump_report_version(restaurant_id):
+    """Invalidate every cached report of a restaurant."""
+    bump_version(report_version_key(restaurant_id))
+
+
+def schedule_report_version_bump(restaurant_id):
+    """Invalidate the cached reports of a restaurant once the current transaction commits."""
+    on_commit_once(bump_report_version, restaurant_id)
+
+
+def get_or_compute(key, compute, timeout=REPORT_CACHE_TIMEOUT):
+    """
+    Return the cached value of a key, computing it on a miss.
+    Only the request holding the lock recomputes, the others wait for its result
+    instead of hitting the database at the same time.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, timeout=REPORT_CACHE_LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + REPORT_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(REPORT_CACHE_WAIT_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock_key) is None:
+            break
+
+    return compute()
+
+
+def etag_matches(request, etag):
+    """Whether the If-None-Match header of a request lists an ETag or is `*`, with the weak comparison of RFC 9110."""
+    tags = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+def cached_report_response(request, report_name, restaurant_ids, params, compute):
+    """
+    Return a report response served from the cache, with an ETag.
+    The key covers the report, the restaurants in the user's scope, their versions and the parameters,
+    so unchanged polls get a 304 without running the report queries.
+    """
+    restaurant_ids = sorted(restaurant_ids)
+    versions = get_report_versions(restaurant_ids)
+    raw_key = repr((report_name, restaurant_ids, versions, sorted(params.items()), timezone.localdate()))
+    digest = hashlib.sha1(raw_key.encode()).hexdigest()
+    etag = f'"{digest}"'
+
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    payload = get_or_compute(f"pos_systems:report:{report_name}:{digest}", compute)
+    return Response(payload, headers={"ETag": etag})
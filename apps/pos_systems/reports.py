@@ -0,0 +1,476 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Case, CharField, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, ExtractHour, ExtractIsoWeekDay, TruncDate
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.common.transactions import on_commit_once
+from apps.restaurants.ownership import check_restaurant_owner, get_owned_restaurant_ids
+from .archive import order_line_models, order_models
+from .models import DailyProductSales, Order, OrderProduct, SalesRollupCheckpoint, ZReport
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+CANCELLED_STATUS = 3
+EMPLOYEE_REPORT_ORDERING = ['order_count', 'revenue', 'average_ticket', 'tips', 'cancellation_rate']
+CURRENT_PERIOD = 'current'
+PREVIOUS_PERIOD = 'previous'
+
+
+def parse_report_dates(query_params):
+    """
+    Return the (start_date, end_date) range requested by a report.
+    If no date range is provided, default to today.
+    """
+    start_date = query_params.get("start_date")
+    end_date = query_params.get("end_date") or start_date
+
+    try:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else timezone.localdate()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else start_date
+    except ValueError:
+        raise ValidationError("Dates must use the YYYY-MM-DD format.")
+
+    if end_date < start_date:
+        raise ValidationError("The end date must be after the start date.")
+    return start_date, end_date
+
+
+def created_between(start_date, end_date, field="created"):
+    """
+    Return the filter of the rows created from the start of one day to the end of another, in local time.
+    Unlike `created__date`, the column is compared as is, so the (restaurant, created) indexes are used.
+    """
+    return {
+        f"{field}__gte": timezone.make_aware(datetime.combine(start_date, time.min)),
+        f"{field}__lt": timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+    }
+
+
+def get_report_restaurant_ids(request, params=None):
+    """
+    Return the ids of the restaurants a report covers.
+    Filters by the `restaurant` parameter (query parameters by default), or every restaurant of the user.
+    """
+    params = request.query_params if params is None else params
+    restaurant_id = str(params.get("restaurant") or "")
+
+    if restaurant_id:
+        if not restaurant_id.isdigit():
+            raise ValidationError("The restaurant ID must be a number.")
+        if request.user.is_superuser:
+            return [int(restaurant_id)]
+        return [check_restaurant_owner(request, restaurant_id, "You do not have access to this restaurant's reports.")]
+
+    return sorted(get_owned_restaurant_ids(request))
+
+
+def merge_sales_rows(querysets):
+    """Add up the sales rows of live and archived order lines that have the same value in every other column."""
+    merged = {}
+    for queryset in querysets:
+        for row in queryset:
+            key = tuple(value for name, value in row.items() if name not in ("quantity_sold", "total_revenue"))
+            if key in merged:
+                merged[key]["quantity_sold"] += row["quantity_sold"]
+                merged[key]["total_revenue"] += row["total_revenue"]
+            else:
+                merged[key] = dict(row)
+    return list(merged.values())
+
+
+def refresh_daily_product_sales(restaurant_id, day):
+    """
+    Rebuild the rollup rows of one restaurant and day from its order lines, archived ones included.
+    The current day is skipped, the reports aggregate it live and it is rolled up once it closes.
+    """
+    if day >= timezone.localdate():
+        return
+
+    rows = merge_sales_rows(
+        line_model.objects
+        .filter(order__restaurant_id=restaurant_id, **created_between(day, day, "order__created"))
+        .values('product_id')
+        .annotate(quantity_sold=Sum("quantity"), total_revenue=Sum("line_total"))
+        for line_model in order_line_models(day)
+    )
+
+    with transaction.atomic():
+        DailyProductSales.objects.filter(restaurant_id=restaurant_id, date=day).delete()
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(restaurant_id=restaurant_id, date=day, **row) for row in rows
+        ])
+
+
+def schedule_daily_product_sales_refresh(restaurant_id, day):
+    """
+    Refresh the rollup of a restaurant and day once the current transaction commits.
+    The day is refreshed once however many of its order lines the transaction writes.
+    """
+    on_commit_once(refresh_daily_product_sales, restaurant_id, day)
+
+
+def roll_up_closed_days(restaurant_ids):
+    """Roll up the days that closed since the last checkpoint of each restaurant."""
+    yesterday = timezone.localdate() - timedelta(days=1)
+    checkpoints = SalesRollupCheckpoint.objects.filter(restaurant_id__in=restaurant_ids, rolled_up_until__lt=yesterday)
+    if not checkpoints.exists():
+        return
+
+    with transaction.atomic():
+        # Lock the checkpoints, so two reports read at the same time do not roll up the same days.
+        pending = {}
+        for checkpoint in checkpoints.select_for_update():
+            pending.setdefault(checkpoint.rolled_up_until, []).append(checkpoint.restaurant_id)
+
+        # Restaurants rolled up until the same day are rebuilt together.
+        for rolled_up_until, pending_ids in pending.items():
+            rebuild_daily_product_sales(rolled_up_until + timedelta(days=1), yesterday, pending_ids)
+        checkpoints.update(rolled_up_until=yesterday)
+
+
+def rebuild_daily_product_sales(start_date, end_date, restaurant_ids=None):
+    """
+    Rebuild every rollup row in a date range with one grouped query.
+    Used to backfill historical data. Returns the number of rows written.
+    """
+    rollups = DailyProductSales.objects.filter(date__range=[start_date, end_date])
+    if restaurant_ids is not None:
+        rollups = rollups.filter(restaurant_id__in=restaurant_ids)
+
+    querysets = []
+    for line_model in order_line_models(start_date):
+        order_products = line_model.objects.filter(**created_between(start_date, end_date, "order__created"))
+        if restaurant_ids is not None:
+            order_products = order_products.filter(order__restaurant_id__in=restaurant_ids)
+        querysets.append(
+            order_products
+            .values('product_id', restaurant_id=F("order__restaurant_id"), date=TruncDate("order__created"))
+            .annotate(quantity_sold=Sum("quantity"), total_revenue=Sum("line_total"))
+        )
+    rows = merge_sales_rows(querysets)
+
+    with transaction.atomic():
+        rollups.delete()
+        created = DailyProductSales.objects.bulk_create([DailyProductSales(**row) for row in rows],
+                                                        batch_size=1000)
+    return len(created)
+
+
+def product_sales_rows(restaurant_ids, start_date, end_date, by_restaurant=False, previous_start_date=None):
+    """
+    Return the rows of quantity sold and revenue per product in a date range.
+    Closed days are read from the rollup table, only the current day is aggregated live,
+    and both parts are fetched in a single round trip.
+
+    With `by_restaurant` the rows are also grouped by restaurant. With `previous_start_date`
+    the days from that date up to `start_date` are returned too, labelled with the "previous" period.
+    """
+    today = timezone.localdate()
+    first_date = previous_start_date or start_date
+    if first_date < today:
+        roll_up_closed_days(restaurant_ids)
+
+    rollup_fields = ['restaurant_id'] if by_restaurant else []
+    rollup_columns = {"name": F("product__name"), "period": period_label("date", start_date)}
+    live_columns = {"name": F("product__name"), "period": Value(CURRENT_PERIOD)}
+    if by_restaurant:
+        # Keep the columns of both parts of the union in the same order.
+        rollup_columns = {"restaurant_name": F("restaurant__name"), **rollup_columns}
+        live_columns = {"restaurant_id": F("order__restaurant_id"), "restaurant_name": F("order__restaurant__name"),
+                        **live_columns}
+
+    queryset = (
+        DailyProductSales.objects
+        .filter(restaurant_id__in=restaurant_ids, date__range=[first_date, min(end_date, today - timedelta(days=1))])
+        .values(*rollup_fields, **rollup_columns)
+        .annotate(quantity_sold=Sum("quantity_sold"), total_revenue=Sum("total_revenue"))
+    )
+
+    if start_date <= today <= end_date:
+        live = (
+            OrderProduct.objects
+            .filter(order__restaurant_id__in=restaurant_ids, **created_between(today, today, "order__created"))
+            .values(**live_columns)
+            .annotate(quantity_sold=Sum("quantity"), total_revenue=Sum("line_total"))
+        )
+        queryset = queryset.union(live, all=True)
+
+    return list(queryset)
+
+
+def period_label(field, start_date):
+    """Label the rows before the start date as the previous period."""
+    return Case(When(**{f"{field}__lt": start_date}, then=Value(PREVIOUS_PERIOD)),
+                default=Value(CURRENT_PERIOD), output_field=CharField())
+
+
+def merge_product_rows(rows):
+    """Merge rows of the same product, sorted by quantity sold."""
+    products = {}
+    for row in rows:
+        product = products.setdefault(row["name"], {"name": row["name"], "quantity_sold": 0, "total_revenue": 0})
+        product["quantity_sold"] += row["quantity_sold"]
+        product["total_revenue"] += row["total_revenue"]
+
+    return sorted(products.values(), key=lambda product: product["quantity_sold"], reverse=True)
+
+
+def sum_rows(rows):
+    return {
+        "quantity_sold": sum(row["quantity_sold"] for row in rows),
+        "total_revenue": sum(row["total_revenue"] for row in rows),
+    }
+
+
+def product_sales(restaurant_ids, start_date, end_date):
+    """Return the quantity sold and revenue of each product in a date range, across all the restaurants."""
+    # The same product can appear in the rollup and the live part, merge them by name.
+    return merge_product_rows(product_sales_rows(restaurant_ids, start_date, end_date))
+
+
+def consolidated_product_sales(restaurant_ids, start_date, end_date, compare=False):
+    """
+    Return the product sales of each restaurant and the grand totals, from one grouped query.
+    With `compare`, the totals of the previous period of the same length are included.
+    """
+    previous_start_date = start_date - (end_date - start_date + timedelta(days=1)) if compare else None
+    rows = product_sales_rows(restaurant_ids, start_date, end_date, by_restaurant=True,
+                              previous_start_date=previous_start_date)
+    current = [row for row in rows if row["period"] == CURRENT_PERIOD]
+
+    restaurants = {}
+    for row in rows:
+        restaurants.setdefault(row["restaurant_id"], {"restaurant": row["restaurant_id"],
+                                                      "restaurant_name": row["restaurant_name"]})
+
+    for restaurant_id, restaurant in restaurants.items():
+        restaurant_rows = [row for row in current if row["restaurant_id"] == restaurant_id]
+        restaurant.update(sum_rows(restaurant_rows))
+        restaurant["products"] = merge_product_rows(restaurant_rows)
+
+    report = {"totals": sum_rows(current), "products": merge_product_rows(current)}
+
+    if compare:
+        previous = [row for row in rows if row["period"] == PREVIOUS_PERIOD]
+        report["previous_period"] = {"start_date": previous_start_date,
+                                     "end_date": start_date - timedelta(days=1)}
+        report["totals"]["previous"] = sum_rows(previous)
+        for restaurant_id, restaurant in restaurants.items():
+            restaurant["previous"] = sum_rows([row for row in previous if row["restaurant_id"] == restaurant_id])
+
+    report["restaurants"] = sorted(restaurants.values(), key=lambda restaurant: restaurant["total_revenue"],
+                                   reverse=True)
+    return report
+
+
+def sales_heatmap(restaurant_ids, start_date, end_date):
+    """
+    Return the order count and revenue of each restaurant bucketed by weekday and hour.
+    The bucketing is done by the database in one grouped query, so the cost depends on the
+    number of buckets and not on the number of orders. Cancelled orders are not counted.
+    Each matrix is dense: 7 rows (Monday first) of 24 hourly buckets.
+    """
+    rows = [
+        row
+        for order_model in order_models(start_date)
+        for row in (
+            order_model.objects
+            .filter(restaurant_id__in=restaurant_ids, **created_between(start_date, end_date))
+            .exclude(status=CANCELLED_STATUS)
+            .values('restaurant_id', weekday=ExtractIsoWeekDay("created"), hour=ExtractHour("created"))
+            .annotate(orders=Count("id"), revenue=Sum("total"))
+            .order_by()
+        )
+    ]
+
+    heatmaps = {
+        restaurant_id: {
+            "restaurant": restaurant_id,
+            "orders": [[0] * 24 for _ in WEEKDAYS],
+            "revenue": [[0] * 24 for _ in WEEKDAYS],
+        }
+        for restaurant_id in restaurant_ids
+    }
+    for row in rows:
+        heatmap = heatmaps[row["restaurant_id"]]
+        heatmap["orders"][row["weekday"] - 1][row["hour"]] += row["orders"]
+        heatmap["revenue"][row["weekday"] - 1][row["hour"]] += row["revenue"]
+
+    return list(heatmaps.values())
+
+
+def parse_employee_report_options(params):
+    """Return the (ordering, limit) requested for the employee report."""
+    ordering = params.get("ordering") or "-revenue"
+    if ordering.lstrip("-") not in EMPLOYEE_REPORT_ORDERING:
+        raise ValidationError(f"The ordering must be one of: {', '.join(EMPLOYEE_REPORT_ORDERING)}.")
+
+    limit = params.get("limit")
+    if limit is None or limit == "":
+        return ordering, None
+    if not str(limit).isdigit() or int(limit) < 1:
+        raise ValidationError("The limit must be a positive number.")
+    return ordering, int(limit)
+
+
+def employee_sales_rows(order_model, restaurant_ids, start_date, end_date):
+    """Return the query grouping the orders of a model by employee, with the metrics of the employee report."""
+    not_cancelled = ~Q(status=CANCELLED_STATUS)
+    return (
+        order_model.objects
+        .filter(restaurant_id__in=restaurant_ids, **created_between(start_date, end_date))
+        .values('employee_id', 'restaurant_id', employee_name=F("employee__name"))
+        .annotate(
+            order_count=Count("id"),
+            revenue=Coalesce(Sum("total", filter=not_cancelled), Value(0), output_field=Order._meta.get_field("total")),
+            average_ticket=Avg("total", filter=not_cancelled),
+            tips=Coalesce(Sum("tips", filter=not_cancelled), Value(0), output_field=Order._meta.get_field("tips")),
+            cancelled_count=Count("id", filter=Q(status=CANCELLED_STATUS)),
+            cancellation_rate=Cast("cancelled_count", FloatField()) / Cast("order_count", FloatField()),
+        )
+    )
+
+
+def merge_employee_rows(querysets, ordering, limit):
+    """Add up the rows of the same employee from live and archived orders, then sort and limit them."""
+    employees = {}
+    for queryset in querysets:
+        for row in queryset:
+            employee = employees.setdefault(row["employee_id"], {**row, "order_count": 0, "revenue": 0, "tips": 0,
+                                                                  "cancelled_count": 0})
+            for field in ("order_count", "revenue", "tips", "cancelled_count"):
+                employee[field] += row[field]
+
+    for employee in employees.values():
+        tickets = employee["order_count"] - employee["cancelled_count"]
+        employee["average_ticket"] = employee["revenue"] / tickets if tickets else None
+        employee["cancellation_rate"] = employee["cancelled_count"] / employee["order_count"]
+
+    field = ordering.lstrip("-")
+    rows = sorted(employees.values(), key=lambda employee: employee["employee_id"])
+    # Stable sort: employees with the same value stay by id. Missing averages sort like NULLs.
+    rows.sort(key=lambda employee: (employee[field] is not None, employee[field] or 0),
+              reverse=ordering.startswith("-"))
+    return rows[:limit] if limit else rows
+
+
+def employee_sales(restaurant_ids, start_date, end_date, ordering="-revenue", limit=None):
+    """
+    Return the order count, revenue, average ticket, tips and cancellation rate of each employee.
+    Computed by one query grouped by employee, sorted and limited by the database.
+    Revenue, average ticket and tips only count the orders that were not cancelled.
+    Ranges reaching the archive run the query on both tables and merge the results.
+    """
+    querysets = [employee_sales_rows(order_model, restaurant_ids, start_date, end_date)
+                 for order_model in order_models(start_date)]
+    if len(querysets) > 1:
+        return merge_employee_rows(querysets, ordering, limit)
+
+    employees = querysets[0].order_by(ordering, "employee_id")
+    return list(employees[:limit] if limit else employees)
+
+
+def employee_sales_report(restaurant_ids, start_date, end_date, ordering="-revenue", limit=None):
+    """Build the payload of the employee sales performance report."""
+    return {
+        "creation_report_date": datetime.today().strftime('%Y-%m-%d'),
+        "start_date": start_date,
+        "end_date": end_date,
+        "employees": employee_sales(restaurant_ids, start_date, end_date, ordering, limit),
+    }
+
+
+def format_money(value):
+    """Format an amount like the DecimalFields of the API do, e.g. "12.50"."""
+    return str((value or Decimal(0)).quantize(Decimal("0.01")))
+
+
+def z_report(restaurant_id, day):
+    """
+    Compute the end-of-day totals of a restaurant: money totals and totals by payment method,
+    plus the order count of each status. Everything comes from one conditional aggregate query.
+    Cancelled orders are counted in the statuses but not in the money totals.
+    Amounts are formatted as strings, so live and stored reports are identical.
+    """
+    not_cancelled = ~Q(status=CANCELLED_STATUS)
+    aggregates = {"order_count": Count("id")}
+    for field in ("subtotal", "tax", "discount", "tips", "total"):
+        aggregates[f"{field}_sum"] = Sum(field, filter=not_cancelled)
+    for value, _ in Order.PAYMENT_METHOD_CHOICES:
+        aggregates[f"payment_{value}_count"] = Count("id", filter=not_cancelled & Q(payment_method=value))
+        aggregates[f"payment_{value}_total"] = Sum("total", filter=not_cancelled & Q(payment_method=value))
+    for value, _ in Order.STATUS_CHOICES:
+        aggregates[f"status_{value}_count"] = Count("id", filter=Q(status=value))
+
+    # Days before the retention window may have archived orders, their totals are added up.
+    results = [
+        order_model.objects.filter(restaurant_id=restaurant_id, **created_between(day, day)).aggregate(**aggregates)
+        for order_model in order_models(day)
+    ]
+    totals = {}
+    for name in aggregates:
+        values = [result[name] for result in results if result[name] is not None]
+        totals[name] = sum(values) if values else None
+
+    return {
+        "restaurant": restaurant_id,
+        "business_date": day,
+        "order_count": totals["order_count"],
+        "totals": {field: format_money(totals[f"{field}_sum"]) for field in ("subtotal", "tax", "discount", "tips", "total")},
+        "payment_methods": [
+            {"payment_method": label, "order_count": totals[f"payment_{value}_count"],
+             "total": format_money(totals[f"payment_{value}_total"])}
+            for value, label in Order.PAYMENT_METHOD_CHOICES
+        ],
+        "statuses": [
+            {"status": label, "order_count": totals[f"status_{value}_count"]}
+            for value, label in Order.STATUS_CHOICES
+        ],
+    }
+
+
+def close_business_day(restaurant_id, day, user):
+    """
+    Compute the Z-report of a day and store it as an immutable snapshot.
+    Returns None if the day was already closed.
+    """
+    try:
+        with transaction.atomic():
+            return ZReport.objects.create(restaurant_id=restaurant_id, business_date=day, closed_by=user,
+                                          data=z_report(restaurant_id, day))
+    except IntegrityError:
+        return None
+
+
+def products_report(restaurant_ids, start_date, end_date, consolidated=False, compare=False):
+    """Build the payload of the products report."""
+    if consolidated:
+        return {
+            "creation_report_date": datetime.today().strftime('%Y-%m-%d'),
+            "start_date": start_date,
+            "end_date": end_date,
+            **consolidated_product_sales(restaurant_ids, start_date, end_date, compare),
+        }
+
+    # Group by name and calculate quantity sold and total revenue
+    report_data = product_sales(restaurant_ids, start_date, end_date)
+    return {
+        "creation_report_date": datetime.today().strftime('%Y-%m-%d'),
+        "total_revenue": sum(product["total_revenue"] for product in report_data) if report_data else None,
+        "products": report_data
+    }
+
+
+def sales_heatmap_report(restaurant_ids, start_date, end_date):
+    """Build the payload of the sales heatmap report."""
+    return {
+        "creation_report_date": datetime.today().strftime('%Y-%m-%d'),
+        "start_date": start_date,
+        "end_date": end_date,
+        "weekdays": WEEKDAYS,
+        "hours": list(range(24)),
+        "restaurants": sales_heatmap(restaurant_ids, start_date, end_date),
+    }
@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Category, Product
+
+# The SQLite FTS5 table indexing the trigrams of the name and active category names of each product,
+# its rowid is the product id. It is kept in sync by the product and category signals.
+PRODUCT_SEARCH_TABLE = 'pos_systems_product_search'
+PRODUCT_SEARCH_LIMIT = 20
+MAX_PRODUCT_SEARCH_LIMIT = 50
+# Products containing the query that are ranked, the index returns them in no particular order.
+PRODUCT_SEARCH_CANDIDATES = getattr(settings, 'PRODUCT_SEARCH_CANDIDATES', 500)
+# Share of the trigrams of the query a product must contain to be returned for a misspelled query.
+PRODUCT_SEARCH_MIN_SIMILARITY = getattr(settings, 'PRODUCT_SEARCH_MIN_SIMILARITY', 0.5)
+# Candidates read from the index for each result when looking for misspellings.
+PRODUCT_SEARCH_FUZZY_CANDIDATES = 5
+
+
+def search_index_available():
+    """The trigram index only exists on SQLite, other databases search with icontains."""
+    return connection.vendor == 'sqlite'
+
+
+def index_products(product_ids):
+    """Write the search rows of products, from their name and the names of their active categories."""
+    if not search_index_available():
+        return
+    product_ids = list(product_ids)
+    # Chunks stay under the SQLite limit of parameters per query.
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid IN ({placeholders})", chunk)
+            cursor.execute(
+                f"INSERT INTO {PRODUCT_SEARCH_TABLE} (rowid, name, categories) "
+                f"SELECT product.id, product.name, COALESCE(("
+                f"  SELECT group_concat(category.name, ' ') FROM {Category._meta.db_table} category "
+                f"  JOIN {Product.categories.through._meta.db_table} link ON link.category_id = category.id "
+                f"  WHERE link.product_id = product.id AND category.status"
+                f"), '') FROM {Product._meta.db_table} product WHERE product.id IN ({placeholders})",
+                chunk,
+            )
+
+
+def unindex_products(product_ids):
+    """Remove the search rows of deleted products."""
+    if not search_index_available():
+        return
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})",
+                           chunk)
+
+
+def rebuild_product_search():
+    """Index every product again, returns how many were indexed."""
+    if not search_index_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {PRODUCT_SEARCH_TABLE}")
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    index_products(product_ids)
+    return len(product_ids)
+
+
+def trigrams(words):
+    return {word[i:i + 3] for word in words for i in range(len(word) - 2)}
+
+
+def word_halves(word):
+    """
+    Split a word in two halves, a typo can only change one of them so the other is still found as is.
+    They are more selective than trigrams, short words are looked up by their trigrams.
+    """
+    if len(word) < 6:
+        return trigrams([word])
+    return {word[:len(word) // 2], word[len(word) // 2:]}
+
+
+def like_escape(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_expression(terms, operator):
+    """Return an FTS5 query matching the terms as substrings, each one quoted so it is never read as syntax."""
+    return f" {operator} ".join('"' + term.replace('"', '""') + '"' for term in sorted(terms))
+
+
+def search_products(queryset, query, restaurant_ids=None, limit=PRODUCT_SEARCH_LIMIT):
+    """
+    Return the products of a queryset matching what a cashier typed, best first.
+    `restaurant_ids` narrows the index lookups to the restaurants of the user, None for every restaurant.
+    """
+    words = query.lower().split()
+    if not search_index_available():
+        return list(contains_search(queryset, words)[:limit])
+
+    product_ids = indexed_search(words, restaurant_ids, limit)
+    products = queryset.in_bulk(product_ids)
+    return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+def indexed_search(words, restaurant_ids, limit):
+    """
+    Return the ids of the products matching the words, in three steps: the names starting with the query,
+    read in order from the index of the lowercase names; then, for words of three letters or more, the products
+    containing every word in their name or categories, names before categories and shorter names first;
+    and when nothing matched, the products containing half of a word and sharing most of the trigrams
+    of the query, so typos still match.
+    Without a restaurant scope each step reads a bounded number of rows. The index covers every restaurant,
+    so with a scope the rows of other restaurants are skipped as they are read: a restaurant with few products
+    among many others matching the query reads up to all of those matches.
+    """
+    if restaurant_ids is not None and not restaurant_ids:
+        return []
+
+    search, product = PRODUCT_SEARCH_TABLE, Product._meta.db_table
+    scope, scope_params = "", []
+    if restaurant_ids is not None:
+        # Checked for each row through the (product, restaurant) index, instead of listing every product.
+        restaurant_ids = list(restaurant_ids)
+        scope = (f"AND EXISTS (SELECT 1 FROM {Product.restaurants.through._meta.db_table} link "
+                 f"WHERE link.product_id = {{}} AND link.restaurant_id IN ({', '.join(['%s'] * len(restaurant_ids))}))")
+        scope_params = restaurant_ids
+
+    prefix = " ".join(words)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id FROM {product} WHERE search_name >= %s AND search_name < %s {scope.format(f'{product}.id')} "
+            f"ORDER BY search_name LIMIT %s",
+            [prefix, prefix + "\U0010ffff", *scope_params, limit],
+        )
+        product_ids = [row[0] for row in cursor.fetchall()]
+
+        terms = {word for word in words if len(word) >= 3}
+        if len(product_ids) == limit or not terms:
+            return product_ids
+
+        # Only the first matches are ranked, a query matching more of them is refined by typing more.
+        in_name = " AND ".join([f"{product}.search_name LIKE %s ESCAPE '\\'"] * len(words))
+        exclude = f"AND {product}.id NOT IN ({', '.join(['%s'] * len(product_ids))})" if product_ids else ""
+        cursor.execute(
+            f"SELECT {product}.id FROM (SELECT rowid FROM {search} WHERE {search} MATCH %s "
+            f"{scope.format(f'{search}.rowid')} LIMIT %s) found JOIN {product} ON {product}.id = found.rowid "
+            f"WHERE TRUE {exclude} ORDER BY ({in_name}) DESC, length({product}.name), {product}.name LIMIT %s",
+            [match_expression(terms, "AND"), *scope_params, PRODUCT_SEARCH_CANDIDATES, *product_ids,
+             *[f"%{like_escape(word)}%" for word in words], limit - len(product_ids)],
+        )
+        product_ids += [row[0] for row in cursor.fetchall()]
+        if product_ids:
+            return product_ids
+
+        cursor.execute(
+            f"SELECT rowid, name, categories FROM {search} WHERE {search} MATCH %s {scope.format(f'{search}.rowid')} "
+            f"LIMIT %s",
+            [match_expression(set().union(*map(word_halves, terms)), "OR"), *scope_params,
+             limit * PRODUCT_SEARCH_FUZZY_CANDIDATES],
+        )
+        query_trigrams = trigrams(terms)
+        similar = []
+        for product_id, name, categories in cursor.fetchall():
+            shared = len(query_trigrams & trigrams(f"{name} {categories}".lower().split())) / len(query_trigrams)
+            if shared >= PRODUCT_SEARCH_MIN_SIMILARITY:
+                similar.append((-shared, len(name), name, product_id))
+
+    return [product_id for *_, product_id in sorted(similar)[:limit]]
+
+
+def contains_search(queryset, words):
+    """Search without the index: every word must be in the name or a category name, names starting with it first."""
+    for word in words:
+        queryset = queryset.filter(Q(name__icontains=word) |
+                                   Q(categories__name__icontains=word, categories__status=True))
+    starts = Case(When(name__istartswith=" ".join(words), then=Value(0)), default=Value(1),
+                  output_field=IntegerField())
+    return queryset.annotate(starts=starts).order_by('starts', 'name', 'id').distinct()
@@ -1,45 +1,153 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
+
+from ..common.images import ImageDerivativesField
+from ..customers.serializers import CustomerSerializer
 from ..restaurants.models import Table, Restaurant
-from .models import Order, Category, Product, OrderProduct
+from ..restaurants.serializers import EmployeeSerializer, TableSerializer
+from .models import Order, Category, Product, OrderProduct, ProductAffinity, ReportJob
+from .report_cache import schedule_report_version_bump
+from .reports import schedule_daily_product_sales_refresh
+
+
+class OrderLineSerializer(serializers.Serializer):
+    """
+    Serializer for a line created together with its order.
+    Products are plain ids, they are all checked at once by the order serializer.
+    """
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
 
 
 class OrderSerializer(serializers.ModelSerializer):
     """
     Serializer for the Order model with additional validation.
+    Lines can be given in `order_products` when creating an order, they are inserted with it.
+    The subtotal and total are computed by the server from the lines, tax, discount and tips.
+    The relations listed in the `expand` context are embedded instead of their ids, when reading.
     """
+    EXPANDABLE_FIELDS = ('lines', 'tables', 'employee', 'customer')
+
+    order_products = OrderLineSerializer(many=True, required=False, write_only=True)
 
     class Meta:
         model = Order
         fields = [
             'id', 'restaurant', 'customer', 'tables', 'employee', 'customer_name',
-            'status', 'subtotal', 'discount', 'tax', 'tips', 'total', 'payment_method',
+            'status', 'subtotal', 'discount', 'tax', 'tips', 'total', 'payment_method', 'guest_count',
+            'order_products',
         ]
+        read_only_fields = ['subtotal', 'total']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand', ())
+        if 'lines' in expand:
+            self.fields['lines'] = OrderProductDetailSerializer(source='order_products', many=True, read_only=True)
+        if 'tables' in expand:
+            self.fields['tables'] = TableSerializer(many=True, read_only=True)
+        if 'employee' in expand:
+            self.fields['employee'] = EmployeeSerializer(read_only=True)
+        if 'customer' in expand:
+            self.fields['customer'] = CustomerSerializer(read_only=True)
+
+    def validate_status(self, value):
+        """Only the transitions of the order state machine are allowed."""
+        if self.instance and value != self.instance.status and not Order.can_transition(self.instance.status, value):
+            raise serializers.ValidationError(
+                f"An order cannot go from {self.instance.get_status_display()} "
+                f"to {dict(Order.STATUS_CHOICES)[value]}.")
+        return value
 
     def validate(self, data):
         """Ensure product belongs to the restaurant of the order and is available."""
-        restaurant = data.get('restaurant')
         order_products = data.get('order_products', [])
+        if order_products and self.instance:
+            raise serializers.ValidationError("Use the order products API to change the lines of an existing order.")
 
-        for item in order_products:
-            product = item['product']
-            if product not in restaurant.products.all():
-                raise serializers.ValidationError("One or more products do not belong to the restaurant of this order.")
-            if product.status != 0:
-                raise serializers.ValidationError(f"The product '{product.name}' is not available for ordering.")
+        if order_products:
+            restaurant = data.get('restaurant')
+            product_ids = [item['product'] for item in order_products]
+            if len(set(product_ids)) != len(product_ids):
+                raise serializers.ValidationError("Each product can only appear once in an order.")
 
-        # Validate totals
-        subtotal = data.get('subtotal', 0)
-        tax = data.get('tax', 0) or 0
-        discount = data.get('discount', 0) or 0
-        tips = data.get('tips', 0) or 0
-        total = data.get('total', 0)
+            # Check every product with a single query.
+            products = Product.objects.filter(id__in=product_ids, restaurants=restaurant).only('name', 'price',
+                                                                                               'status')
+            products = {product.id: product for product in products}
+            if len(products) != len(product_ids):
+                raise serializers.ValidationError("One or more products do not belong to the restaurant of this order.")
 
-        calculated_total = subtotal + tax - discount + tips
-        if round(calculated_total, 2) != round(total, 2):
-            raise serializers.ValidationError("Total amount is incorrect based on subtotal, tax, discount, and tips.")
+            for item in order_products:
+                item['product'] = products[item['product']]
+                if item['product'].status != 0:
+                    raise serializers.ValidationError(
+                        f"The product '{item['product'].name}' is not available for ordering.")
 
         return data
 
+    def create(self, validated_data):
+        """Create the order and all its lines in a single transaction, the lines with one bulk insert."""
+        order_products = validated_data.pop('order_products', [])
+
+        with transaction.atomic():
+            order = super().create(validated_data)
+            OrderProduct.objects.bulk_create([
+                OrderProduct.for_product(order, item['product'], item['quantity']) for item in order_products
+            ])
+            if order_products:
+                # bulk_create skips the signals that keep the reports in sync.
+                schedule_daily_product_sales_refresh(order.restaurant_id, timezone.localdate(order.created))
+                schedule_report_version_bump(order.restaurant_id)
+            Order.recalculate_totals([order.id])
+
+        order.refresh_from_db(fields=['subtotal', 'total'])
+        return order
+
+    def update(self, instance, validated_data):
+        """Update the order and recompute its total, tax, discount or tips may have changed."""
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            Order.recalculate_totals([instance.id])
+
+        instance.refresh_from_db(fields=['subtotal', 'total'])
+        return instance
+
+
+class IngestedOrderSerializer(serializers.Serializer):
+    """
+    Serializer for an order replayed by a terminal that was offline.
+    References are plain ids, they are checked for the whole batch at once when it is ingested.
+    """
+    idempotency_key = serializers.CharField(max_length=64)
+    created = serializers.DateTimeField(required=False)
+    employee = serializers.IntegerField()
+    customer = serializers.IntegerField(required=False, allow_null=True)
+    tables = serializers.ListField(child=serializers.IntegerField(), required=False)
+    customer_name = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, default=0)
+    discount = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, allow_null=True)
+    tax = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, allow_null=True)
+    tips = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, allow_null=True)
+    payment_method = serializers.ChoiceField(choices=Order.PAYMENT_METHOD_CHOICES, required=False, allow_null=True)
+    guest_count = serializers.IntegerField(min_value=0, max_value=32767, required=False, allow_null=True)
+    order_products = OrderLineSerializer(many=True, allow_empty=False)
+
+    @staticmethod
+    def validate_created(value):
+        """The terminal sends when the order was taken, which cannot be in the future."""
+        if value > timezone.now():
+            raise serializers.ValidationError("The order cannot be created in the future.")
+        return value
+
+    @staticmethod
+    def validate_order_products(value):
+        product_ids = [item['product'] for item in value]
+        if len(set(product_ids)) != len(product_ids):
+            raise serializers.ValidationError("Each product can only appear once in an order.")
+        return value
+
 
 class CategorySerializer(serializers.ModelSerializer):
     """
@@ -54,13 +162,15 @@ class CategorySerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     """
     Serializer for Product model with image upload support.
+    `image_derivatives` has the URLs of the resized copies of the image, null until they are built.
     """
     categories = serializers.PrimaryKeyRelatedField(many=True, queryset=Category.objects.all())
     restaurants = serializers.PrimaryKeyRelatedField(many=True, queryset=Restaurant.objects.all())
+    image_derivatives = ImageDerivativesField('image')
 
     class Meta:
         model = Product
-        fields = ['id', 'restaurants', 'name', 'price', 'image', 'status', 'categories', ]
+        fields = ['id', 'restaurants', 'name', 'price', 'image', 'image_derivatives', 'status', 'categories', ]
 
     def validate_name(self, value):
         """
@@ -81,6 +191,17 @@ class ProductSerializer(serializers.ModelSerializer):
         return value
 
 
+class ProductAffinitySerializer(serializers.ModelSerializer):
+    """
+    Serializer for the products frequently bought together with a product.
+    """
+    partner_name = serializers.CharField(source='partner.name', read_only=True)
+
+    class Meta:
+        model = ProductAffinity
+        fields = ['restaurant', 'partner', 'partner_name', 'rank', 'pair_count', 'support', 'confidence', 'lift', ]
+
+
 class OrderProductSerializer(serializers.ModelSerializer):
     """
     Serializer for OrderProduct model with validation.
@@ -88,7 +209,8 @@ class OrderProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderProduct
-        fields = ['id', 'order', 'product', 'quantity']
+        fields = ['id', 'order', 'product', 'quantity', 'unit_price', 'line_total']
+        read_only_fields = ['unit_price', 'line_total']
 
     @staticmethod
     def validate_quantity(value):
@@ -99,13 +221,37 @@ class OrderProductSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         """Ensure product belongs to the restaurant of the order and is available."""
-        order = data.get('order')
-        product = data.get('product')
+        order = data.get('order') or self.instance.order
+        product = data.get('product') or self.instance.product
 
-        if product not in order.restaurant.products.all():
+        if not order.restaurant.products.filter(id=product.id).exists():
             raise serializers.ValidationError("The selected product does not belong to the restaurant of this order.")
 
         if product.status != 0:  # 0 = Available
             raise serializers.ValidationError(f"The product '{product.name}' is not available for ordering.")
 
         return data
+
+
+class OrderProductDetailSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the lines embedded in an order, with the name of their product.
+    """
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = OrderProduct
+        fields = ['id', 'product', 'product_name', 'quantity', 'unit_price', 'line_total']
+        read_only_fields = fields
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the status of a ReportJob. The result is downloaded from its own endpoint.
+    """
+    status = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'report', 'parameters', 'status', 'error', 'created', 'finished', ]
+        read_only_fields = fields
@@ -0,0 +1,332 @@
+from datetime import timedelta
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.common.images import image_derivatives_built, schedule_derivative_files_deletion, schedule_image_derivatives
+from apps.customers.models import Customer
+from apps.restaurants.models import Restaurant, Table
+from apps.restaurants.sync import record_tombstones
+from .events import ORDER_CREATED, ORDER_LINE_ADDED, ORDER_STATUS_CHANGED, TABLE_STATUS_CHANGED, publish_event
+from .menu import category_restaurant_ids, product_restaurant_ids, schedule_menu_version_bump
+from .models import Category, Order, OrderProduct, Product, SalesRollupCheckpoint
+from .occupancy import order_table_ids, refresh_table_status
+from .report_cache import schedule_report_version_bump
+from .reports import schedule_daily_product_sales_refresh
+from .search import index_products, unindex_products
+from .transitions import order_status_changed
+
+
+def deleted_with_order(origin):
+    """Return whether a delete started from an order or a restaurant, whose own receivers cover their lines."""
+    return isinstance(origin, (Order, Restaurant)) or getattr(origin, 'model', None) in (Order, Restaurant)
+
+
+@receiver([post_save, post_delete], sender=OrderProduct)
+def update_reports_for_order_product(sender, instance, origin=None, **kwargs):
+    """Keep the daily sales rollup and the report cache in sync when an order line is written or removed."""
+    if deleted_with_order(origin):
+        return
+
+    if OrderProduct.order.is_cached(instance):
+        order = {'restaurant_id': instance.order.restaurant_id, 'created': instance.order.created}
+    else:
+        order = Order.objects.filter(id=instance.order_id).values('restaurant_id', 'created').first()
+
+    if order:
+        schedule_daily_product_sales_refresh(order['restaurant_id'], timezone.localdate(order['created']))
+        schedule_report_version_bump(order['restaurant_id'])
+
+
+@receiver(pre_delete, sender=OrderProduct)
+def lock_total_of_deleted_order_product(sender, instance, origin=None, **kwargs):
+    """
+    Read the stored total of a line before it is deleted, unless its order or restaurant is deleted with it.
+    Completed and cancelled orders keep their totals, for example when a product they sold is deleted.
+    """
+    if not deleted_with_order(origin) and Order.objects.filter(pk=instance.order_id,
+                                                               status__in=Order.OPEN_STATUSES).exists():
+        instance._deleted_line_total = instance.lock_previous_total()
+
+
+@receiver(post_delete, sender=OrderProduct)
+def update_order_totals_for_deleted_order_product(sender, instance, **kwargs):
+    """Subtract a deleted line from the totals of its order, also for queryset and cascade deletes."""
+    if '_deleted_line_total' in instance.__dict__:
+        Order.apply_subtotal_delta(instance.order_id, -instance.__dict__.pop('_deleted_line_total'))
+
+
+@receiver(post_save, sender=Restaurant)
+def create_sales_rollup_checkpoint(sender, instance, created, **kwargs):
+    """Start the daily rollup of a new restaurant, it has no sales before the day it is created."""
+    if created:
+        SalesRollupCheckpoint.objects.create(restaurant=instance,
+                                             rolled_up_until=timezone.localdate(instance.created) - timedelta(days=1))
+
+
+@receiver(post_save, sender=Order)
+def update_reports_for_order(sender, instance, **kwargs):
+    """Invalidate the cached reports of the restaurant of a written order."""
+    schedule_report_version_bump(instance.restaurant_id)
+
+
+@receiver(post_delete, sender=Order)
+def update_reports_for_deleted_order(sender, instance, **kwargs):
+    """Drop the sales of a deleted order from the daily rollup and the report cache."""
+    schedule_daily_product_sales_refresh(instance.restaurant_id, timezone.localdate(instance.created))
+    schedule_report_version_bump(instance.restaurant_id)
+
+
+@receiver(post_save, sender=Order)
+def publish_order_events(sender, instance, created, **kwargs):
+    """Push new orders and status changes to the screens of the restaurant."""
+    if created:
+        publish_event(instance.restaurant_id, ORDER_CREATED, {'order': instance.id, 'status': instance.status})
+    elif instance.tracker.has_changed('status'):
+        order_status_changed.send(sender=Order, status=instance.status, orders=[{
+            'id': instance.id, 'restaurant_id': instance.restaurant_id, 'created': instance.created,
+            'previous_status': instance.tracker.previous('status'),
+        }])
+
+
+@receiver(order_status_changed, sender=Order)
+def publish_order_status_events(sender, status, orders, **kwargs):
+    """Push the status changes of orders, saved or moved in bulk, to the screens of their restaurant."""
+    for order in orders:
+        publish_event(order['restaurant_id'], ORDER_STATUS_CHANGED, {
+            'order': order['id'], 'status': status, 'previous_status': order['previous_status'],
+        })
+
+
+@receiver(order_status_changed, sender=Order)
+def update_reports_for_status_change(sender, status, orders, **kwargs):
+    """Cancelled orders leave the reports, invalidate the cached reports of the restaurants of the orders."""
+    for restaurant_id in {order['restaurant_id'] for order in orders}:
+        schedule_report_version_bump(restaurant_id)
+
+
+@receiver(post_save, sender=OrderProduct)
+def publish_order_line_events(sender, instance, created, **kwargs):
+    """Push the lines added to an order to the screens of the restaurant."""
+    if created:
+        publish_event(instance.order.restaurant_id, ORDER_LINE_ADDED, {
+            'order': instance.order_id, 'line': instance.id, 'product': instance.product_id,
+            'quantity': instance.quantity,
+        })
+
+
+@receiver(post_save, sender=Table)
+def publish_table_events(sender, instance, created, **kwargs):
+    """Push the status changes of tables to the screens of the restaurant."""
+    if not created and instance.tracker.has_changed('status'):
+        publish_event(instance.restaurant_id, TABLE_STATUS_CHANGED, {
+            'table': instance.id, 'table_number': instance.table_number, 'status': instance.status,
+        })
+
+
+@receiver(m2m_changed, sender=Order.tables.through)
+def update_status_of_order_tables(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Tables are Busy while they have an open order. `instance` is the order,
+    or the table when the relation is changed from the table side.
+    """
+    if reverse:
+        table_ids = {instance.pk}
+    elif action == 'pre_clear':
+        instance._cleared_table_ids = order_table_ids([instance.pk])
+    elif action == 'post_clear':
+        table_ids = instance.__dict__.pop('_cleared_table_ids', set())
+    else:
+        table_ids = pk_set
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        refresh_table_status(table_ids)
+
+
+@receiver(order_status_changed, sender=Order)
+def update_status_of_tables_for_status_change(sender, status, orders, **kwargs):
+    """Closing an order frees its tables, unless another open order holds them."""
+    refresh_table_status(order_table_ids([order['id'] for order in orders]))
+
+
+@receiver(pre_delete, sender=Order)
+def remember_tables_of_deleted_order(sender, instance, origin=None, **kwargs):
+    """Read the tables of an order before its links are removed, they are refreshed once it is deleted."""
+    if not isinstance(origin, Restaurant):
+        instance._deleted_table_ids = order_table_ids([instance.pk])
+
+
+@receiver(post_delete, sender=Order)
+def update_status_of_tables_of_deleted_order(sender, instance, **kwargs):
+    refresh_table_status(instance.__dict__.pop('_deleted_table_ids', set()))
+
+
+@receiver(post_delete, sender=Order)
+def record_deleted_order(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone of deleted orders for the terminals that sync them."""
+    record_tombstones(instance, [instance.restaurant_id], origin)
+
+
+@receiver(pre_delete, sender=Product)
+def record_deleted_product(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone of a deleted product in each of its restaurants, read before the links are removed."""
+    record_tombstones(instance, instance.restaurants.values_list('id', flat=True), origin)
+
+
+@receiver(post_delete, sender=Category)
+def record_deleted_category(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone of deleted categories, they are shared by every restaurant."""
+    record_tombstones(instance, [None], origin)
+
+
+@receiver(m2m_changed, sender=Product.restaurants.through)
+def sync_product_restaurants(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    A product added to a restaurant is new for its terminals, and one removed is deleted for them.
+    `instance` is the product, or the restaurant when the relation is changed from the restaurant side.
+    """
+    if action == 'pre_clear':
+        pk_set = set(getattr(instance, 'products' if reverse else 'restaurants').values_list('id', flat=True))
+    if not pk_set:
+        return
+
+    pairs = [(instance.pk, pk) if reverse else (pk, instance.pk) for pk in pk_set]  # (restaurant, product)
+    if action == 'post_add':
+        Product.objects.filter(pk__in={product_id for _, product_id in pairs}).update(modified=timezone.now())
+    elif action in ('post_remove', 'pre_clear'):
+        for restaurant_id, product_id in pairs:
+            record_tombstones(Product(pk=product_id), [restaurant_id])
+
+
+@receiver(m2m_changed, sender=Order.tables.through)
+@receiver(m2m_changed, sender=Product.categories.through)
+def touch_rows_of_changed_relations(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Bump `modified` of the orders or products whose tables or categories changed, for delta sync."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if not reverse:
+        rows = type(instance).objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        rows = model.objects.filter(pk__in=pk_set)
+    else:
+        field = next(field.name for field in model._meta.many_to_many if field.remote_field.through is sender)
+        rows = model.objects.filter(**{field: instance})
+    rows.update(modified=timezone.now())
+
+
+@receiver(pre_delete, sender=Customer)
+def touch_orders_of_deleted_customer(sender, instance, **kwargs):
+    """The orders of a deleted customer lose it, bump them before it is set to null."""
+    Order.objects.filter(customer=instance).update(modified=timezone.now())
+
+
+@receiver(pre_delete, sender=Table)
+def touch_orders_of_deleted_table(sender, instance, **kwargs):
+    """The orders of a deleted table lose it, bump them before the links are removed."""
+    Order.objects.filter(tables=instance).update(modified=timezone.now())
+
+
+@receiver(pre_delete, sender=Category)
+def touch_products_of_deleted_category(sender, instance, **kwargs):
+    """The products of a deleted category lose it, bump them before the links are removed."""
+    Product.objects.filter(categories=instance).update(modified=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(pre_delete, sender=Product)
+def update_menus_for_product(sender, instance, **kwargs):
+    """Invalidate the menus of the restaurants selling a written product, or a deleted one before its links go."""
+    schedule_menu_version_bump(product_restaurant_ids([instance.pk]))
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def update_menus_for_category(sender, instance, **kwargs):
+    """Invalidate the menus of the restaurants with products in a written or deleted category."""
+    schedule_menu_version_bump(category_restaurant_ids([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Product.restaurants.through)
+@receiver(m2m_changed, sender=Product.categories.through)
+def update_menus_for_product_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalidate the menus changed by adding or removing products to restaurants or categories.
+    `pk_set` is None when the relation is cleared, the links are read before they are removed.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if sender is Product.restaurants.through:
+        if reverse:
+            restaurant_ids = {instance.pk}
+        else:
+            restaurant_ids = pk_set if pk_set is not None else product_restaurant_ids([instance.pk])
+    elif not reverse:
+        restaurant_ids = product_restaurant_ids([instance.pk])
+    elif pk_set is not None:
+        restaurant_ids = product_restaurant_ids(pk_set)
+    else:
+        restaurant_ids = category_restaurant_ids([instance.pk])
+    schedule_menu_version_bump(restaurant_ids)
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, **kwargs):
+    """Keep the search row of a written product in sync with its name."""
+    index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    unindex_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.categories.through)
+def index_products_of_changed_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Category names are searched too, index again the products whose categories changed.
+    The products of a category being cleared are read before the links are removed.
+    """
+    if action == 'pre_clear' and reverse:
+        instance._search_product_ids = list(instance.products.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            index_products([instance.pk])
+        else:
+            index_products(pk_set if pk_set is not None else getattr(instance, '_search_product_ids', []))
+
+
+@receiver(post_save, sender=Category)
+def index_products_of_saved_category(sender, instance, created, **kwargs):
+    """A renamed or deactivated category changes the search rows of its products."""
+    if not created:
+        index_products(Product.objects.filter(categories=instance).values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_products_of_deleted_category(sender, instance, **kwargs):
+    instance._search_product_ids = list(instance.products.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def index_products_of_deleted_category(sender, instance, **kwargs):
+    index_products(getattr(instance, '_search_product_ids', []))
+
+
+@receiver(post_save, sender=Product)
+def build_derivatives_of_saved_product_image(sender, instance, **kwargs):
+    """Resize uploaded images in the background, the request only stores the original."""
+    schedule_image_derivatives(instance)
+
+
+@receiver(post_delete, sender=Product)
+def delete_derivatives_of_deleted_product(sender, instance, **kwargs):
+    schedule_derivative_files_deletion(instance)
+
+
+@receiver(image_derivatives_built, sender=Product)
+def update_menus_for_product_image(sender, instance_id, **kwargs):
+    """The menus list the resized images of their products."""
+    schedule_menu_version_bump(product_restaurant_ids([instance_id]))
@@ -0,0 +1,51 @@
+import factory
+from factory import Faker
+
+from apps.customers.models import Customer
+from apps.pos_systems.models import Order, OrderProduct, Product
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory, TableFactory
+
+
+class CustomerFactory(factory.django.DjangoModelFactory):
+    """ Customer factory """
+    restaurant = factory.SubFactory(RestaurantFactory)
+    name = Faker('name')
+    email = factory.Sequence(lambda n: f"customer{n}@example.com")
+
+    class Meta:
+        model = Customer
+
+
+class ProductFactory(factory.django.DjangoModelFactory):
+    """ Product factory, assigned to the restaurants passed on creation """
+    name = Faker('word')
+    price = 10
+
+    class Meta:
+        model = Product
+
+    @factory.post_generation
+    def restaurants(self, create, extracted, **kwargs):
+        if create and extracted:
+            self.restaurants.set(extracted)
+
+
+class OrderFactory(factory.django.DjangoModelFactory):
+    """ Order factory """
+    restaurant = factory.SubFactory(RestaurantFactory)
+    employee = factory.SubFactory(EmployeeFactory, restaurant=factory.SelfAttribute('..restaurant'))
+    subtotal = 0
+    total = 0
+
+    class Meta:
+        model = Order
+
+
+class OrderProductFactory(factory.django.DjangoModelFactory):
+    """ Order line factory """
+    order = factory.SubFactory(OrderFactory)
+    product = factory.SubFactory(ProductFactory)
+    quantity = 1
+
+    class Meta:
+        model = OrderProduct
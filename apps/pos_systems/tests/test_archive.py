@@ -0,0 +1,96 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.pos_systems.archive import ORDER_ARCHIVE_AFTER_DAYS, archive_orders
+from apps.pos_systems.models import (ArchivedOrder, ArchivedOrderProduct, DailyProductSales, Order,
+                                     OrderProduct)
+from apps.pos_systems.reports import employee_sales, refresh_daily_product_sales, z_report
+from apps.pos_systems.tests.factories.models_factories import OrderFactory, OrderProductFactory, ProductFactory
+from apps.restaurants.models import Tombstone
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory, TableFactory
+
+
+class OrderArchiveTestCase(APITestCase):
+    """ Testing the archival of old closed orders and the reports reading across both tables """
+
+    def setUp(self):
+        cache.clear()
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.employee = EmployeeFactory(restaurant=self.restaurant)
+        self.table = TableFactory(restaurant=self.restaurant)
+        self.burger = ProductFactory(price=10, restaurants=[self.restaurant])
+        self.old_day = timezone.localdate() - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS + 10)
+
+        self.completed = self.old_order(status=2, quantity=2, payment_method=0)
+        self.cancelled = self.old_order(status=3, quantity=1)
+        self.pending = self.old_order(status=0, quantity=3)  # Still open, it stays live.
+        self.recent = OrderFactory(restaurant=self.restaurant, employee=self.employee, status=2)
+        refresh_daily_product_sales(self.restaurant.id, self.old_day)
+
+    def old_order(self, quantity, **fields):
+        order = OrderFactory(restaurant=self.restaurant, employee=self.employee, **fields)
+        order.tables.set([self.table])
+        OrderProductFactory(order=order, product=self.burger, quantity=quantity)
+        Order.objects.filter(id=order.id).update(created=timezone.now() - timedelta(days=ORDER_ARCHIVE_AFTER_DAYS + 10))
+        return order
+
+    def test_closed_orders_are_moved_with_their_lines_and_tables(self):
+        rollup = list(DailyProductSales.objects.values_list('quantity_sold', flat=True))
+        self.assertEqual(archive_orders(chunk_size=1), 2)
+
+        self.assertEqual(set(Order.objects.values_list('id', flat=True)), {self.pending.id, self.recent.id})
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)),
+                         {self.completed.id, self.cancelled.id})
+        archived = ArchivedOrder.objects.get(id=self.completed.id)
+        self.assertEqual((archived.total, archived.payment_method, timezone.localtime(archived.created).date()),
+                         (20, 0, self.old_day))
+        self.assertEqual(list(archived.tables.all()), [self.table])
+        self.assertEqual(list(archived.order_products.values_list('quantity', flat=True)), [2])
+        self.assertFalse(OrderProduct.objects.filter(order_id=self.completed.id).exists())
+
+        # Archiving is not a deletion: the rollup is untouched, but the terminals drop the orders they sync.
+        self.assertEqual(list(DailyProductSales.objects.values_list('quantity_sold', flat=True)), rollup)
+        self.assertEqual(set(Tombstone.objects.values_list('model', 'object_id')),
+                         {('pos_systems.order', self.completed.id), ('pos_systems.order', self.cancelled.id)})
+        self.assertEqual(archive_orders(), 0)
+
+    def test_replayed_archived_orders_are_not_ingested_again(self):
+        Order.objects.filter(id=self.completed.id).update(idempotency_key='terminal-1:1')
+        archive_orders()
+        response = self.client.post(reverse('order-bulk'), {'restaurant': self.restaurant.id, 'orders': [{
+            'idempotency_key': 'terminal-1:1', 'employee': self.employee.id,
+            'order_products': [{'product': self.burger.id, 'quantity': 2}],
+        }]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'duplicate')
+        self.assertEqual(response.data['results'][0]['id'], self.completed.id)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_reports_read_live_and_archived_orders(self):
+        before = (z_report(self.restaurant.id, self.old_day),
+                  employee_sales([self.restaurant.id], self.old_day, timezone.localdate()))
+        archive_orders()
+        after = (z_report(self.restaurant.id, self.old_day),
+                 employee_sales([self.restaurant.id], self.old_day, timezone.localdate()))
+        self.assertEqual(after, before)
+        self.assertEqual(after[0]['order_count'], 3)
+
+        refresh_daily_product_sales(self.restaurant.id, self.old_day)
+        self.assertEqual(DailyProductSales.objects.get(date=self.old_day).quantity_sold, 6)
+
+    def test_export_includes_archived_orders(self):
+        archive_orders()
+        response = self.client.get(reverse('order-export'), {
+            'export_format': 'ndjson', 'start_date': self.old_day.isoformat(),
+            'end_date': timezone.localdate().isoformat(),
+        })
+        orders = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([order['order_id'] for order in orders],
+                         [self.completed.id, self.cancelled.id, self.pending.id, self.recent.id])
+        self.assertEqual(orders[0]['lines'][0]['quantity'], 2)
+        self.assertEqual(ArchivedOrderProduct.objects.count(), 2)
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from apps.pos_systems.events import ORDER_CREATED, EventBroker, broker
+from apps.pos_systems.tests.factories.models_factories import OrderFactory, OrderProductFactory, ProductFactory
+from apps.restaurants.tests.factories.models_factories import RestaurantFactory, TableFactory
+
+
+class EventBrokerTestCase(SimpleTestCase):
+    """ Testing the in-process pub/sub of restaurant events """
+
+    async def test_events_published_from_other_threads_are_delivered(self):
+        events = EventBroker()
+        with events.subscribe(1) as subscription:
+            threading.Thread(target=events.publish, args=(1, ORDER_CREATED, {'order': 7})).start()
+            events.publish(2, ORDER_CREATED, {'order': 8})  # Another restaurant.
+            event = await asyncio.wait_for(subscription.get(), 1)
+        self.assertEqual(event.data, {'order': 7})
+        self.assertTrue(subscription.queue.empty())
+        self.assertEqual(events.subscriber_count(), 0)
+
+    async def test_missed_events_are_replayed(self):
+        events = EventBroker(history_size=3)
+        first = events.publish(1, ORDER_CREATED, {'order': 1})
+        events.publish(1, ORDER_CREATED, {'order': 2})
+        with events.subscribe(1, last_event_id=first.id) as subscription:
+            self.assertEqual((await subscription.get()).data, {'order': 2})
+
+        for order in range(3, 6):
+            events.publish(1, ORDER_CREATED, {'order': order})
+        with events.subscribe(1, last_event_id=first.id) as subscription:
+            self.assertIsNone(await subscription.get())  # Too old, the screen has to resync.
+        with events.subscribe(1, last_event_id='restarted-1') as subscription:
+            self.assertIsNone(await subscription.get())
+
+    async def test_slow_screens_are_asked_to_resync(self):
+        events = EventBroker(queue_size=2)
+        with events.subscribe(1) as subscription:
+            for order in range(3):
+                events.publish(1, ORDER_CREATED, {'order': order})
+            await asyncio.sleep(0)
+            self.assertIsNone(await subscription.get())
+
+
+class OrderEventsTestCase(TestCase):
+    """ Testing the order and table events pushed to the screens """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+
+    def event_types(self, write):
+        before = len(broker.recent_events(self.restaurant.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        return [event.type for event in broker.recent_events(self.restaurant.id)[before:]]
+
+    def test_writes_publish_events(self):
+        order = OrderFactory(restaurant=self.restaurant)
+        table = TableFactory(restaurant=self.restaurant)
+        product = ProductFactory(restaurants=[self.restaurant])
+
+        self.assertEqual(self.event_types(lambda: OrderFactory(restaurant=self.restaurant)), ['order_created'])
+        self.assertEqual(self.event_types(lambda: OrderProductFactory(order=order, product=product)),
+                         ['order_line_added'])
+
+        def change_statuses():
+            order.status = 2
+            order.save()
+            order.save()  # Unchanged, nothing to push.
+            table.status = 1
+            table.save()
+
+        self.assertEqual(self.event_types(change_statuses), ['order_status_changed', 'table_status_changed'])
+
+    async def test_stream_requires_ownership(self):
+        response = await self.async_client.get(reverse('order-events'), {'restaurant': self.restaurant.id})
+        self.assertEqual(response.status_code, 401)
+
+        await self.async_client.aforce_login(self.restaurant.user)
+        response = await self.async_client.get(reverse('order-events'), {'restaurant': self.restaurant.id + 1})
+        self.assertEqual(response.status_code, 403)
+
+    def test_stream_is_refused_under_wsgi(self):
+        self.client.force_login(self.restaurant.user)
+        response = self.client.get(reverse('order-events'), {'restaurant': self.restaurant.id})
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIsInstance(response, StreamingHttpResponse)
+
+    async def test_stream_delivers_events(self):
+        await self.async_client.aforce_login(self.restaurant.user)
+        response = await self.async_client.get(reverse('order-events'), {'restaurant': self.restaurant.id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        event = broker.publish(self.restaurant.id, ORDER_CREATED, {'order': 1})
+        chunk = await asyncio.wait_for(anext(chunks), 1)
+        self.assertEqual(chunk.decode(), f'id: {event.id}\nevent: order_created\ndata: {{"order": 1}}\n\n')
+        await response.streaming_content.aclose()
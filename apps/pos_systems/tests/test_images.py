@@ -0,0 +1,115 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from apps.pos_systems.models import Product
+from apps.pos_systems.tests.factories.models_factories import ProductFactory
+from apps.restaurants.models import Employee
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory
+from apps.users.models import User
+
+
+def image_file(name="dish.jpg", size=(1200, 900), image_format='JPEG'):
+    content = BytesIO()
+    Image.new('RGB', size, 'orange').save(content, image_format)
+    return ContentFile(content.getvalue(), name=name)
+
+
+class ImageDerivativesTestCase(APITestCase):
+    """ Testing the resized copies built in the background from the uploaded images """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+
+    @staticmethod
+    def sizes(derivatives):
+        sizes = {}
+        for size, name in derivatives.items():
+            if size != 'source':
+                with default_storage.open(name) as file, Image.open(file) as image:
+                    sizes[size] = (image.format, image.size)
+        return sizes
+
+    def test_uploaded_product_images_get_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('product-list'), {
+                'name': "Burger", 'price': "8.00", 'restaurants': [self.restaurant.id], 'image': image_file(),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['image_derivatives'])
+
+        product = Product.objects.get(id=response.data['id'])
+        self.assertEqual(product.image_derivatives['source'], product.image.name)
+        self.assertEqual(self.sizes(product.image_derivatives),
+                         {'thumbnail': ('WEBP', (160, 120)), 'medium': ('WEBP', (640, 480))})
+
+        response = self.client.get(reverse('product-detail', args=[product.id]))
+        self.assertTrue(response.data['image_derivatives']['thumbnail'].startswith('http://testserver/media/'))
+        self.assertTrue(response.data['image_derivatives']['medium'].endswith('.medium.webp'))
+        menu = self.client.get(reverse('menu'), {'restaurant': self.restaurant.id}).json()
+        self.assertEqual(menu['products'][0]['images']['thumbnail'],
+                         default_storage.url(product.image_derivatives['thumbnail']))
+
+    def test_replaced_and_removed_images_drop_their_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = ProductFactory(restaurants=[self.restaurant], image=image_file())
+        previous = Product.objects.get(id=product.id).image_derivatives
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.refresh_from_db()
+            product.image = image_file("logo.png", size=(100, 50), image_format='PNG')
+            product.save()
+        derivatives = Product.objects.get(id=product.id).image_derivatives
+        self.assertEqual(self.sizes(derivatives), {'thumbnail': ('WEBP', (100, 50)), 'medium': ('WEBP', (100, 50))})
+        self.assertFalse(default_storage.exists(previous['thumbnail']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.refresh_from_db()
+            product.image = None
+            product.save()
+        self.assertEqual(Product.objects.get(id=product.id).image_derivatives, {})
+        self.assertFalse(default_storage.exists(derivatives['medium']))
+
+    def test_deleted_rows_drop_their_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = ProductFactory(restaurants=[self.restaurant], image=image_file())
+            employee = EmployeeFactory(restaurant=self.restaurant, profile_picture=image_file("chef.jpg"))
+        derivatives = [Product.objects.get(id=product.id).image_derivatives,
+                       Employee.objects.get(id=employee.id).profile_picture_derivatives]
+        self.assertTrue(all(default_storage.exists(names['thumbnail']) for names in derivatives))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(id=product.id).delete()
+            Employee.objects.get(id=employee.id).delete()
+        self.assertFalse(any(default_storage.exists(name) for names in derivatives
+                             for size, name in names.items() if size != 'source'))
+
+    def test_backfill_builds_the_missing_derivatives(self):
+        employee = EmployeeFactory(restaurant=self.restaurant)
+        Employee.objects.filter(id=employee.id).update(profile_picture=default_storage.save("chef.jpg", image_file()))
+        User.objects.filter(id=self.restaurant.user_id).update(
+            profile_image=default_storage.save("owner.jpg", image_file())
+        )
+
+        call_command('build_image_derivatives', stdout=StringIO())
+        employee.refresh_from_db()
+        self.assertEqual(self.sizes(employee.profile_picture_derivatives)['medium'], ('WEBP', (640, 480)))
+        self.assertIn('thumbnail', User.objects.get(id=self.restaurant.user_id).profile_image_derivatives)
+
+        response = self.client.get(reverse('employee-detail', args=[employee.id]))
+        self.assertTrue(response.data['profile_picture_derivatives']['thumbnail'].endswith('.thumbnail.webp'))
@@ -0,0 +1,81 @@
+import gzip
+import json
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.pos_systems.models import Category
+from apps.pos_systems.tests.factories.models_factories import ProductFactory
+from apps.restaurants.tests.factories.models_factories import RestaurantFactory
+
+
+class MenuTestCase(APITestCase):
+    """ Testing the menu snapshot of the terminals """
+
+    def setUp(self):
+        cache.clear()
+        self.restaurant = RestaurantFactory()
+        self.other_restaurant = RestaurantFactory(user=self.restaurant.user)
+        self.client.force_authenticate(self.restaurant.user)
+        self.drinks = Category.objects.create(name="Drinks")
+        self.coffee = ProductFactory(name="Coffee", price=3, restaurants=[self.restaurant])
+        self.coffee.categories.set([self.drinks, Category.objects.create(name="Hidden", status=False)])
+        ProductFactory(name="Bagel", price=2, restaurants=[self.restaurant])
+
+    def get_menu(self, restaurant=None, **headers):
+        return self.client.get(reverse('menu'), {'restaurant': (restaurant or self.restaurant).id}, headers=headers)
+
+    def test_menu_lists_the_products_with_their_active_categories(self):
+        response = self.get_menu(Accept_Encoding='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        menu = json.loads(gzip.decompress(response.content))
+
+        self.assertEqual(menu['restaurant'], self.restaurant.id)
+        self.assertEqual(menu['categories'], [{'id': self.drinks.id, 'name': "Drinks"}])
+        self.assertEqual([(product['name'], product['price'], product['categories']) for product in menu['products']],
+                         [("Bagel", "2.00", []), ("Coffee", "3.00", [self.drinks.id])])
+        self.assertEqual(json.loads(self.get_menu().content), menu)
+
+    def test_cached_menu_is_served_without_queries(self):
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.restaurant.user)}")
+        etag = self.get_menu()['ETag']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_menu().status_code, 200)
+            self.assertEqual(self.get_menu(If_None_Match=etag).status_code, 304)
+
+        self.restaurant.user.is_active = False
+        self.restaurant.user.save()
+        self.assertEqual(self.get_menu().status_code, 401)
+
+    def test_catalogue_changes_invalidate_the_menus_of_their_restaurants(self):
+        etag = self.get_menu()['ETag']
+        other_etag = self.get_menu(self.other_restaurant)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coffee.price = 4
+            self.coffee.save()
+        response = self.get_menu(If_None_Match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn({'id': self.coffee.id, 'name': "Coffee", 'price': "4.00", 'status': 0, 'image': None,
+                       'images': None, 'categories': [self.drinks.id]}, json.loads(response.content)['products'])
+        self.assertEqual(self.get_menu(self.other_restaurant, If_None_Match=other_etag).status_code, 304)
+
+        changes = [
+            (self.other_restaurant, lambda: self.coffee.restaurants.add(self.other_restaurant)),
+            (self.restaurant, lambda: Category.objects.filter(id=self.drinks.id).delete()),
+            (self.restaurant, lambda: self.coffee.categories.clear()),
+        ]
+        for restaurant, change in changes:
+            etag = self.get_menu(restaurant)['ETag']
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertEqual(self.get_menu(restaurant, If_None_Match=etag).status_code, 200)
+
+    def test_only_the_owner_gets_the_menu(self):
+        self.client.force_authenticate(RestaurantFactory().user)
+        self.assertEqual(self.get_menu().status_code, 403)
+        self.assertEqual(self.client.get(reverse('menu')).status_code, 400)
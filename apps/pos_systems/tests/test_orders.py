@@ -0,0 +1,334 @@
+import base64
+import json
+from unittest import mock
+
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from apps.pos_systems.events import ORDER_STATUS_CHANGED, broker
+from apps.pos_systems.ingestion import insert_orders
+from apps.pos_systems.models import Order, OrderProduct
+from apps.pos_systems.tests.factories.models_factories import (CustomerFactory, OrderFactory, OrderProductFactory,
+                                                              ProductFactory)
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory, TableFactory
+
+
+class OrderCreationTestCase(APITestCase):
+    """ Testing the creation of orders with nested lines """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.employee = EmployeeFactory(restaurant=self.restaurant)
+        self.table = TableFactory(restaurant=self.restaurant)
+        self.products = [ProductFactory(price=2, restaurants=[self.restaurant]) for _ in range(15)]
+
+    def create_order(self, products):
+        return self.client.post(reverse('order-list'), {
+            'restaurant': self.restaurant.id, 'employee': self.employee.id, 'tables': [self.table.id],
+            'tips': '5.00',
+            'order_products': [{'product': product.id, 'quantity': 3} for product in products],
+        }, format='json')
+
+    def test_lines_are_created_with_the_order(self):
+        response = self.create_order(self.products)
+        self.assertEqual(response.status_code, 201)
+        lines = OrderProduct.objects.filter(order_id=response.data['id'])
+        self.assertEqual(lines.count(), 15)
+        self.assertEqual(sum(line.line_total for line in lines), 90)
+        self.assertEqual((response.data['subtotal'], response.data['total']), ('90.00', '95.00'))
+
+    def test_query_count_does_not_depend_on_the_number_of_lines(self):
+        self.create_order([])  # Caches the restaurants of the user.
+        with CaptureQueriesContext(connection) as small_order:
+            self.create_order(self.products[:2])
+        with CaptureQueriesContext(connection) as large_order:
+            self.create_order(self.products)
+        self.assertEqual(len(small_order), len(large_order))
+
+    def test_products_of_other_restaurants_are_rejected(self):
+        response = self.create_order([ProductFactory()])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderTotalsTestCase(APITestCase):
+    """ Testing the server-side order totals """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.order = OrderFactory(restaurant=self.restaurant)
+        self.burger = ProductFactory(price=10, restaurants=[self.restaurant])
+        self.fries = ProductFactory(price=3, restaurants=[self.restaurant])
+
+    def assertTotals(self, subtotal, total):
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.subtotal, self.order.total), (subtotal, total))
+
+    def test_line_changes_apply_deltas(self):
+        response = self.client.post(reverse('order-product-list'), {
+            'order': self.order.id, 'product': self.burger.id, 'quantity': 2,
+        })
+        OrderProductFactory(order=self.order, product=self.fries, quantity=1)
+        self.assertTotals(23, 23)
+
+        self.client.patch(reverse('order-product-detail', args=[response.data['id']]), {'quantity': 1})
+        self.assertTotals(13, 13)
+        self.client.delete(reverse('order-product-detail', args=[response.data['id']]))
+        self.assertTotals(3, 3)
+
+    def test_moved_and_bulk_deleted_lines_update_every_order(self):
+        other_order = OrderFactory(restaurant=self.restaurant)
+        line = OrderProductFactory(order=self.order, product=self.burger, quantity=2)
+        OrderProductFactory(order=other_order, product=self.fries, quantity=1)
+
+        response = self.client.patch(reverse('order-product-detail', args=[line.id]), {'order': other_order.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertTotals(0, 0)
+        other_order.refresh_from_db()
+        self.assertEqual((other_order.subtotal, other_order.total), (23, 23))
+
+        OrderProduct.objects.filter(order=other_order, product=self.burger).delete()
+        other_order.refresh_from_db()
+        self.assertEqual((other_order.subtotal, other_order.total), (3, 3))
+
+    def test_deleted_products_keep_the_totals_of_closed_orders(self):
+        completed = OrderFactory(restaurant=self.restaurant, status=2)
+        OrderProductFactory(order=completed, product=self.burger, quantity=1)
+        OrderProductFactory(order=completed, product=self.fries, quantity=1)
+        OrderProductFactory(order=self.order, product=self.burger, quantity=1)
+        completed.refresh_from_db()
+        self.assertEqual(completed.total, 13)
+
+        self.burger.delete()
+        completed.refresh_from_db()
+        self.assertEqual((completed.subtotal, completed.total), (13, 13))
+        self.assertTotals(0, 0)
+
+    def test_order_update_recalculates_the_total(self):
+        OrderProductFactory(order=self.order, product=self.burger, quantity=2)
+        response = self.client.patch(reverse('order-detail', args=[self.order.id]), {'tax': '2.00', 'tips': '4.00',
+                                                                                 'total': '1'})
+        self.assertEqual((response.data['subtotal'], response.data['total']), ('20.00', '26.00'))
+
+
+class OrderIngestionTestCase(APITestCase):
+    """ Testing the batch ingestion of orders from offline terminals """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.employee = EmployeeFactory(restaurant=self.restaurant)
+        self.table = TableFactory(restaurant=self.restaurant)
+        self.burger = ProductFactory(price=10, restaurants=[self.restaurant])
+        self.fries = ProductFactory(price=3, restaurants=[self.restaurant])
+
+    def order(self, key, **fields):
+        return {
+            'idempotency_key': key, 'employee': self.employee.id, 'tables': [self.table.id], 'tips': '1.00',
+            'order_products': [{'product': self.burger.id, 'quantity': 2}, {'product': self.fries.id}],
+            **fields,
+        }
+
+    def ingest(self, orders):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('order-bulk'), {'restaurant': self.restaurant.id, 'orders': orders},
+                                    format='json')
+
+    def test_orders_are_created_with_their_lines(self):
+        response = self.ingest([self.order('terminal-1:1'), self.order('terminal-1:2')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+
+        order = Order.objects.get(id=response.data['results'][0]['id'])
+        self.assertEqual((order.subtotal, order.total), (23, 24))
+        self.assertEqual(list(order.tables.all()), [self.table])
+
+    def test_replayed_orders_are_not_duplicated(self):
+        first = self.ingest([self.order('terminal-1:1')])
+        response = self.ingest([self.order('terminal-1:1'), self.order('terminal-1:2'), self.order('terminal-1:2')])
+
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['duplicate', 'created', 'duplicate'])
+        self.assertEqual(response.data['results'][0]['id'], first.data['results'][0]['id'])
+        self.assertEqual(response.data['results'][2]['id'], response.data['results'][1]['id'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_invalid_orders_do_not_block_the_batch(self):
+        response = self.ingest([
+            self.order('terminal-1:1', employee=EmployeeFactory().id),
+            self.order('terminal-1:2'),
+            self.order('terminal-1:3', order_products=[]),
+        ])
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['invalid', 'created', 'invalid'])
+        self.assertIn('employee', response.data['results'][0]['errors'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_conflicts_of_a_retried_batch_are_reported_per_order(self):
+        def concurrent_replay(restaurant_id, orders):
+            if len(orders) > 1:  # Another terminal inserts the first order while the batch is inserted.
+                insert_orders(restaurant_id, dict(list(orders.items())[:1]))
+                raise IntegrityError
+            if orders.get(2):  # The last order breaks a constraint every time.
+                raise IntegrityError
+            return insert_orders(restaurant_id, orders)
+
+        with mock.patch('apps.pos_systems.ingestion.insert_orders', side_effect=concurrent_replay):
+            response = self.ingest([self.order('terminal-1:1'), self.order('terminal-1:2'), self.order('terminal-1:3')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['duplicate', 'created', 'invalid'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_query_count_does_not_depend_on_the_batch_size(self):
+        self.ingest([self.order('warm-up')])  # Caches the restaurants of the user.
+        with CaptureQueriesContext(connection) as small_batch:
+            self.ingest([self.order(f'small:{number}') for number in range(2)])
+        with CaptureQueriesContext(connection) as large_batch:
+            self.ingest([self.order(f'large:{number}') for number in range(30)])
+        self.assertEqual(len(small_batch), len(large_batch))
+
+
+class OrderExpandTestCase(APITestCase):
+    """ Testing the expandable order representation """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.burger = ProductFactory(price=10, restaurants=[self.restaurant])
+
+    def create_orders(self, count):
+        for _ in range(count):
+            order = OrderFactory(restaurant=self.restaurant, customer=CustomerFactory(restaurant=self.restaurant))
+            order.tables.add(TableFactory(restaurant=self.restaurant))
+            OrderProductFactory(order=order, product=self.burger, quantity=2)
+
+    def test_relations_are_embedded(self):
+        self.create_orders(1)
+        response = self.client.get(reverse('order-list'), {'expand': 'lines,tables,employee,customer'})
+        order = response.data['results'][0]
+
+        self.assertEqual(order['lines'][0]['product_name'], self.burger.name)
+        self.assertEqual(order['lines'][0]['line_total'], '20.00')
+        self.assertIn('table_number', order['tables'][0])
+        self.assertIn('name', order['employee'])
+        self.assertIn('name', order['customer'])
+
+    def test_page_query_count_is_fixed(self):
+        self.create_orders(100)
+        self.client.get(reverse('order-list'))  # Caches the restaurants of the user.
+        # The count, the page with its employees and customers, then the tables and the lines with their products.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('order-list'), {
+                'expand': 'lines,tables,employee,customer', 'page_size': 100,
+            })
+        self.assertEqual(len(response.data['results']), 100)
+
+        with self.assertNumQueries(3):  # The table ids are prefetched as well when they are not expanded.
+            self.client.get(reverse('order-list'), {'page_size': 100})
+
+    def test_unknown_relations_are_rejected(self):
+        response = self.client.get(reverse('order-list'), {'expand': 'restaurant'})
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderKeysetPaginationTestCase(APITestCase):
+    """ Testing the cursor pagination of orders """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.orders = [OrderFactory(restaurant=self.restaurant) for _ in range(25)]
+        # Several orders created at the same time are told apart by their id.
+        Order.objects.filter(id__in=[order.id for order in self.orders[5:15]]).update(created=self.orders[5].created)
+
+    def collect(self, url, params=None, on_page=None):
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [order['id'] for order in response.data['results']]
+            url, params = response.data['next'], None
+            if on_page:
+                on_page()
+        return ids
+
+    def test_cursor_pages_follow_the_creation_order(self):
+        ids = self.collect(reverse('order-list'), {'cursor': '', 'page_size': 10})
+        expected = list(Order.objects.order_by('created', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_inserts_do_not_shift_the_pages(self):
+        ids = self.collect(reverse('order-list'), {'cursor': '', 'page_size': 10},
+                           on_page=lambda: OrderFactory(restaurant=self.restaurant))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertTrue({order.id for order in self.orders} <= set(ids))
+
+    def test_cursor_pages_do_not_count_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('order-list'), {'cursor': ''})
+        self.assertNotIn('count', response.data)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+
+    def test_page_numbers_are_still_supported(self):
+        response = self.client.get(reverse('order-list'), {'page': 2, 'page_size': 10})
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursors_are_rejected(self):
+        response = self.client.get(reverse('order-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+        for position in (['garbage', 1], [{'a': 1}], [None, 1], [self.orders[0].created.isoformat(), [1]]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            response = self.client.get(reverse('order-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+
+
+class OrderTransitionTestCase(APITestCase):
+    """ Testing the order state machine and the bulk transitions """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+
+    def transition(self, orders, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('order-transition'), {'orders': orders, 'status': status}, format='json')
+
+    def test_valid_orders_are_moved_and_the_others_rejected(self):
+        pending, processing = (OrderFactory(restaurant=self.restaurant, status=status) for status in (0, 1))
+        completed = OrderFactory(restaurant=self.restaurant, status=2)
+        other_restaurant = OrderFactory(status=0)
+
+        response = self.transition([pending.id, processing.id, completed.id, other_restaurant.id], 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['moved'], [pending.id, processing.id])
+        self.assertEqual([rejected['id'] for rejected in response.data['rejected']],
+                         [completed.id, other_restaurant.id])
+        self.assertEqual(set(Order.objects.filter(status=3).values_list('id', flat=True)), {pending.id, processing.id})
+        self.assertEqual(Order.objects.get(id=other_restaurant.id).status, 0)
+
+    def test_orders_are_moved_with_one_update(self):
+        orders = [OrderFactory(restaurant=self.restaurant, status=0).id for _ in range(20)]
+        self.transition(orders[:1], 1)  # Caches the restaurants of the user.
+        with CaptureQueriesContext(connection) as queries:
+            self.transition(orders[1:], 2)
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries.captured_queries), 1)
+
+    def test_transitions_are_published_to_the_screens(self):
+        order = OrderFactory(restaurant=self.restaurant, status=1)
+        self.transition([order.id], 2)
+        event = broker.recent_events(self.restaurant.id)[-1]
+        self.assertEqual((event.type, event.data), (ORDER_STATUS_CHANGED,
+                                                    {'order': order.id, 'status': 2, 'previous_status': 1}))
+
+    def test_updates_follow_the_state_machine(self):
+        order = OrderFactory(restaurant=self.restaurant, status=2)
+        response = self.client.patch(reverse('order-detail', args=[order.id]), {'status': 0})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(reverse('order-detail', args=[order.id]), {'status': 2})
+        self.assertEqual(response.status_code, 200)
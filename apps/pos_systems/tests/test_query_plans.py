@@ -0,0 +1,128 @@
+import re
+import unittest
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.pos_systems.models import Category
+from apps.pos_systems.tests.factories.models_factories import (CustomerFactory, OrderFactory, OrderProductFactory,
+                                                              ProductFactory)
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory, TableFactory
+
+# Tables that are read whole on purpose: categories are few and shared by every restaurant.
+FULL_SCAN_ALLOWED = {'pos_systems_category'}
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "The query plans are read with SQLite's EXPLAIN QUERY PLAN.")
+class QueryPlanTestCase(APITestCase):
+    """
+    Testing that the main queries of each endpoint use an index.
+    Every SELECT run by a request is explained, and a full scan of a table fails the test with its plan.
+    The tables are not ANALYZEd, so the planner assumes they are large and picks indexes when they exist.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurants = [RestaurantFactory() for _ in range(3)]
+        for restaurant in cls.restaurants:
+            employee = EmployeeFactory(restaurant=restaurant)
+            tables = [TableFactory(restaurant=restaurant) for _ in range(3)]
+            products = [ProductFactory(restaurants=[restaurant]) for _ in range(3)]
+            products[0].categories.set([Category.objects.create(name=f"Category {restaurant.id}")])
+            for table, product in zip(tables, products):
+                order = OrderFactory(restaurant=restaurant, employee=employee,
+                                     customer=CustomerFactory(restaurant=restaurant))
+                order.tables.set([table])
+                OrderProductFactory(order=order, product=product)
+        cls.restaurant = cls.restaurants[0]
+        cls.order = cls.restaurant.orders.first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.restaurant.user)
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    @staticmethod
+    def full_scans(plan):
+        """
+        Return the steps of a plan reading a whole table, derived tables like subqueries are not counted,
+        nor full-text lookups, which SQLite reports as scans of the virtual table with an index.
+        """
+        derived = {step.split()[1] for step in plan if step.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+        skipped = derived | FULL_SCAN_ALLOWED | {'CONSTANT'}
+        scans = []
+        for step in plan:
+            match = re.match(r'SCAN (\S+)', step)
+            if match and match[1] not in skipped and 'VIRTUAL TABLE INDEX' not in step:
+                scans.append(step)
+        return scans
+
+    def assertIndexedQueries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        # Streaming responses run their queries while the content is read.
+        with CaptureQueriesContext(connection) as streamed:
+            b''.join(getattr(response, 'streaming_content', []))
+
+        failures = []
+        for query in queries.captured_queries + streamed.captured_queries:
+            if query['sql'].startswith('SELECT'):
+                plan = self.explain(query['sql'])
+                if self.full_scans(plan):
+                    failures.append(f"{query['sql']}\n    {' | '.join(plan)}")
+        self.assertFalse(failures, f"Full table scans in {url} {params or ''}:\n" + "\n".join(failures))
+
+    def test_restaurants(self):
+        self.assertIndexedQueries(reverse('restaurant-list'))
+        self.assertIndexedQueries(reverse('restaurant-detail', args=[self.restaurant.id]))
+
+    def test_employees_tables_and_customers(self):
+        for name in ('employee', 'table', 'customer'):
+            self.assertIndexedQueries(reverse(f'{name}-list'))
+            self.assertIndexedQueries(reverse(f'{name}-list'), {'restaurant': self.restaurant.id})
+            self.assertIndexedQueries(reverse(f'{name}-list'), {'cursor': ''})
+            self.assertIndexedQueries(reverse(f'{name}-list'), {'modified_since': timezone.now().isoformat()})
+
+    def test_orders(self):
+        self.assertIndexedQueries(reverse('order-list'), {'restaurant': self.restaurant.id})
+        self.assertIndexedQueries(reverse('order-list'), {'cursor': '', 'expand': 'lines,tables,employee,customer'})
+        self.assertIndexedQueries(reverse('order-list'), {'modified_since': timezone.now().isoformat()})
+        self.assertIndexedQueries(reverse('order-detail', args=[self.order.id]), {'expand': 'lines'})
+        self.assertIndexedQueries(reverse('order-export'), {'start_date': timezone.localdate().isoformat()})
+
+    def test_order_products(self):
+        self.assertIndexedQueries(reverse('order-product-list'))
+        self.assertIndexedQueries(reverse('order-product-list'), {'order': self.order.id})
+
+    def test_products_and_categories(self):
+        self.assertIndexedQueries(reverse('product-list'))
+        self.assertIndexedQueries(reverse('product-list'), {'restaurant': self.restaurant.id, 'cursor': ''})
+        self.assertIndexedQueries(reverse('product-list'), {'modified_since': timezone.now().isoformat()})
+        self.assertIndexedQueries(reverse('category-list'))
+        self.assertIndexedQueries(reverse('menu'), {'restaurant': self.restaurant.id})
+        for query in ('ab', 'categ', 'xyzxyz'):
+            self.assertIndexedQueries(reverse('product-search'), {'q': query, 'restaurant': self.restaurant.id})
+
+    def test_reports_and_floor_plan(self):
+        last_week = {'start_date': (timezone.localdate() - timedelta(days=7)).isoformat(),
+                     'end_date': timezone.localdate().isoformat()}
+        self.assertIndexedQueries(reverse('daily-report'), last_week)
+        self.assertIndexedQueries(reverse('sales-heatmap-report'), last_week)
+        self.assertIndexedQueries(reverse('employee-sales-report'), last_week)
+        self.assertIndexedQueries(reverse('z-report'), {'restaurant': self.restaurant.id})
+        self.assertIndexedQueries(reverse('floor-plan'), {'restaurant': self.restaurant.id})
+
+    def test_full_scans_are_detected(self):
+        plan = self.explain('SELECT * FROM "pos_systems_order" WHERE "customer_name" = \'Ana\'')
+        self.assertEqual(self.full_scans(plan), ['SCAN pos_systems_order'])
@@ -0,0 +1,304 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.common.background import BACKGROUND_MAX_WORKERS, get_executor
+from apps.pos_systems.affinity import build_product_affinity
+from apps.pos_systems.jobs import REPORT_JOB_TIMEOUT, run_report_job, runnable_report_jobs
+from apps.pos_systems.models import (AffinityCheckpoint, DailyProductSales, Order, ProductAffinity, ReportJob,
+                                     SalesRollupCheckpoint)
+from apps.pos_systems.reports import rebuild_daily_product_sales, refresh_daily_product_sales
+from apps.pos_systems.tests.factories.models_factories import OrderFactory, OrderProductFactory, ProductFactory
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory
+
+
+class DailyReportProductsTestCase(APITestCase):
+    """ Testing the daily sales rollup behind the products report """
+
+    def setUp(self):
+        cache.clear()
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.burger = ProductFactory(name='Burger', price=10, restaurants=[self.restaurant])
+        self.fries = ProductFactory(name='Fries', price=3, restaurants=[self.restaurant])
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            old_order = OrderFactory(restaurant=self.restaurant)
+            Order.objects.filter(id=old_order.id).update(created=timezone.now() - timedelta(days=1))
+            old_order.refresh_from_db()
+            OrderProductFactory(order=old_order, product=self.burger, quantity=2)
+            OrderProductFactory(order=OrderFactory(restaurant=self.restaurant), product=self.burger, quantity=1)
+            OrderProductFactory(order=OrderFactory(restaurant=self.restaurant), product=self.fries, quantity=4)
+
+    def test_rollup_is_updated_on_write(self):
+        rollup = DailyProductSales.objects.get(restaurant=self.restaurant, date=self.yesterday)
+        self.assertEqual(rollup.product, self.burger)
+        self.assertEqual(rollup.quantity_sold, 2)
+        self.assertEqual(rollup.total_revenue, 20)
+
+    def test_open_day_is_rolled_up_once_closed(self):
+        self.assertFalse(DailyProductSales.objects.filter(date=timezone.localdate()).exists())
+
+        # Yesterday is still open for a restaurant rolled up until the day before.
+        DailyProductSales.objects.all().delete()
+        SalesRollupCheckpoint.objects.update(rolled_up_until=self.yesterday - timedelta(days=1))
+        response = self.client.get(reverse('daily-report'), {'start_date': self.yesterday.isoformat()})
+        self.assertEqual(response.data['total_revenue'], 20)
+        self.assertEqual(list(DailyProductSales.objects.values_list('date', 'quantity_sold')), [(self.yesterday, 2)])
+        self.assertEqual(SalesRollupCheckpoint.objects.get().rolled_up_until, self.yesterday)
+
+    def test_order_delete_refreshes_its_day_once(self):
+        order = Order.objects.get(created__date__lt=timezone.localdate())
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in ProductFactory.create_batch(14, restaurants=[self.restaurant]):
+                OrderProductFactory(order=order, product=product)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            order.delete()
+        refreshes = [callback for callback in callbacks if callback.function is refresh_daily_product_sales]
+        self.assertEqual(len(refreshes), 1)
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(DailyProductSales.objects.exists())
+
+    def test_report_merges_rollup_and_current_day(self):
+        response = self.client.get(reverse('daily-report'), {
+            'start_date': self.yesterday.isoformat(), 'end_date': timezone.localdate().isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_revenue'], 42)
+        self.assertEqual([(p['name'], p['quantity_sold']) for p in response.data['products']],
+                         [('Fries', 4), ('Burger', 3)])
+
+    def test_rebuild_backfills_missing_rows(self):
+        DailyProductSales.objects.all().delete()
+        count = rebuild_daily_product_sales(self.yesterday, timezone.localdate())
+        self.assertEqual(count, 3)
+
+    def test_unchanged_report_returns_not_modified(self):
+        response = self.client.get(reverse('daily-report'))
+        etag = response['ETag']
+        with self.assertNumQueries(0):  # The restaurants of the user are cached, the report is not recomputed.
+            response = self.client.get(reverse('daily-report'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        for header, status_code in [(f'"other", W/{etag}', 304), ('*', 304), (f'{etag}x', 200), (etag[:-2], 200)]:
+            response = self.client.get(reverse('daily-report'), HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, status_code)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderProductFactory(order=OrderFactory(restaurant=self.restaurant), product=self.fries, quantity=1)
+        response = self.client.get(reverse('daily-report'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_revenue'], 25)
+
+    def test_consolidated_report_with_previous_period(self):
+        other = RestaurantFactory(user=self.restaurant.user)
+        self.burger.restaurants.add(other)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderProductFactory(order=OrderFactory(restaurant=other), product=self.burger, quantity=5)
+
+        today = timezone.localdate().isoformat()
+        with self.assertNumQueries(3):  # The ownership check, the rollup checkpoint check and the report query.
+            response = self.client.get(reverse('daily-report'), {
+                'start_date': today, 'end_date': today, 'consolidated': 'true', 'compare': 'true',
+            })
+        self.assertEqual(response.data['totals']['total_revenue'], 72)
+        self.assertEqual(response.data['totals']['previous']['total_revenue'], 20)
+        self.assertEqual([(r['restaurant'], r['total_revenue']) for r in response.data['restaurants']],
+                         [(other.id, 50), (self.restaurant.id, 22)])
+
+    def test_price_change_keeps_historical_revenue(self):
+        self.burger.price = 50
+        self.burger.save()
+        response = self.client.get(reverse('daily-report'))
+        self.assertEqual(response.data['total_revenue'], 22)
+
+
+class OrderExportTestCase(APITestCase):
+    """ Testing the streaming order export """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        product = ProductFactory(name='Burger', price=10, restaurants=[self.restaurant])
+        OrderProductFactory(order=OrderFactory(restaurant=self.restaurant), product=product, quantity=2)
+        OrderFactory(restaurant=self.restaurant)
+        OrderFactory()  # Another owner's order must not be exported.
+
+    def test_csv_export(self):
+        response = self.client.get(reverse('order-export'), {'export_format': 'csv'})
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertIn('Burger', rows[1])
+
+    def test_ndjson_export(self):
+        response = self.client.get(reverse('order-export'), {'export_format': 'ndjson'})
+        orders = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([len(order['lines']) for order in orders], [1, 0])
+
+
+class SalesHeatmapReportTestCase(APITestCase):
+    """ Testing the weekday / hour sales heatmap """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_orders_are_bucketed_by_weekday_and_hour(self):
+        restaurant = RestaurantFactory()
+        self.client.force_authenticate(restaurant.user)
+        OrderFactory(restaurant=restaurant, total=15)
+        OrderFactory(restaurant=restaurant, total=5)
+        OrderFactory(restaurant=restaurant, total=100, status=3)
+
+        response = self.client.get(reverse('sales-heatmap-report'))
+        now = timezone.localtime()
+        heatmap = response.data['restaurants'][0]
+        self.assertEqual(heatmap['orders'][now.weekday()][now.hour], 2)
+        self.assertEqual(heatmap['revenue'][now.weekday()][now.hour], 20)
+        self.assertEqual(sum(map(sum, heatmap['orders'])), 2)
+
+
+class ReportJobTestCase(APITestCase):
+    """ Testing the background report jobs """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        product = ProductFactory(name='Burger', price=10, restaurants=[self.restaurant])
+        OrderProductFactory(order=OrderFactory(restaurant=self.restaurant), product=product, quantity=2)
+
+    def test_job_result_is_stored(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('report-job-list'), {'report': 'products'})
+        self.assertEqual(response.status_code, 202)
+
+        job = ReportJob.objects.get(id=response.data['id'])
+        self.assertEqual(job.get_status_display(), 'Completed')
+        response = self.client.get(reverse('report-job-result', args=[job.id]))
+        self.assertEqual(response.data['products'][0]['name'], 'Burger')
+
+    def test_closed_range_is_not_recomputed(self):
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.client.post(reverse('report-job-list'), {'report': 'sales-heatmap', 'start_date': yesterday})
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.client.post(reverse('report-job-list'), {'report': 'sales-heatmap', 'start_date': yesterday})
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_lost_jobs_are_not_reused_and_can_be_claimed_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lost = self.client.post(reverse('report-job-list'), {'report': 'products'}).data['id']
+        started = timezone.now() - timedelta(seconds=REPORT_JOB_TIMEOUT + 1)
+        ReportJob.objects.filter(id=lost).update(status=1, started=started, result=None)
+        self.assertTrue(runnable_report_jobs().filter(id=lost).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('report-job-list'), {'report': 'products'})
+        self.assertNotEqual(response.data['id'], lost)
+
+        run_report_job(lost)
+        job = ReportJob.objects.get(id=lost)
+        self.assertEqual(job.get_status_display(), 'Completed')
+        self.assertGreater(job.started, started)
+
+    def test_background_pool_keeps_its_size(self):
+        executor = get_executor()
+        with self.assertLogs('apps.common.background', 'WARNING'):
+            self.assertIs(get_executor(BACKGROUND_MAX_WORKERS + 1), executor)
+
+
+class ProductAffinityTestCase(APITestCase):
+    """ Testing the frequently-bought-together products """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.burger, self.fries, self.soda, self.salad = [
+            ProductFactory(name=name, restaurants=[self.restaurant]) for name in ('Burger', 'Fries', 'Soda', 'Salad')
+        ]
+        self.place_orders([[self.burger, self.fries], [self.burger, self.fries, self.soda], [self.salad, self.soda]],
+                          days_ago=3)
+
+    def place_orders(self, baskets, days_ago):
+        for products in baskets:
+            order = OrderFactory(restaurant=self.restaurant)
+            Order.objects.filter(id=order.id).update(created=timezone.now() - timedelta(days=days_ago))
+            for product in products:
+                OrderProductFactory(order=order, product=product)
+
+    def test_affinities_are_ranked_by_lift(self):
+        self.assertEqual(build_product_affinity(self.restaurant.id, min_count=1), 8)
+        response = self.client.get(reverse('product-affinity', args=[self.burger.id]))
+        self.assertEqual([row['partner_name'] for row in response.data], ['Fries', 'Soda'])
+        self.assertAlmostEqual(response.data[0]['lift'], 1.5)
+        self.assertAlmostEqual(response.data[0]['confidence'], 1)
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        build_product_affinity(self.restaurant.id, min_count=1)
+        # Pretend the checkpoint was taken two days ago, before the new orders.
+        AffinityCheckpoint.objects.update(processed_until=timezone.now() - timedelta(days=2))
+        self.place_orders([[self.salad, self.soda], [self.burger, self.salad]], days_ago=1)
+        build_product_affinity(self.restaurant.id, min_count=1)
+        incremental = list(ProductAffinity.objects.values_list('product', 'partner', 'rank', 'pair_count'))
+
+        build_product_affinity(self.restaurant.id, min_count=1, full=True)
+        full = list(ProductAffinity.objects.values_list('product', 'partner', 'rank', 'pair_count'))
+        self.assertEqual(sorted(incremental), sorted(full))
+        self.assertEqual(AffinityCheckpoint.objects.get().order_count, 5)
+
+
+class EmployeeSalesReportTestCase(APITestCase):
+    """ Testing the employee sales performance report """
+
+    def test_employees_are_ranked_by_revenue(self):
+        cache.clear()
+        restaurant = RestaurantFactory()
+        self.client.force_authenticate(restaurant.user)
+        waiter, chef = EmployeeFactory(restaurant=restaurant), EmployeeFactory(restaurant=restaurant)
+        OrderFactory(restaurant=restaurant, employee=waiter, total=30, tips=5)
+        OrderFactory(restaurant=restaurant, employee=waiter, total=10, status=3)
+        OrderFactory(restaurant=restaurant, employee=chef, total=20)
+
+        with self.assertNumQueries(2):  # The restaurants of the user, loaded once, and the report query.
+            response = self.client.get(reverse('employee-sales-report'), {'limit': 1})
+        [employee] = response.data['employees']
+        self.assertEqual(employee['employee_id'], waiter.id)
+        self.assertEqual((employee['order_count'], employee['revenue'], employee['tips']), (2, 30, 5))
+        self.assertEqual(employee['cancellation_rate'], 0.5)
+        self.assertEqual(self.client.get(reverse('employee-sales-report'), {'limit': 0}).status_code, 400)
+
+
+class ZReportTestCase(APITestCase):
+    """ Testing the end-of-day Z-report snapshots """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        OrderFactory(restaurant=self.restaurant, subtotal=20, tips=2, total=22, payment_method=0, status=2)
+        OrderFactory(restaurant=self.restaurant, subtotal=10, total=10, payment_method=1, status=3)
+
+    def test_closed_day_is_served_from_the_snapshot(self):
+        response = self.client.get(reverse('z-report'), {'restaurant': self.restaurant.id})
+        self.assertFalse(response.data['closed'])
+        self.assertEqual(response.data['totals']['total'], '22.00')
+        self.assertEqual(response.data['payment_methods'][0], {'payment_method': 'Cash', 'order_count': 1,
+                                                               'total': '22.00'})
+
+        response = self.client.post(reverse('close-business-day'), {'restaurant': self.restaurant.id})
+        self.assertEqual(response.status_code, 201)
+        OrderFactory(restaurant=self.restaurant, subtotal=5, total=5, payment_method=0)
+
+        response = self.client.get(reverse('z-report'), {'restaurant': self.restaurant.id})
+        self.assertTrue(response.data['closed'])
+        self.assertEqual(response.data['totals']['total'], '22.00')
+        self.assertEqual(response.data['statuses'][3], {'status': 'Cancelled', 'order_count': 1})
+
+        response = self.client.post(reverse('close-business-day'), {'restaurant': self.restaurant.id})
+        self.assertEqual(response.status_code, 409)
@@ -0,0 +1,79 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from apps.pos_systems.models import Category
+from apps.pos_systems.tests.factories.models_factories import ProductFactory
+from apps.restaurants.tests.factories.models_factories import RestaurantFactory
+
+
+class ProductSearchTestCase(APITestCase):
+    """ Testing the product search of the cashiers """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.drinks = Category.objects.create(name="Hot Drinks")
+        self.cappuccino = self.create_product("Cappuccino", self.drinks)
+        self.create_product("Iced Cappuccino")
+        self.create_product("Tea", self.drinks)
+        self.create_product("Cheesecake")
+        ProductFactory(name="Cappuccino Grande", restaurants=[RestaurantFactory()])
+
+    def create_product(self, name, *categories):
+        product = ProductFactory(name=name, restaurants=[self.restaurant])
+        product.categories.set(categories)
+        return product
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('product-search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.data]
+
+    def test_search_matches_parts_of_names_and_categories(self):
+        self.assertEqual(self.search("cappu"), ["Cappuccino", "Iced Cappuccino"])
+        self.assertEqual(self.search("ccino"), ["Cappuccino", "Iced Cappuccino"])
+        self.assertEqual(self.search("drinks"), ["Tea", "Cappuccino"])
+        self.assertEqual(self.search("hot cap"), ["Cappuccino"])
+        self.assertEqual(self.search("ch"), ["Cheesecake"])
+        self.assertEqual(self.search("ca", limit=1), ["Cappuccino"])
+
+    def test_search_folds_accented_letters(self):
+        self.create_product("Éclair")
+        self.create_product("Ñoquis de Papa")
+        self.assertEqual(self.search("é"), ["Éclair"])
+        self.assertEqual(self.search("ÉCLA"), ["Éclair"])
+        self.assertEqual(self.search("ño"), ["Ñoquis de Papa"])
+        self.assertEqual(self.search("ÑOQUIS papa"), ["Ñoquis de Papa"])
+
+    def test_search_tolerates_typos(self):
+        self.assertEqual(self.search("capucino"), ["Cappuccino", "Iced Cappuccino"])
+        self.assertEqual(self.search("cheescake"), ["Cheesecake"])
+        self.assertEqual(self.search("pizza"), [])
+
+    def test_search_index_follows_writes(self):
+        self.cappuccino.name = "Flat White"
+        self.cappuccino.save()
+        self.assertEqual(self.search("flat"), ["Flat White"])
+        self.assertEqual(self.search("cappu"), ["Iced Cappuccino"])
+
+        self.drinks.name = "Coffee"
+        self.drinks.save()
+        self.assertEqual(self.search("coffee"), ["Tea", "Flat White"])
+        self.drinks.products.clear()
+        self.assertEqual(self.search("coffee"), [])
+
+        self.cappuccino.categories.add(self.drinks)
+        self.drinks.delete()
+        self.assertEqual(self.search("coffee"), [])
+        self.cappuccino.delete()
+        self.assertEqual(self.search("flat"), [])
+
+    def test_search_is_scoped_and_validated(self):
+        self.assertEqual(self.search("cappu", restaurant=self.restaurant.id), ["Cappuccino", "Iced Cappuccino"])
+
+        self.client.force_authenticate(RestaurantFactory().user)
+        self.assertEqual(self.search("cappu"), [])
+        self.assertEqual(self.client.get(reverse('product-search'), {'q': "cappu", 'restaurant': self.restaurant.id})
+                         .status_code, 403)
+        self.assertEqual(self.client.get(reverse('product-search')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('product-search'), {'q': "cappu", 'limit': 0}).status_code, 400)
@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.pos_systems.models import Category, Order, Product
+from apps.pos_systems.tests.factories.models_factories import OrderFactory, OrderProductFactory, ProductFactory
+from apps.restaurants.tests.factories.models_factories import RestaurantFactory, TableFactory
+
+
+class DeltaSyncTestCase(APITestCase):
+    """ Testing the modified_since sync of the terminals """
+
+    def setUp(self):
+        cache.clear()
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.orders = [OrderFactory(restaurant=self.restaurant) for _ in range(3)]
+        self.products = [ProductFactory(restaurants=[self.restaurant]) for _ in range(20)]
+
+        # Everything above was synced an hour ago.
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Order.objects.update(modified=an_hour_ago)
+        Product.objects.update(modified=an_hour_ago)
+        self.since = (timezone.now() - timedelta(minutes=1)).isoformat()
+
+    def sync(self, name, **params):
+        response = self.client.get(reverse(name), {'modified_since': self.since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_only_changed_and_deleted_rows_are_returned(self):
+        order, deleted_order = self.orders[:2]
+        order.status = 1
+        order.save()
+        deleted_order_id = deleted_order.id
+        deleted_order.delete()
+
+        data = self.sync('order-list')
+        self.assertEqual([row['id'] for row in data['results']], [order.id])
+        self.assertEqual(data['deleted'], [deleted_order_id])
+        self.assertIn('watermark', data)
+
+    def test_indirect_changes_bump_the_order(self):
+        order = self.orders[0]
+        OrderProductFactory(order=order, product=self.products[0])
+        self.orders[1].tables.add(TableFactory(restaurant=self.restaurant))
+
+        data = self.sync('order-list')
+        self.assertEqual({row['id'] for row in data['results']}, {self.orders[0].id, self.orders[1].id})
+
+    def test_products_removed_from_the_restaurant_are_deleted(self):
+        removed, deleted, moved_back = self.products[:3]
+        self.restaurant.products.remove(removed, moved_back)
+        deleted_id = deleted.id
+        deleted.delete()
+        moved_back.restaurants.add(self.restaurant)
+
+        data = self.sync('product-list')
+        self.assertEqual([row['id'] for row in data['results']], [moved_back.id])
+        self.assertEqual(data['deleted'], sorted([removed.id, deleted_id]))
+        # Other restaurants do not see these tombstones.
+        self.client.force_authenticate(RestaurantFactory().user)
+        self.assertEqual(self.sync('product-list')['deleted'], [])
+
+    def test_deactivated_categories_are_deleted(self):
+        category = Category.objects.create(name="Drinks")
+        Category.objects.filter(id=category.id).update(status=False, modified=timezone.now())
+        self.assertEqual(self.sync('category-list')['deleted'], [category.id])
+
+    def test_sync_cost_does_not_depend_on_the_catalogue_size(self):
+        self.sync('product-list')  # Caches the restaurants of the user.
+        with self.assertNumQueries(2):  # The changed products and the tombstones.
+            data = self.sync('product-list')
+        self.assertEqual(data['results'], [])
+
+    def test_changed_rows_are_paged_in_modification_order(self):
+        changed = self.products[:5]
+        for product in changed:
+            product.save()
+        deleted_id = self.products[5].id
+        self.products[5].delete()
+
+        data = self.sync('product-list', page_size=2)
+        pages = [data]
+        while data['next']:
+            self.assertIsNone(data['watermark'])
+            self.assertEqual(data['deleted'], [])
+            changed[4].save()  # Saved while the pages are read, it moves to the last page.
+            data = self.client.get(data['next']).data
+            pages.append(data)
+
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertEqual([row['id'] for page in pages for row in page['results']],
+                         [product.id for product in changed])
+        self.assertEqual(data['deleted'], [deleted_id])
+        self.assertIsNotNone(data['watermark'])
+
+    def test_old_watermarks_need_a_full_download(self):
+        response = self.client.get(reverse('order-list'), {
+            'modified_since': (timezone.now() - timedelta(days=365)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 400)
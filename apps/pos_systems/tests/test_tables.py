@@ -0,0 +1,68 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from apps.pos_systems.tests.factories.models_factories import OrderFactory, OrderProductFactory, ProductFactory
+from apps.restaurants.models import Table
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory, TableFactory
+
+
+class TableOccupancyTestCase(APITestCase):
+    """ Testing the table status kept from the open orders, and the floor plan """
+
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+        self.employee = EmployeeFactory(restaurant=self.restaurant)
+        self.tables = [TableFactory(restaurant=self.restaurant, table_number=number, status=0)
+                       for number in range(1, 4)]
+
+    def assertStatuses(self, statuses):
+        self.assertEqual([Table.objects.get(id=table.id).status for table in self.tables], statuses)
+
+    def open_order(self, tables, **fields):
+        order = OrderFactory(restaurant=self.restaurant, employee=self.employee, **fields)
+        order.tables.set(tables)
+        return order
+
+    def test_tables_are_busy_while_they_have_an_open_order(self):
+        response = self.client.post(reverse('order-list'), {
+            'restaurant': self.restaurant.id, 'employee': self.employee.id,
+            'tables': [self.tables[0].id, self.tables[1].id],
+        }, format='json')
+        self.assertStatuses([1, 1, 0])
+
+        self.client.post(reverse('order-transition'), {'orders': [response.data['id']], 'status': 2}, format='json')
+        self.assertStatuses([0, 0, 0])
+
+    def test_tables_shared_by_open_orders_stay_busy(self):
+        first = self.open_order([self.tables[0]])
+        second = self.open_order([self.tables[0], self.tables[1]])
+
+        self.client.patch(reverse('order-detail', args=[first.id]), {'status': 3})
+        self.assertStatuses([1, 1, 0])
+        second.tables.remove(self.tables[1])
+        self.assertStatuses([1, 0, 0])
+        second.delete()
+        self.assertStatuses([0, 0, 0])
+
+    def test_floor_plan_lists_the_open_order_of_each_table(self):
+        order = self.open_order([self.tables[1]], guest_count=4)
+        OrderProductFactory(order=order, product=ProductFactory(price=12, restaurants=[self.restaurant]), quantity=2)
+        self.open_order([self.tables[2]], status=2)
+        for number in range(4, 54):
+            TableFactory(restaurant=self.restaurant, table_number=number)
+
+        # Caches the restaurants of the user.
+        self.client.get(reverse('floor-plan'), {'restaurant': self.restaurant.id})
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('floor-plan'), {'restaurant': self.restaurant.id})
+        tables = response.data['tables']
+        self.assertEqual(len(tables), 53)
+        self.assertEqual((tables[0]['order'], tables[2]['order']), (None, None))
+        self.assertEqual((tables[1]['order'], tables[1]['guest_count'], tables[1]['total'], tables[1]['status']),
+                         (order.id, 4, 24, 1))
+        self.assertGreaterEqual(tables[1]['elapsed_seconds'], 0)
+
+    def test_floor_plan_of_other_restaurants_is_forbidden(self):
+        response = self.client.get(reverse('floor-plan'), {'restaurant': RestaurantFactory().id})
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Order
+
+MAX_TRANSITION_BATCH_SIZE = 500
+
+# Sent when orders change status, by a save or in bulk. Arguments:
+#   orders: a list of dicts with the id, restaurant_id, created and previous_status of each order.
+#   status: the new status.
+order_status_changed = Signal()
+
+
+def status_label(status):
+    return dict(Order.STATUS_CHOICES).get(status, status)
+
+
+def transition_orders(queryset, order_ids, status):
+    """
+    Move the orders of a queryset to a new status, when the state machine allows it.
+    The allowed orders are locked and moved with one conditional UPDATE.
+    Returns the ids moved and the rejected ones with the reason.
+    """
+    allowed_statuses = Order.statuses_allowed_to(status)
+    order_ids = list(dict.fromkeys(order_ids))
+
+    with transaction.atomic():
+        orders = {
+            order['id']: order for order in
+            queryset.filter(id__in=order_ids).select_for_update().values('id', 'restaurant_id', 'created', 'status')
+        }
+        moved = [order_id for order_id in order_ids if orders.get(order_id, {}).get('status') in allowed_statuses]
+        if moved:
+            Order.objects.filter(id__in=moved, status__in=allowed_statuses).update(status=status,
+                                                                                  modified=timezone.now())
+            order_status_changed.send(sender=Order, status=status, orders=[
+                {'id': order_id, 'restaurant_id': orders[order_id]['restaurant_id'],
+                 'created': orders[order_id]['created'], 'previous_status': orders[order_id]['status']}
+                for order_id in moved
+            ])
+
+    rejected = []
+    for order_id in order_ids:
+        if order_id not in orders:
+            rejected.append({'id': order_id, 'reason': "The order does not exist."})
+        elif order_id not in moved:
+            previous = orders[order_id]['status']
+            rejected.append({'id': order_id, 'reason': f"An order cannot go from {status_label(previous)} "
+                                                       f"to {status_label(status)}."})
+    return moved, rejected
@@ -1,17 +1,26 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import DailyReportProductsView
-from .viewsets import OrderViewSet, CategoryViewSet, ProductViewSet, OrderProductViewSet
+from .views import (CloseBusinessDayView, DailyReportProductsView, EmployeeSalesReportView, FloorPlanView,
+                    MenuView, OrderEventsView, SalesHeatmapReportView, ZReportView)
+from .viewsets import OrderViewSet, CategoryViewSet, ProductViewSet, OrderProductViewSet, ReportJobViewSet
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'order-products', OrderProductViewSet, basename='order-product')
+router.register(r'report-jobs', ReportJobViewSet, basename='report-job')
 
 urlpatterns = [
     path('', include(router.urls)),
     # View Apis
     path('daily-report/products/', DailyReportProductsView.as_view(), name='daily-report'),
+    path('reports/sales-heatmap/', SalesHeatmapReportView.as_view(), name='sales-heatmap-report'),
+    path('reports/employees/', EmployeeSalesReportView.as_view(), name='employee-sales-report'),
+    path('reports/z-report/', ZReportView.as_view(), name='z-report'),
+    path('reports/z-report/close/', CloseBusinessDayView.as_view(), name='close-business-day'),
+    path('floor-plan/', FloorPlanView.as_view(), name='floor-plan'),
+    path('menu/', MenuView.as_view(), name='menu'),
+    path('events/orders/', OrderEventsView.as_view(), name='order-events'),
 ]
@@ -1,63 +1,233 @@
-from datetime import datetime
-from django.utils.timezone import make_aware
-from django.db.models import Sum, F
-from rest_framework.views import APIView
-from rest_framework.response import Response
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import APIException, NotAuthenticated, ValidationError
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from apps.pos_systems.models import Order, OrderProduct
+from apps.pos_systems.events import broker
+from apps.pos_systems.menu import menu_response
+from apps.pos_systems.models import ZReport
+from apps.pos_systems.occupancy import floor_plan
+from apps.pos_systems.report_cache import cached_report_response
+from apps.pos_systems.reports import (close_business_day, employee_sales_report, get_report_restaurant_ids,
+                                      parse_employee_report_options, parse_report_dates, products_report,
+                                      sales_heatmap_report, z_report)
 from apps.restaurants.models import Restaurant
+from apps.restaurants.ownership import check_restaurant_owner
+from apps.restaurants.permissions import IsRestaurantOwner
+from apps.users.authentication import CachedUserJWTAuthentication
+
+# Seconds between the comments sent to idle screens, so proxies do not close their connection.
+ORDER_EVENTS_KEEPALIVE = 15
 
 
 class DailyReportProductsView(APIView):
     """
     API endpoint to generate daily sales report.
-    Filters by date range and restaurant.
+    Filters by date range and restaurant. Responses are cached until an order of the restaurants changes.
+    With `consolidated=true`, returns the sales of each restaurant plus the grand totals,
+    and `compare=true` adds the totals of the previous period of the same length.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def get(request):
+        start_date, end_date = parse_report_dates(request.query_params)
+        restaurant_ids = get_report_restaurant_ids(request)
+        consolidated = request.query_params.get("consolidated") == "true"
+        compare = request.query_params.get("compare") == "true"
+
+        params = {"start_date": start_date, "end_date": end_date, "consolidated": consolidated, "compare": compare}
+        return cached_report_response(request, "products", restaurant_ids, params,
+                                      lambda: products_report(restaurant_ids, **params))
+
+
+class SalesHeatmapReportView(APIView):
+    """
+    API endpoint to generate the hour-of-day / day-of-week sales heatmap.
+    Filters by date range and restaurant. Responses are cached until an order of the restaurants changes.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def get(request):
+        start_date, end_date = parse_report_dates(request.query_params)
+        restaurant_ids = get_report_restaurant_ids(request)
+
+        params = {"start_date": start_date, "end_date": end_date}
+        return cached_report_response(request, "sales-heatmap", restaurant_ids, params,
+                                      lambda: sales_heatmap_report(restaurant_ids, **params))
+
+
+class EmployeeSalesReportView(APIView):
+    """
+    API endpoint to generate the sales performance of each employee.
+    Filters by date range and restaurant, sorts by `ordering` (prefix with "-" for descending)
+    and keeps the first `limit` employees. Superusers see every restaurant, like in the employees API.
+    """
+    permission_classes = [IsAuthenticated, IsRestaurantOwner]
+
+    @staticmethod
+    def get(request):
+        start_date, end_date = parse_report_dates(request.query_params)
+        restaurant_ids = get_report_restaurant_ids(request)
+        if request.user.is_superuser and not request.query_params.get("restaurant"):
+            restaurant_ids = list(Restaurant.objects.values_list('id', flat=True))
+
+        ordering, limit = parse_employee_report_options(request.query_params)
+
+        params = {"start_date": start_date, "end_date": end_date, "ordering": ordering, "limit": limit}
+        return cached_report_response(request, "employees", restaurant_ids, params,
+                                      lambda: employee_sales_report(restaurant_ids, **params))
+
+
+def get_business_day(request, params):
+    """Return the restaurant and the day of a Z-report request, the day defaults to today."""
+    if not params.get("restaurant"):
+        raise ValidationError("A restaurant ID is required.")
+    [restaurant_id] = get_report_restaurant_ids(request, params)
+    day, _ = parse_report_dates({"start_date": params.get("date")})
+    return restaurant_id, day
+
+
+class ZReportView(APIView):
+    """
+    API endpoint to get the end-of-day Z-report of a restaurant.
+    Closed days are served from their snapshot, only days that are still open are computed live.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def get(request):
+        restaurant_id, day = get_business_day(request, request.query_params)
+
+        snapshot = ZReport.objects.filter(restaurant_id=restaurant_id, business_date=day).first()
+        if snapshot:
+            return Response({"closed": True, "closed_at": snapshot.closed, **snapshot.data})
+        return Response({"closed": False, "closed_at": None, **z_report(restaurant_id, day)})
+
+
+class CloseBusinessDayView(APIView):
+    """
+    API endpoint to close the business day of a restaurant, storing its Z-report.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def post(request):
+        restaurant_id, day = get_business_day(request, request.data)
+        if day > timezone.localdate():
+            raise ValidationError("A business day cannot be closed before it starts.")
+
+        snapshot = close_business_day(restaurant_id, day, request.user)
+        if not snapshot:
+            return Response({"error": "This business day is already closed."}, status=status.HTTP_409_CONFLICT)
+        return Response({"closed": True, "closed_at": snapshot.closed, **snapshot.data},
+                        status=status.HTTP_201_CREATED)
+
+
+class FloorPlanView(APIView):
+    """
+    API endpoint to get every table of a restaurant with its open order, for the hosts.
+    Each table has the id of its open order, the guests, the seconds since it was opened and its running total.
     """
     permission_classes = [IsAuthenticated]
 
     @staticmethod
     def get(request):
-        start_date = request.query_params.get("start_date")
-        end_date = request.query_params.get("end_date")
         restaurant_id = request.query_params.get("restaurant")
+        if not restaurant_id:
+            raise ValidationError("A restaurant ID is required.")
+        restaurant_id = check_restaurant_owner(request, restaurant_id)
+        return Response({"restaurant": restaurant_id, "tables": floor_plan(restaurant_id)})
 
-        # If no date range is provided, default to today
-        if not start_date:
-            start_date = datetime.today().strftime('%Y-%m-%d')
-        if not end_date:
-            end_date = start_date
-
-        start_date = make_aware(datetime.strptime(start_date, '%Y-%m-%d'))
-        end_date = make_aware(datetime.strptime(end_date, '%Y-%m-%d'))
-
-        if restaurant_id:
-            if not Restaurant.objects.filter(id=restaurant_id,
-                                             user=request.user).exists() and not request.user.is_superuser:
-                raise PermissionDenied("You do not have access to this restaurant's reports.")
-            orders = Order.objects.filter(restaurant_id=restaurant_id, created__date__range=[start_date, end_date])
-        else:
-            user_restaurants = Restaurant.objects.filter(user=request.user)
-            orders = Order.objects.filter(restaurant__in=user_restaurants, created__date__range=[start_date, end_date])
-
-        # Get all order products for the filtered orders
-        order_products = OrderProduct.objects.filter(order__in=orders)
-
-        # Group by name and calculate quantity sold and total revenue
-        report_data = (
-            order_products
-            .values(name=F("product__name"))
-            .annotate(
-                quantity_sold=Sum("quantity"),
-                total_revenue=Sum(F("quantity") * F("product__price"))
-            )
-            .order_by("-quantity_sold")
+
+class MenuView(APIView):
+    """
+    API endpoint to get the whole menu of a restaurant for its terminals, in one gzip compressed JSON document.
+    The menu is built once per version, when a product, a category or one of their links changes,
+    and its ETag lets terminals poll it for a 304.
+    The user of a JWT is taken from the token instead of loaded, and whether it is active from the cache,
+    so a cached menu is served without a query.
+    """
+    authentication_classes = [CachedUserJWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def get(request):
+        restaurant_id = request.query_params.get("restaurant")
+        if not restaurant_id:
+            raise ValidationError("A restaurant ID is required.")
+        return menu_response(request, check_restaurant_owner(request, restaurant_id))
+
+
+def get_event_stream_restaurant_id(request):
+    """
+    Authenticate an event stream request like the REST API does, and return the restaurant it follows.
+    Only its owner, or a superuser, can follow a restaurant.
+    """
+    request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+
+    restaurant_id = request.query_params.get("restaurant")
+    if not restaurant_id:
+        raise ValidationError("A restaurant ID is required.")
+    if request.user.is_superuser and str(restaurant_id).isdigit():
+        return int(restaurant_id)
+    return check_restaurant_owner(request, restaurant_id)
+
+
+class OrderEventsView(View):
+    """
+    Server-Sent Events stream of the orders and tables of a restaurant, for kitchen and floor screens.
+    Events are order_created, order_line_added, order_status_changed and table_status_changed, with the ids
+    to refetch. A `resync` event means events were missed: reload from the REST API, then keep listening.
+    Browsers reconnect by themselves and send the Last-Event-ID header to replay what they missed.
+    The stream never ends, so it is only served under ASGI: a WSGI worker would be held by each screen.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"detail": "The event stream is only available when the app is served with ASGI."},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        try:
+            restaurant_id = await sync_to_async(get_event_stream_restaurant_id)(request)
+        except APIException as error:
+            return JsonResponse({"detail": error.detail}, status=error.status_code)
+
+        response = StreamingHttpResponse(
+            self.stream(restaurant_id, request.headers.get("Last-Event-ID")), content_type="text/event-stream"
         )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Stop nginx from buffering the stream.
+        return response
+
+    @staticmethod
+    async def stream(restaurant_id, last_event_id):
+        with broker.subscribe(restaurant_id, last_event_id) as subscription:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), ORDER_EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
 
-        return Response({
-            "creation_report_date": datetime.today().strftime('%Y-%m-%d'),
-            "total_revenue": order_products.aggregate(total_revenue=Sum(F("quantity") * F("product__price")))[
-                "total_revenue"],
-            "products": list(report_data)
-        })
+                if event is None:
+                    # The id of the latest event, so the screen does not replay what it reloads when reconnecting.
+                    latest = broker.recent_events(restaurant_id)[-1:]
+                    yield "".join(f"id: {event.id}\n" for event in latest) + "event: resync\ndata: {}\n\n"
+                    return
+                yield event.encode()
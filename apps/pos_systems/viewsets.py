@@ -1,35 +1,61 @@
-from rest_framework import pagination, viewsets, serializers
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from rest_framework import mixins, pagination, status, viewsets, serializers
+from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.parsers import FormParser, MultiPartParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.response import Response
 
 from ..customers.models import Customer
-from ..restaurants.models import Restaurant, Employee, Table
-from .models import Order, Category, Product, OrderProduct
-from .serializers import OrderSerializer, CategorySerializer, ProductSerializer, OrderProductSerializer
+from ..restaurants.models import Employee, Table
+from ..restaurants.ownership import RestaurantScopedMixin, check_restaurant_owner, get_owned_restaurant_ids
+from ..restaurants.pagination import KeysetPaginationMixin
+from ..restaurants.sync import DeltaSyncMixin
+from .archive import order_models
+from .exports import EXPORT_FORMATS
+from .ingestion import MAX_INGEST_BATCH_SIZE, ingest_orders
+from .jobs import REPORTS, submit_report_job
+from .models import Order, Category, Product, OrderProduct, ProductAffinity, ReportJob
+from .search import MAX_PRODUCT_SEARCH_LIMIT, PRODUCT_SEARCH_LIMIT, search_products
+from .reports import (created_between, get_report_restaurant_ids, parse_employee_report_options,
+                      parse_report_dates)
+from .transitions import MAX_TRANSITION_BATCH_SIZE, transition_orders
+from .serializers import (OrderSerializer, CategorySerializer, ProductSerializer, OrderProductSerializer,
+                          ProductAffinitySerializer, ReportJobSerializer)
 from ..restaurants.permissions import IsRestaurantOwner
 
 
-class ProductPagination(PageNumberPagination):
+class ProductPagination(KeysetPaginationMixin, PageNumberPagination):
     """
-    Pagination for Customers.
+    Pagination for Products, by page number or by cursor.
     """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 50
 
 
-class OrderPagination(pagination.PageNumberPagination):
+class OrderPagination(KeysetPaginationMixin, pagination.PageNumberPagination):
     """
-    Custom pagination for Customers.
+    Custom pagination for Orders, by page number or by cursor in creation order.
     """
     page_size = 30
     page_size_query_param = 'page_size'
     max_page_size = 100
+    keyset_ordering = ('created', 'id')
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderProductPagination(KeysetPaginationMixin, pagination.PageNumberPagination):
+    """
+    Pagination for the products of orders, by page number or by cursor in the creation order of their orders.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    keyset_ordering = ('order__created', 'id')
+
+
+class OrderViewSet(DeltaSyncMixin, RestaurantScopedMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing orders.
     """
@@ -38,17 +64,38 @@ class OrderViewSet(viewsets.ModelViewSet):
     pagination_class = OrderPagination
 
     def get_queryset(self):
-        """Only return orders belonging to the authenticated user's restaurant."""
-        if self.request.user.is_superuser:
-            return Order.objects.all()
-
-        restaurant_id = self.request.query_params.get("restaurant")
-        if restaurant_id:
-            if not Restaurant.objects.filter(id=restaurant_id, user=self.request.user).exists():
-                raise PermissionDenied("You are not the owner of this restaurant.")
-            return Order.objects.filter(restaurant_id=restaurant_id)
-
-        return Order.objects.filter(restaurant__user=self.request.user)
+        """
+        Only return orders belonging to the authenticated user's restaurant.
+        The expanded relations are loaded with a fixed number of queries, whatever the page size.
+        """
+        queryset = self.scope_to_restaurants(Order.objects.all())
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+
+        expand = self.get_expand()
+        queryset = queryset.prefetch_related('tables')  # Their ids are listed when they are not expanded.
+        if 'lines' in expand:
+            queryset = queryset.prefetch_related(
+                Prefetch('order_products', queryset=OrderProduct.objects.select_related('product')))
+        related = [name for name in ('employee', 'customer') if name in expand]
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset
+
+    def get_expand(self):
+        """Return the relations to embed, from the comma-separated `expand` query parameter of read requests."""
+        if self.request.method not in SAFE_METHODS:
+            return set()
+
+        expand = {name.strip() for name in self.request.query_params.get("expand", "").split(",") if name.strip()}
+        unknown = expand - set(OrderSerializer.EXPANDABLE_FIELDS)
+        if unknown:
+            raise ValidationError(f"Cannot expand {', '.join(sorted(unknown))}. "
+                                  f"Choose from: {', '.join(OrderSerializer.EXPANDABLE_FIELDS)}.")
+        return expand
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), "expand": self.get_expand()}
 
     def perform_create(self, serializer):
         """Ensure the order is created only in the user's restaurant and validate consistency."""
@@ -57,44 +104,122 @@ class OrderViewSet(viewsets.ModelViewSet):
         if not restaurant_id:
             raise ValidationError("A restaurant ID is required to create an order.")
 
-        restaurant = Restaurant.objects.filter(id=restaurant_id, user=self.request.user).first()
-        if not restaurant:
-            raise PermissionDenied("You do not have permission to create orders in this restaurant.")
+        restaurant_id = check_restaurant_owner(self.request, restaurant_id,
+                                               "You do not have permission to create orders in this restaurant.")
 
-        # Validate that the table exists and is available
-        table_ids = self.request.data.get("tables", [])
-        for table_id in table_ids:
-            table = Table.objects.filter(table_number=table_id, restaurant=restaurant).first()
-            if not table:
-                raise ValidationError(f"Table {table_id} does not exist or does not belong to this restaurant.")
+        # Validate that the tables exist and belong to the restaurant, with a single query
+        tables = serializer.validated_data.get("tables", [])
+        table_ids = {table.id for table in tables}
+        invalid_table_ids = table_ids - set(
+            Table.objects.filter(id__in=table_ids, restaurant_id=restaurant_id).values_list('id', flat=True))
+        if invalid_table_ids:
+            raise ValidationError(
+                f"Table {min(invalid_table_ids)} does not exist or does not belong to this restaurant.")
 
         # Validate that the employee belongs to the restaurant
         employee_id = self.request.data.get("employee")
         if employee_id:
-            if not Employee.objects.filter(id=employee_id, restaurant=restaurant).exists():
+            if not Employee.objects.filter(id=employee_id, restaurant_id=restaurant_id).exists():
                 raise ValidationError("The assigned employee does not belong to this restaurant.")
 
         # Validate that the customer belongs to the restaurant
         customer_id = self.request.data.get("customer")
         if customer_id:
-            if not Customer.objects.filter(id=customer_id, restaurant=restaurant).exists():
+            if not Customer.objects.filter(id=customer_id, restaurant_id=restaurant_id).exists():
                 raise ValidationError("The assigned customer does not belong to this restaurant.")
 
-        serializer.save(restaurant=restaurant)
+        serializer.save()
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Ingest the orders queued by a terminal while it was offline, with their lines, in one request.
+        Each order carries an `idempotency_key`, so replaying a batch never duplicates orders,
+        and gets its own result, so only the invalid ones need to be fixed and sent again.
+        """
+        restaurant_id = request.data.get("restaurant")
+        if not restaurant_id:
+            raise ValidationError("A restaurant ID is required to create an order.")
+        restaurant_id = check_restaurant_owner(request, restaurant_id,
+                                               "You do not have permission to create orders in this restaurant.")
+
+        orders = request.data.get("orders")
+        if not isinstance(orders, list) or not orders:
+            raise ValidationError("The orders must be a non-empty list.")
+        if len(orders) > MAX_INGEST_BATCH_SIZE:
+            raise ValidationError(f"A batch can contain at most {MAX_INGEST_BATCH_SIZE} orders.")
+
+        results = ingest_orders(restaurant_id, orders)
+        summary = {status: sum(result["status"] == status for result in results)
+                   for status in ("created", "duplicate", "invalid")}
+        return Response({**summary, "results": results})
+
+    @action(detail=False, methods=['post'])
+    def transition(self, request):
+        """
+        Move many orders to a status at once, like completing or cancelling the open orders at the end of a shift.
+        Only the transitions of the order state machine are applied, the other orders are returned as rejected.
+        """
+        order_ids = request.data.get("orders")
+        if (not isinstance(order_ids, list) or not order_ids
+                or not all(type(order_id) is int for order_id in order_ids)):
+            raise ValidationError("The orders must be a non-empty list of IDs.")
+        if len(order_ids) > MAX_TRANSITION_BATCH_SIZE:
+            raise ValidationError(f"At most {MAX_TRANSITION_BATCH_SIZE} orders can be moved at once.")
+
+        new_status = request.data.get("status")
+        if type(new_status) is not int or new_status not in dict(Order.STATUS_CHOICES):
+            raise ValidationError("The status must be one of: "
+                                  f"{', '.join(f'{value} ({label})' for value, label in Order.STATUS_CHOICES)}.")
+
+        moved, rejected = transition_orders(self.scope_to_restaurants(Order.objects.all()), order_ids, new_status)
+        return Response({"status": new_status, "moved": moved, "rejected": rejected})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the orders with their lines, tables and payment method as CSV or NDJSON.
+        Use `export_format` to choose the format and `start_date`/`end_date` to limit the range.
+        Ranges starting before the retention window include the archived orders, listed first.
+        """
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError(f"The export format must be one of: {', '.join(EXPORT_FORMATS)}.")
+
+        start_date = end_date = None
+        if "start_date" in request.query_params or "end_date" in request.query_params:
+            start_date, end_date = parse_report_dates(request.query_params)
 
+        querysets = []
+        for order_model in reversed(order_models(start_date)):  # Archived orders are older, they go first.
+            queryset = self.scope_to_restaurants(order_model.objects.all())
+            if start_date:
+                queryset = queryset.filter(**created_between(start_date, end_date))
+            querysets.append(queryset)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+        stream, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream(querysets), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="orders.{export_format}"'
+        return response
+
+
+class CategoryViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing product categories.
     Only active categories (status = 0) are returned.
     """
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated, IsRestaurantOwner]
+    sync_shared = True
 
     def get_queryset(self):
         """Return only active categories."""
         return Category.objects.filter(status=1)
 
+    def get_hidden_ids(self, modified_since):
+        """Deactivated categories are deleted for the terminals."""
+        return set(Category.objects.filter(status=0, modified__gte=modified_since).values_list('id', flat=True))
+
     def perform_create(self, serializer):
         """Only the Superuser, and Staff  can create a category."""
         if not self.request.user.is_staff:
@@ -102,7 +227,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(DeltaSyncMixin, RestaurantScopedMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing products.
     """
@@ -110,48 +235,86 @@ class ProductViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     pagination_class = ProductPagination
     parser_classes = [MultiPartParser, FormParser]  # Enable file uploads
+    restaurant_lookup = 'restaurants'
 
     def get_queryset(self):
         """
         Only return products for the authenticated user's restaurants.
+        Their restaurant and category ids are prefetched, instead of queried for each product.
         """
+        queryset = Product.objects.prefetch_related('restaurants', 'categories')
         if self.request.user.is_superuser:
-            return Product.objects.all()
-
-        restaurant_id = self.request.query_params.get("restaurant")
-
-        if restaurant_id:
-            if not Restaurant.objects.filter(id=restaurant_id, user=self.request.user).exists():
-                raise PermissionDenied("You are not the owner of this restaurant.")
-            return Product.objects.filter(restaurants__id=restaurant_id)
-
-        return Product.objects.filter(restaurants__user=self.request.user).distinct()
+            return queryset
+        return self.scope_to_restaurants(queryset).distinct()
 
     def perform_create(self, serializer):
         """
         Ensure that a product can only be assigned to restaurants owned by the same user.
         Also, prevent duplicate product names within the same restaurant.
         """
-        user_restaurants = Restaurant.objects.filter(user=self.request.user)
         selected_restaurants = serializer.validated_data.get("restaurants")
-        product_name = serializer.validated_data.get("name")
 
-        if not set(selected_restaurants).issubset(set(user_restaurants)):
+        if not {restaurant.id for restaurant in selected_restaurants} <= get_owned_restaurant_ids(self.request):
             raise serializers.ValidationError("You can only assign products to your own restaurants.")
         serializer.save()
 
+    @action(detail=True, methods=['get'])
+    def affinity(self, request, pk=None):
+        """
+        Return the products frequently bought together with this one, as upsell suggestions.
+        Filters by the `restaurant` query parameter, or every restaurant of the user.
+        """
+        product = self.get_object()
+        affinities = ProductAffinity.objects.filter(product=product).select_related('partner')
+
+        restaurant_id = request.query_params.get("restaurant")
+        if restaurant_id:
+            affinities = affinities.filter(restaurant_id=restaurant_id)
+        elif not request.user.is_superuser:
+            affinities = affinities.filter(restaurant_id__in=get_owned_restaurant_ids(request))
+
+        serializer = ProductAffinitySerializer(affinities.order_by('restaurant_id', 'rank'), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Return the products matching what a cashier types, best first, for autocomplete.
+        `q` is matched against the product names and category names, also in the middle of a word
+        and with small typos. Filters by the `restaurant` query parameter, or every restaurant of the user.
+        """
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError("A search query (q) is required.")
+        limit = request.query_params.get("limit", str(PRODUCT_SEARCH_LIMIT))
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PRODUCT_SEARCH_LIMIT:
+            raise ValidationError(f"The limit must be a number between 1 and {MAX_PRODUCT_SEARCH_LIMIT}.")
+
+        restaurant_id = request.query_params.get("restaurant")
+        if request.user.is_superuser:
+            restaurant_ids = None
+        elif restaurant_id:
+            restaurant_ids = [check_restaurant_owner(request, restaurant_id)]
+        else:
+            restaurant_ids = get_owned_restaurant_ids(request)
+
+        products = search_products(self.get_queryset(), query, restaurant_ids, int(limit))
+        return Response(self.get_serializer(products, many=True).data)
+
     @staticmethod
     def has_permission(request, view):
         """Custom permission to allow only admins or restaurant owners to access the list."""
-        return request.user.is_superuser or Restaurant.objects.filter(user=request.user).exists()
+        return request.user.is_superuser or bool(get_owned_restaurant_ids(request))
 
 
-class OrderProductViewSet(viewsets.ModelViewSet):
+class OrderProductViewSet(RestaurantScopedMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing products in an order.
     """
     serializer_class = OrderProductSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderProductPagination
+    restaurant_lookup = 'order__restaurant'
 
     def get_queryset(self):
         """Return order products filtered by a specific order if provided."""
@@ -160,9 +323,52 @@ class OrderProductViewSet(viewsets.ModelViewSet):
 
         order_id = self.request.query_params.get("order")
         if order_id:
-            order = Order.objects.filter(id=order_id, restaurant__user=self.request.user).first()
-            if not order:
+            owned_ids = get_owned_restaurant_ids(self.request)
+            if not Order.objects.filter(id=order_id, restaurant_id__in=owned_ids).exists():
                 raise PermissionDenied("You do not have access to this order.")
-            return OrderProduct.objects.filter(order=order)
+            return OrderProduct.objects.filter(order_id=order_id)
+
+        return self.scope_to_restaurants(OrderProduct.objects.all())
+
 
-        return OrderProduct.objects.filter(order__restaurant__user=self.request.user)
\ No newline at end of file
+class ReportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    API endpoint for reports computed in the background.
+    Submit the report parameters, then poll the job until it is completed and download its result.
+    """
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Only return the jobs of the authenticated user."""
+        return ReportJob.objects.filter(user=self.request.user).order_by('-created')
+
+    def create(self, request, *args, **kwargs):
+        """Queue a report job, or return the equivalent job that already exists."""
+        report = request.data.get("report")
+        if report not in REPORTS:
+            raise ValidationError(f"The report must be one of: {', '.join(REPORTS)}.")
+
+        start_date, end_date = parse_report_dates(request.data)
+        parameters = {
+            "restaurant_ids": get_report_restaurant_ids(request, request.data),
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+        if report == "products":
+            parameters["consolidated"] = str(request.data.get("consolidated")).lower() == "true"
+            parameters["compare"] = str(request.data.get("compare")).lower() == "true"
+        if report == "employees":
+            parameters["ordering"], parameters["limit"] = parse_employee_report_options(request.data)
+
+        job = submit_report_job(request.user, report, parameters)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """Download the stored result of a completed job."""
+        job = self.get_object()
+        if job.status != 2:
+            return Response(self.get_serializer(job).data, status=status.HTTP_409_CONFLICT)
+        return Response(job.result)
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.restaurants.models import Tombstone
+from apps.restaurants.sync import SYNC_TOMBSTONE_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    """
+    Delete the tombstones older than the sync retention, terminals with older watermarks resync fully anyway.
+    """
+    help = "Delete the tombstones of rows deleted before the sync retention period."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+        count, _ = Tombstone.objects.filter(deleted__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {count} tombstones older than {SYNC_TOMBSTONE_RETENTION_DAYS} days.")
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0004_employee_name_alter_employee_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100, verbose_name='Model')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Object ID')),
+                ('deleted', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Deleted')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['restaurant', 'modified'], name='employee_restaurant_modified'),
+        ),
+        migrations.AddIndex(
+            model_name='table',
+            index=models.Index(fields=['restaurant', 'modified'], name='table_restaurant_modified'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='restaurant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to='restaurants.restaurant', verbose_name='Restaurant'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['model', 'restaurant', 'deleted'], name='tombstone_model_deleted'),
+        ),
+    ]
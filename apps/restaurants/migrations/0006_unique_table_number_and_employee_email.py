@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0005_tombstone_and_modified_indexes'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='employee',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'email'), name='unique_employee_email_per_restaurant', violation_error_message='This email is already in use in this restaurant.'),
+        ),
+        migrations.AddConstraint(
+            model_name='table',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'table_number'), name='unique_table_number_per_restaurant', violation_error_message='This table number already exists in this restaurant.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0006_unique_table_number_and_employee_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='profile_picture_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
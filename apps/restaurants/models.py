@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+from model_utils import FieldTracker
 from model_utils.models import TimeStampedModel
 
 
@@ -22,6 +23,8 @@ class Restaurant(TimeStampedModel):
     address = models.TextField()
     phone_number = models.CharField(max_length=15)
 
+    tracker = FieldTracker(fields=['user'])
+
     def __str__(self):
         return self.name
 
@@ -49,11 +52,17 @@ class Employee(TimeStampedModel):
     email = models.EmailField(verbose_name="Email")
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     profile_picture = models.ImageField(upload_to='restaurants/employees/', null=True, blank=True)
+    profile_picture_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
-    def clean(self):
-        """Ensure email is unique within the same restaurant."""
-        if Employee.objects.filter(restaurant=self.restaurant, email=self.email).exclude(id=self.id).exists():
-            raise ValidationError({"email": "This email is already in use in this restaurant."})
+    class Meta:
+        # The email is unique per restaurant, not globally.
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'email'], name="unique_employee_email_per_restaurant",
+                                    violation_error_message="This email is already in use in this restaurant.")
+        ]
+        indexes = [
+            models.Index(fields=['restaurant', 'modified'], name="employee_restaurant_modified"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.restaurant.name})"
@@ -78,11 +87,36 @@ class Table(TimeStampedModel):
     capacity = models.PositiveIntegerField(verbose_name="Capacity")
     status = models.SmallIntegerField(choices=STATUS_CHOICES, default=0)
 
-    def clean(self):
-        """Ensure table_number is unique within the same restaurant."""
-        if Table.objects.filter(restaurant=self.restaurant, table_number=self.table_number).exclude(
-                id=self.id).exists():
-            raise ValidationError({"table_number": "This table number already exists in this restaurant."})
+    tracker = FieldTracker(fields=['status'])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'table_number'], name="unique_table_number_per_restaurant",
+                                    violation_error_message="This table number already exists in this restaurant.")
+        ]
+        indexes = [
+            models.Index(fields=['restaurant', 'modified'], name="table_restaurant_modified"),
+        ]
 
     def __str__(self):
         return f"Table {self.table_number} - {self.get_status_display()} ({self.restaurant.name})"
+
+
+class Tombstone(models.Model):
+    """
+    Records that a row was deleted, so terminals syncing with `modified_since` can drop it.
+    Rows shared by every restaurant, like categories, have no restaurant.
+    """
+    restaurant = models.ForeignKey(Restaurant, null=True, blank=True, on_delete=models.CASCADE,
+                                   related_name="tombstones", verbose_name="Restaurant")
+    model = models.CharField(max_length=100, verbose_name="Model")
+    object_id = models.PositiveBigIntegerField(verbose_name="Object ID")
+    deleted = models.DateTimeField(default=timezone.now, verbose_name="Deleted")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'restaurant', 'deleted'], name="tombstone_model_deleted"),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted on {self.deleted}"
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .models import Restaurant
+
+# Seconds the restaurant ids of a user are cached between requests, 0 disables the cache.
+# Restaurant writes invalidate it, so it only saves the ownership query of repeated requests.
+OWNERSHIP_CACHE_TIMEOUT = getattr(settings, 'RESTAURANT_OWNERSHIP_CACHE_TIMEOUT', 60)
+
+
+def ownership_cache_key(user_id):
+    return f"restaurants:owned-ids:{user_id}"
+
+
+def get_owned_restaurant_ids(request):
+    """
+    Return the ids of the restaurants owned by the user of a request.
+    They are loaded once per request, and cached per user for a short time.
+    """
+    owned_ids = getattr(request, '_owned_restaurant_ids', None)
+    if owned_ids is not None:
+        return owned_ids
+
+    key = ownership_cache_key(request.user.pk)
+    owned_ids = cache.get(key) if OWNERSHIP_CACHE_TIMEOUT else None
+    if owned_ids is None:
+        owned_ids = frozenset(Restaurant.objects.filter(user_id=request.user.pk).values_list('id', flat=True))
+        if OWNERSHIP_CACHE_TIMEOUT:
+            cache.set(key, owned_ids, OWNERSHIP_CACHE_TIMEOUT)
+
+    request._owned_restaurant_ids = owned_ids
+    return owned_ids
+
+
+def forget_owned_restaurant_ids(user_id):
+    """Drop the cached restaurant ids of a user, after one of their restaurants changed."""
+    cache.delete(ownership_cache_key(user_id))
+
+
+def check_restaurant_owner(request, restaurant_id, message="You are not the owner of this restaurant.",
+                           exception=PermissionDenied):
+    """Return the restaurant id as a number, or raise `exception` if the user does not own the restaurant."""
+    if not str(restaurant_id).isdigit():
+        raise ValidationError("The restaurant ID must be a number.")
+    if int(restaurant_id) not in get_owned_restaurant_ids(request):
+        raise exception(message)
+    return int(restaurant_id)
+
+
+class RestaurantScopedMixin:
+    """
+    Scopes the queryset of a viewset to the restaurants of the user.
+    The `restaurant` query parameter narrows it to one of them; superusers see everything.
+    """
+    restaurant_lookup = 'restaurant'
+
+    def scope_to_restaurants(self, queryset):
+        if self.request.user.is_superuser:
+            return queryset
+
+        restaurant_id = self.request.query_params.get("restaurant")
+        if restaurant_id:
+            restaurant_id = check_restaurant_owner(self.request, restaurant_id)
+            return queryset.filter(**{f"{self.restaurant_lookup}__id": restaurant_id})
+
+        return queryset.filter(**{f"{self.restaurant_lookup}__id__in": get_owned_restaurant_ids(self.request)})
@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPaginationMixin:
+    """
+    Adds a keyset mode to a page number pagination class, used when the `cursor` query parameter is sent
+    (empty for the first page). Rows are read in `keyset_ordering` after the last row of the previous page,
+    so there is no COUNT and no OFFSET, and rows inserted meanwhile never shift the following pages.
+    The cursors are opaque tokens, follow the `next` link until it is null.
+    """
+    cursor_query_param = 'cursor'
+    keyset_ordering = ('id',)
+    keyset_only = False  # Always page by cursor, the first page is read without one.
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.keyset_only or self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.keyset_ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after_position(position))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_position = self.get_position(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({'next': self.get_next_cursor_link(), 'results': data})
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        # Datetimes keep their microseconds, a truncated position would repeat rows on the next page.
+        token = json.dumps(self.next_position, default=lambda value: value.isoformat()).encode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   base64.urlsafe_b64encode(token).decode())
+
+    def decode_cursor(self, request, model):
+        """Return the position of a cursor, with each value converted by the model field it is ordered by."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token.encode()))
+            if not isinstance(position, list) or len(position) != len(self.keyset_ordering):
+                raise ValueError
+            position = [self.get_ordering_field(model, field).to_python(value)
+                        for field, value in zip(self.keyset_ordering, position)]
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def get_ordering_field(model, field):
+        """Return the model field of an ordering field, following relations like `order__created`."""
+        *relations, name = field.lstrip('-').split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(name)
+
+    def get_position(self, row):
+        """Return the values of the ordering fields of a row, following relations like `order__created`."""
+        return [
+            reduce(getattr, field.lstrip('-').split('__'), row) for field in self.keyset_ordering
+        ]
+
+    def after_position(self, position):
+        """
+        Return the filter of the rows after a position: (a, b) > (x, y) is a > x OR (a = x AND b > y),
+        with "<" for the descending fields.
+        """
+        condition = Q()
+        for field, value in reversed(list(zip(self.keyset_ordering, position))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            after = Q(**{f'{name}__{lookup}': value})
+            condition = after if not condition else after | (Q(**{name: value}) & condition)
+        return condition
@@ -1,17 +1,25 @@
-from rest_framework.permissions import BasePermission
+from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 from apps.restaurants.models import Restaurant
+from apps.restaurants.ownership import get_owned_restaurant_ids
 
 
 class IsRestaurantOwner(BasePermission):
     """
     Allows access only to restaurant owners or superusers.
+    Objects shared by every restaurant (without a restaurant) can only be changed by staff.
     """
 
     def has_permission(self, request, view):
         return request.user.is_authenticated and (
-                request.user.is_superuser or Restaurant.objects.filter(user=request.user).exists()
+                request.user.is_superuser or bool(get_owned_restaurant_ids(request))
         )
 
     def has_object_permission(self, request, view, obj):
-        return request.user.is_superuser or obj.restaurant.user == request.user
+        if request.user.is_superuser:
+            return True
+
+        restaurant_id = obj.pk if isinstance(obj, Restaurant) else getattr(obj, 'restaurant_id', None)
+        if restaurant_id is None:
+            return request.method in SAFE_METHODS or request.user.is_staff
+        return restaurant_id in get_owned_restaurant_ids(request)
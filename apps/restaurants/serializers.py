@@ -1,8 +1,29 @@
+from copy import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 
+from apps.common.images import ImageDerivativesField
 from .models import Employee, Restaurant, Table
 
 
+def validate_unique_in_restaurant(serializer, data, field_name):
+    """
+    Check the unique constraints of the model on the validated data, and report a violation under `field_name`
+    as the API always did, instead of under `non_field_errors`.
+    """
+    model = serializer.Meta.model
+    instance = copy(serializer.instance) if serializer.instance else model()
+    for attr, value in data.items():
+        setattr(instance, attr, value)
+    for constraint in model._meta.constraints:
+        try:
+            constraint.validate(model, instance)
+        except DjangoValidationError:
+            raise serializers.ValidationError({field_name: constraint.get_violation_error_message()})
+    return data
+
+
 class RestaurantSerializer(serializers.ModelSerializer):
     """
     Serializer for Restaurant model.
@@ -15,38 +36,31 @@ class RestaurantSerializer(serializers.ModelSerializer):
 
 class EmployeeSerializer(serializers.ModelSerializer):
     """
-    Serializer for Employee model with email validation.
+    Serializer for Employee model.
+    The email must be unique in the restaurant, checked from the unique constraint of the model.
+    `profile_picture_derivatives` has the URLs of the resized copies of the picture, null until they are built.
     """
+    profile_picture_derivatives = ImageDerivativesField('profile_picture')
 
     class Meta:
         model = Employee
-        fields = ['id', 'name', 'email', 'role', 'profile_picture', 'restaurant', ]
+        fields = ['id', 'name', 'email', 'role', 'profile_picture', 'profile_picture_derivatives', 'restaurant', ]
+        validators = []  # The unique constraint is checked in validate().
 
-    def validate_email(self, value):
-        """Ensure email is unique within the same restaurant."""
-        restaurant = self.initial_data.get('restaurant')
-        employee_id = self.instance.id if self.instance else None
-        if Employee.objects.filter(restaurant=restaurant, email=value).exclude(id=employee_id).exists():
-            raise serializers.ValidationError("This email is already in use in this restaurant.")
-
-        return value
+    def validate(self, data):
+        return validate_unique_in_restaurant(self, data, 'email')
 
 
 class TableSerializer(serializers.ModelSerializer):
     """
-    Serializer for Table model with validation.
+    Serializer for Table model.
+    The table number must be unique in the restaurant, checked from the unique constraint of the model.
     """
 
     class Meta:
         model = Table
         fields = ['id', 'table_number', 'capacity', 'status', 'restaurant', ]
+        validators = []  # The unique constraint is checked in validate().
 
     def validate(self, data):
-        """Ensure table_number is unique within the same restaurant."""
-        restaurant = data.get('restaurant')
-        table_number = data.get('table_number')
-
-        if Table.objects.filter(restaurant=restaurant, table_number=table_number).exists():
-            raise serializers.ValidationError({"table_number": "This table number already exists in this restaurant."})
-
-        return data
+        return validate_unique_in_restaurant(self, data, 'table_number')
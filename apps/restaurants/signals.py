@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.common.images import schedule_derivative_files_deletion, schedule_image_derivatives
+
+from .models import Employee, Restaurant, Table
+from .ownership import forget_owned_restaurant_ids
+from .sync import record_tombstones
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def forget_restaurant_owners(sender, instance, **kwargs):
+    """Invalidate the cached restaurant ids of the owner, and of the previous owner after a transfer."""
+    forget_owned_restaurant_ids(instance.user_id)
+    previous_user_id = instance.tracker.previous('user')
+    if previous_user_id and previous_user_id != instance.user_id:
+        forget_owned_restaurant_ids(previous_user_id)
+
+
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=Table)
+def record_deleted_restaurant_rows(sender, instance, origin=None, **kwargs):
+    """Leave a tombstone of deleted employees and tables for the terminals that sync them."""
+    record_tombstones(instance, [instance.restaurant_id], origin)
+
+
+@receiver(post_save, sender=Employee)
+def build_derivatives_of_saved_profile_picture(sender, instance, **kwargs):
+    """Resize uploaded profile pictures in the background, the request only stores the original."""
+    schedule_image_derivatives(instance)
+
+
+@receiver(post_delete, sender=Employee)
+def delete_derivatives_of_deleted_employee(sender, instance, **kwargs):
+    schedule_derivative_files_deletion(instance)
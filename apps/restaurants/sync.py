@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from .models import Restaurant, Tombstone
+from .ownership import check_restaurant_owner, get_owned_restaurant_ids
+from .pagination import KeysetPaginationMixin
+
+# Seconds the returned watermark stays behind the clock, so rows saved by transactions still running when
+# a sync is served are returned by the next one. Rows may come twice, terminals upsert them.
+SYNC_WATERMARK_LAG = getattr(settings, 'SYNC_WATERMARK_LAG', 5)
+# Days tombstones are kept. Terminals with an older watermark have to download the full lists again.
+SYNC_TOMBSTONE_RETENTION_DAYS = getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 90)
+# Changed rows returned by each page of a sync.
+SYNC_PAGE_SIZE = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+
+
+def record_tombstones(instance, restaurant_ids, origin=None):
+    """
+    Record the deletion of a row for each restaurant that could see it (None for shared rows).
+    Rows deleted together with their restaurant are skipped, nobody syncs that restaurant anymore.
+    """
+    if isinstance(origin, Restaurant) or getattr(origin, 'model', None) is Restaurant:
+        return
+    Tombstone.objects.bulk_create([
+        Tombstone(restaurant_id=restaurant_id, model=instance._meta.label_lower, object_id=instance.pk)
+        for restaurant_id in restaurant_ids
+    ])
+
+
+def parse_modified_since(value):
+    """Return the watermark sent by a terminal as an aware datetime."""
+    modified_since = parse_datetime(value)
+    if modified_since is None:
+        raise ValidationError("modified_since must be a date and time in ISO 8601 format.")
+    if timezone.is_naive(modified_since):
+        modified_since = timezone.make_aware(modified_since)
+
+    if modified_since < timezone.now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS):
+        raise ValidationError("The watermark is older than the deleted rows kept, download the full list again.")
+    return modified_since
+
+
+class SyncPagination(KeysetPaginationMixin, PageNumberPagination):
+    """
+    Pages the changed rows of a sync by cursor in modification order, rows saved while a terminal follows
+    the pages move to a later page instead of being skipped.
+    """
+    page_size = SYNC_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = SYNC_PAGE_SIZE
+    keyset_ordering = ('modified', 'id')
+    keyset_only = True
+
+
+class DeltaSyncMixin:
+    """
+    Adds a sync mode to a list endpoint: with the `modified_since` query parameter, only the rows modified
+    since that watermark are returned, with the ids of the rows deleted since, and the watermark to send next.
+    The changed rows are paged, follow the `next` link until it is null: the last page carries the deleted ids
+    and the watermark, the previous ones a null watermark.
+    The work depends on how many rows changed, not on how many exist.
+    """
+    sync_shared = False  # The rows are shared by every restaurant, their tombstones have no restaurant.
+
+    def list(self, request, *args, **kwargs):
+        if "modified_since" not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        modified_since = parse_modified_since(request.query_params["modified_since"])
+        watermark = timezone.now() - timedelta(seconds=SYNC_WATERMARK_LAG)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        paginator = SyncPagination()
+        changed = self.get_serializer(
+            paginator.paginate_queryset(queryset.filter(modified__gte=modified_since), request, view=self), many=True
+        ).data
+        next_link = paginator.get_next_cursor_link()
+        if next_link:
+            return Response({"watermark": None, "next": next_link, "results": changed, "deleted": []})
+
+        deleted_ids = set(
+            self.get_tombstones(queryset.model, modified_since).values_list('object_id', flat=True)
+        ) | self.get_hidden_ids(modified_since)
+        if deleted_ids:
+            # A row deleted from a restaurant and added back later is only returned as changed.
+            deleted_ids -= set(queryset.filter(id__in=deleted_ids).values_list('id', flat=True))
+
+        return Response({"watermark": watermark, "next": None, "results": changed, "deleted": sorted(deleted_ids)})
+
+    def get_hidden_ids(self, modified_since):
+        """Return the ids of the rows that changed and no longer match the queryset, like deactivated ones."""
+        return set()
+
+    def get_tombstones(self, model, modified_since):
+        """Return the tombstones of the rows of a model deleted since the watermark, in the scope of the user."""
+        tombstones = Tombstone.objects.filter(model=model._meta.label_lower, deleted__gte=modified_since)
+        if self.sync_shared:
+            return tombstones.filter(restaurant__isnull=True)
+        if self.request.user.is_superuser:
+            return tombstones
+
+        restaurant_id = self.request.query_params.get("restaurant")
+        if restaurant_id:
+            return tombstones.filter(restaurant_id=check_restaurant_owner(self.request, restaurant_id))
+        return tombstones.filter(restaurant_id__in=get_owned_restaurant_ids(self.request))
@@ -0,0 +1,37 @@
+import factory
+from factory import Faker
+
+from apps.restaurants.models import Employee, Restaurant, Table
+from apps.users.tests.factories.models_factories import UserFactory
+
+
+class RestaurantFactory(factory.django.DjangoModelFactory):
+    """ Restaurant factory """
+    user = factory.SubFactory(UserFactory)
+    name = Faker('company')
+    address = Faker('address')
+    phone_number = Faker('numerify', text='##########')
+
+    class Meta:
+        model = Restaurant
+
+
+class EmployeeFactory(factory.django.DjangoModelFactory):
+    """ Employee factory """
+    restaurant = factory.SubFactory(RestaurantFactory)
+    name = Faker('name')
+    email = factory.Sequence(lambda n: f"employee{n}@example.com")
+    role = 'Waiter'
+
+    class Meta:
+        model = Employee
+
+
+class TableFactory(factory.django.DjangoModelFactory):
+    """ Table factory """
+    restaurant = factory.SubFactory(RestaurantFactory)
+    table_number = factory.Sequence(lambda n: n + 1)
+    capacity = 4
+
+    class Meta:
+        model = Table
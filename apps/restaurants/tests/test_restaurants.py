@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from apps.restaurants.tests.factories.models_factories import EmployeeFactory, RestaurantFactory, TableFactory
+
+
+class RestaurantOwnershipTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = RestaurantFactory()
+        self.user = self.restaurant.user
+        self.client.force_authenticate(self.user)
+        EmployeeFactory(restaurant=self.restaurant)
+
+    def test_owned_restaurants_are_loaded_once(self):
+        self.client.get(reverse('employee-list'))
+        with self.assertNumQueries(2):  # The count and the page, the restaurants of the user are cached.
+            response = self.client.get(reverse('employee-list'), {'restaurant': self.restaurant.id})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_new_restaurants_are_visible_right_away(self):
+        self.client.get(reverse('employee-list'))
+        other = RestaurantFactory(user=self.user)
+        EmployeeFactory(restaurant=other)
+
+        response = self.client.get(reverse('employee-list'), {'restaurant': other.id})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_transferred_restaurants_are_no_longer_accessible(self):
+        self.client.get(reverse('employee-list'))
+        self.restaurant.user = RestaurantFactory().user
+        self.restaurant.save()
+
+        response = self.client.get(reverse('employee-list'), {'restaurant': self.restaurant.id})
+        self.assertEqual(response.status_code, 403)
+
+
+class RestaurantUniqueFieldsTestCase(APITestCase):
+    def setUp(self):
+        self.restaurant = RestaurantFactory()
+        self.client.force_authenticate(self.restaurant.user)
+
+    def test_table_numbers_are_unique_per_restaurant(self):
+        table = TableFactory(restaurant=self.restaurant, table_number=1)
+        response = self.client.post(reverse('table-list'), {
+            'restaurant': self.restaurant.id, 'table_number': 1, 'capacity': 2,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['table_number'], ["This table number already exists in this restaurant."])
+
+        response = self.client.patch(reverse('table-detail', args=[table.id]), {'capacity': 6})
+        self.assertEqual(response.status_code, 200)
+
+    def test_employee_emails_are_unique_per_restaurant(self):
+        EmployeeFactory(restaurant=self.restaurant, email='ana@example.com')
+        EmployeeFactory(email='ana@example.com')  # Another restaurant.
+        response = self.client.post(reverse('employee-list'), {
+            'restaurant': self.restaurant.id, 'name': 'Ana', 'email': 'ana@example.com', 'role': 'Waiter',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['email'], ["This email is already in use in this restaurant."])
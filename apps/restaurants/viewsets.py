@@ -3,13 +3,16 @@ from rest_framework.exceptions import ValidationError, PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 
 from .models import Employee, Restaurant, Table
+from .ownership import RestaurantScopedMixin, check_restaurant_owner
+from .pagination import KeysetPaginationMixin
+from .sync import DeltaSyncMixin
 from .permissions import IsRestaurantOwner
 from .serializers import (EmployeeSerializer, RestaurantSerializer,
                           TableSerializer)
 
 
-class EmployeePagination(pagination.PageNumberPagination):
-    """ Custom pagination class for Employees. """
+class EmployeePagination(KeysetPaginationMixin, pagination.PageNumberPagination):
+    """ Custom pagination class for Employees, by page number or by cursor. """
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 50
@@ -31,7 +34,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         return Restaurant.objects.filter(user=self.request.user)
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(DeltaSyncMixin, RestaurantScopedMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing Employees.
     Supports CRUD operations (list, create, retrieve, update, delete).
@@ -42,17 +45,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return only employees that belong to the specified restaurant in query parameters."""
-        if self.request.user.is_superuser:
-            return Employee.objects.all()
-
-        restaurant_id = self.request.query_params.get("restaurant")
-
-        if restaurant_id:
-            if not Restaurant.objects.filter(id=restaurant_id, user=self.request.user).exists():
-                raise PermissionDenied("You are not the owner of this restaurant.")
-            return Employee.objects.filter(restaurant_id=restaurant_id)
-
-        return Employee.objects.filter(restaurant__user=self.request.user)
+        return self.scope_to_restaurants(Employee.objects.all())
 
     def perform_create(self, serializer):
         """Ensure the employee is created only in the specified restaurant."""
@@ -61,14 +54,12 @@ class EmployeeViewSet(viewsets.ModelViewSet):
         if not restaurant_id:
             raise ValidationError("A restaurant ID is required.")
 
-        restaurant = Restaurant.objects.filter(id=restaurant_id, user=self.request.user).first()
-        if not restaurant:
-            raise ValidationError("You do not have permission to add employees to this restaurant.")
-
-        serializer.save(restaurant=restaurant)
+        check_restaurant_owner(self.request, restaurant_id,
+                               "You do not have permission to add employees to this restaurant.", ValidationError)
+        serializer.save()
 
 
-class TableViewSet(viewsets.ModelViewSet):
+class TableViewSet(DeltaSyncMixin, RestaurantScopedMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing restaurant tables.
     """
@@ -77,17 +68,7 @@ class TableViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return only tables that belong to the specified restaurant in query parameters."""
-        if self.request.user.is_superuser:
-            return Table.objects.all()
-
-        restaurant_id = self.request.query_params.get("restaurant")
-
-        if restaurant_id:
-            if not Restaurant.objects.filter(id=restaurant_id, user=self.request.user).exists():
-                raise PermissionDenied("You are not the owner of this restaurant.")
-            return Table.objects.filter(restaurant_id=restaurant_id)
-
-        return Table.objects.filter(restaurant__user=self.request.user)
+        return self.scope_to_restaurants(Table.objects.all())
 
     def perform_create(self, serializer):
         """Ensure the table is created only in the specified restaurant."""
@@ -96,8 +77,6 @@ class TableViewSet(viewsets.ModelViewSet):
         if not restaurant_id:
             raise ValidationError("A restaurant ID is required.")
 
-        restaurant = Restaurant.objects.filter(id=restaurant_id, user=self.request.user).first()
-        if not restaurant:
-            raise PermissionDenied("You do not have permission to add tables to this restaurant.")
-
-        serializer.save(restaurant=restaurant)
+        check_restaurant_owner(self.request, restaurant_id,
+                               "You do not have permission to add tables to this restaurant.", PermissionDenied)
+        serializer.save()
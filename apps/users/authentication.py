@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from .models import User
+
+# Seconds the active state of a user is cached for the stateless JWT authentication.
+# Saving or deleting the user invalidates it, queryset updates are only seen once it expires.
+USER_STATE_CACHE_TIMEOUT = getattr(settings, 'USER_STATE_CACHE_TIMEOUT', 60)
+
+
+def user_state_cache_key(user_id):
+    return f"users:active:{user_id}"
+
+
+def forget_user_state(user_id):
+    """Drop the cached active state of a user, after the user changed or was deleted."""
+    cache.delete(user_state_cache_key(user_id))
+
+
+class CachedUserJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Takes the user of a JWT from the token instead of loading it, like JWTStatelessUserAuthentication,
+    but still rejects the tokens of deleted or deactivated users as JWTAuthentication does.
+    Whether the user is active is cached per user, so repeated requests are authenticated without a query.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+
+        key = user_state_cache_key(user.pk)
+        is_active = cache.get(key)
+        if is_active is None:
+            is_active = User.objects.filter(pk=user.pk, is_active=True).exists()
+            cache.set(key, is_active, USER_STATE_CACHE_TIMEOUT)
+
+        if not is_active:
+            raise AuthenticationFailed("User is inactive or was deleted.", code="user_inactive")
+        return user
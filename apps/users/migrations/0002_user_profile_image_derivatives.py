@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -8,4 +8,5 @@ from model_utils.models import TimeStampedModel
 class User(AbstractUser, TimeStampedModel):
     """Default user for Pos System, this is the owner of the restaurants."""
     email = models.EmailField(_("email address"), unique=True)
-    profile_image = models.ImageField(upload_to='users/profileImages', blank=True, null=True)
\ No newline at end of file
+    profile_image = models.ImageField(upload_to='users/profileImages', blank=True, null=True)
+    profile_image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
\ No newline at end of file
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.common.images import schedule_derivative_files_deletion, schedule_image_derivatives
+
+from .authentication import forget_user_state
+from .models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_saved_user_state(sender, instance, **kwargs):
+    """Deactivated and deleted users lose access to the endpoints that do not load the user."""
+    forget_user_state(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def build_derivatives_of_saved_profile_image(sender, instance, **kwargs):
+    """Resize uploaded profile images in the background, the request only stores the original."""
+    schedule_image_derivatives(instance)
+
+
+@receiver(post_delete, sender=User)
+def delete_derivatives_of_deleted_user(sender, instance, **kwargs):
+    schedule_derivative_files_deletion(instance)